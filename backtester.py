@@ -1,29 +1,29 @@
-import gzip
-import csv
 import os
 from datetime import datetime, timezone
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 from rsi_strategy import RSIStrategyBase
+from vector_backtest import run_vector_backtest, print_metrics
+from tick_cache import iter_ticks, iter_ticks_across
 
 def timestamp_to_dt(ts):
     return datetime.fromtimestamp(int(ts) / 1000, timezone.utc)
 
-def run_backtest_on_file(filename, strategy_params=None, plot=True, verbose=True):
+def run_backtest_on_file(filename, strategy_params=None, plot=True, verbose=True, use_cache=True, plot_dir=None,
+                         plot_format='png', plot_workers=1):
     if strategy_params is None:
         strategy_params = {}
     strategy = RSIStrategyBase(**strategy_params)
     
     tick_count = 0
-    with gzip.open(filename, 'rt') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            price = float(row['price'])
-            volume = float(row['volume'])
-            dt = timestamp_to_dt(row['timestamp'])
-            strategy.on_tick(price, dt, volume)
-            tick_count += 1
-        strategy.on_finish(price)
+    price = None
+    # Тики читаются блоками в массивы (use_cache — из кэша tick_cache,
+    # отображенного в память), стратегия получает их по одному
+    for timestamps, prices, volumes in iter_ticks(filename, use_cache=use_cache):
+        for ts, price, volume in zip(timestamps.tolist(), prices.tolist(), volumes.tolist()):
+            strategy.on_tick_ms(price, ts, volume)
+        tick_count += len(prices)
+    if price is None:
+        raise ValueError(f"В файле {filename} нет тиков")
+    strategy.on_finish(price)
     
     if verbose:
         print(f'Файл: {filename}')
@@ -34,119 +34,281 @@ def run_backtest_on_file(filename, strategy_params=None, plot=True, verbose=True
         print(f'Тиков: {tick_count}')
         print(f'Входов: {len(strategy.entry_points)}')
         print(f'Выходов: {len(strategy.exit_points)}')
+        print_metrics(strategy.metrics.snapshot())
         
     if plot:
-        plot_strategy(strategy)
+        # plot_dir — без окон: файлы графиков, рисуются в plot_workers процессах
+        plot_strategy(strategy, output_dir=plot_dir, fmt=plot_format, workers=plot_workers)
     return strategy
 
-def plot_strategy(strategy, window=100):
+def _window_payloads(strategy, window=100):
+    """Данные окон графика: plain-массивы без объекта стратегии (можно передать в процесс)"""
+    import matplotlib.dates as mdates
+    import numpy as np
+    entries = list(strategy.entry_points)
+    exits = list(strategy.exit_points)
+    entry_x = mdates.date2num([t for t, _ in entries]) if entries else np.empty(0)
+    exit_x = mdates.date2num([t for t, _ in exits]) if exits else np.empty(0)
+    entry_y = np.array([p for _, p in entries], dtype=float)
+    exit_y = np.array([p for _, p in exits], dtype=float)
     total = len(strategy.candles)
-    i = 0
-    while i < total:
+    for i in range(0, total, window):
         candles = strategy.candles[i:i+window]
-        candle_times = [c.start_time for c in candles]
-        candle_opens = [c.open for c in candles]
-        candle_highs = [c.high for c in candles]
-        candle_lows = [c.low for c in candles]
-        candle_closes = [c.close for c in candles]
-        closes = candle_closes
-        rsi_values = [strategy.rsi_values[j+i] for j in range(len(closes))]
-        bb_values = [strategy.bb_values[j+i] for j in range(len(closes))]
-        equity_curve = strategy.equity_curve[i:i+window]
-        # Обрезаем equity_curve до длины свечей
-        equity_curve = equity_curve[:len(candle_times)]
-        entry_points = [(t, p) for t, p in strategy.entry_points if t >= candle_times[0] and t <= candle_times[-1]]
-        exit_points = [(t, p) for t, p in strategy.exit_points if t >= candle_times[0] and t <= candle_times[-1]]
-        # --- График ---
-        fig, axs = plt.subplots(3, 1, figsize=(14, 9), sharex=True)
-        # 1. Свечи с входами/выходами и BB
-        ax0 = axs[0]
-        width = 2
-        for k in range(len(candles)):
-            color = 'green' if candle_closes[k] >= candle_opens[k] else 'red'
-            ax0.plot([candle_times[k], candle_times[k]], [candle_lows[k], candle_highs[k]], color=color, linewidth=1)
-            ax0.add_patch(plt.Rectangle((mdates.date2num(candle_times[k]) - width/2880, min(candle_opens[k], candle_closes[k])),
-                                        width/1440, abs(candle_closes[k] - candle_opens[k]),
-                                        color=color, alpha=0.7))
-        # BB
-        bb_ma = [bb[0] for bb in bb_values]
-        bb_upper = [bb[1] for bb in bb_values]
-        bb_lower = [bb[2] for bb in bb_values]
-        ax0.plot(candle_times, bb_ma, color='blue', linestyle='--', label='BB MA')
-        ax0.plot(candle_times, bb_upper, color='purple', linestyle=':', label='BB Upper')
-        ax0.plot(candle_times, bb_lower, color='purple', linestyle=':', label='BB Lower')
-        if entry_points:
-            ax0.scatter([t for t, _ in entry_points], [p for _, p in entry_points], marker='^', color='blue', label='Entry', zorder=5)
-        if exit_points:
-            ax0.scatter([t for t, _ in exit_points], [p for _, p in exit_points], marker='v', color='orange', label='Exit', zorder=5)
-        ax0.set_ylabel('Price (5m candles)')
-        ax0.set_title(f'5m Candles с входами/выходами и BB ({i+1}-{i+len(candles)})')
-        ax0.legend()
-        ax0.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-        # 2. RSI
-        axs[1].plot(candle_times, rsi_values, label='RSI(14)', color='orange')
-        axs[1].axhline(30, color='green', linestyle='--', alpha=0.5)
-        axs[1].axhline(70, color='red', linestyle='--', alpha=0.5)
-        axs[1].set_ylabel('RSI')
-        axs[1].legend()
-        axs[1].set_title('RSI(14) (по свечам)')
-        axs[1].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-        # 3. Equity
-        axs[2].plot(candle_times, equity_curve, label='Equity Curve', color='green')
-        axs[2].set_ylabel('Equity')
-        axs[2].set_xlabel('Time')
-        axs[2].legend()
-        axs[2].set_title('Equity Curve (по свечам)')
-        axs[2].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-        plt.tight_layout()
-        plt.show()
-        i += window
-
-def run_multiple_backtests(pattern="data/BTCUSDT_2024-07-*.csv.gz", max_files=10, strategy_params=None):
-    """Запускает бэктесты на нескольких файлах без визуализации"""
+        n = len(candles)
+        x = mdates.date2num([c.start_time for c in candles])
+        bb = np.array(strategy.bb_values[i:i+n], dtype=float).reshape(-1, 3)
+        # Входы/выходы окна — срез по отсортированному времени вместо фильтра по всем точкам
+        entry_slice = slice(np.searchsorted(entry_x, x[0], 'left'), np.searchsorted(entry_x, x[-1], 'right'))
+        exit_slice = slice(np.searchsorted(exit_x, x[0], 'left'), np.searchsorted(exit_x, x[-1], 'right'))
+        yield {
+            'index': i // window,
+            'first': i + 1,
+            'last': i + n,
+            'x': x,
+            'open': np.array([c.open for c in candles], dtype=float),
+            'high': np.array([c.high for c in candles], dtype=float),
+            'low': np.array([c.low for c in candles], dtype=float),
+            'close': np.array([c.close for c in candles], dtype=float),
+            'bb': bb,
+            'rsi': np.array(strategy.rsi_values[i:i+n], dtype=float),
+            'equity': np.array(strategy.equity_curve[i:i+n], dtype=float),
+            'entries': (entry_x[entry_slice], entry_y[entry_slice]),
+            'exits': (exit_x[exit_slice], exit_y[exit_slice]),
+            'candle_minutes': strategy.candle_minutes,
+            'rsi_period': strategy.rsi_period,
+            'rsi_buy': strategy.rsi_buy,
+            'rsi_sell': strategy.rsi_sell,
+        }
+
+def _draw_window(fig, data):
+    """Одно окно на фигуре fig: свечи — две коллекции (тени и тела), а не патч на свечу"""
+    import matplotlib.dates as mdates
+    import numpy as np
+    from matplotlib.collections import LineCollection, PolyCollection
+    axs = fig.subplots(3, 1, sharex=True)
+    x, opens, highs, lows, closes = data['x'], data['open'], data['high'], data['low'], data['close']
+    minutes = data['candle_minutes']
+    n = len(x)
+    # 1. Свечи с входами/выходами и BB
+    ax0 = axs[0]
+    colors = np.where(closes >= opens, 'green', 'red')
+    wicks = np.stack([np.column_stack([x, lows]), np.column_stack([x, highs])], axis=1)
+    ax0.add_collection(LineCollection(wicks, colors=colors, linewidths=1))
+    half = minutes / 1440 * 0.4
+    bottoms = np.minimum(opens, closes)
+    tops = np.maximum(opens, closes)
+    bodies = np.stack([np.column_stack([x - half, bottoms]), np.column_stack([x + half, bottoms]),
+                       np.column_stack([x + half, tops]), np.column_stack([x - half, tops])], axis=1)
+    ax0.add_collection(PolyCollection(bodies, facecolors=colors, edgecolors=colors, alpha=0.7))
+    ax0.autoscale_view()
+    bb = data['bb']
+    if len(bb) == n:
+        ax0.plot(x, bb[:, 0], color='blue', linestyle='--', label='BB MA')
+        ax0.plot(x, bb[:, 1], color='purple', linestyle=':', label='BB Upper')
+        ax0.plot(x, bb[:, 2], color='purple', linestyle=':', label='BB Lower')
+    if len(data['entries'][0]):
+        ax0.scatter(*data['entries'], marker='^', color='blue', label='Entry', zorder=5)
+    if len(data['exits'][0]):
+        ax0.scatter(*data['exits'], marker='v', color='orange', label='Exit', zorder=5)
+    ax0.set_ylabel(f'Price ({minutes}m candles)')
+    ax0.set_title(f"{minutes}m Candles с входами/выходами и BB ({data['first']}-{data['last']})")
+    ax0.legend()
+    # 2. RSI
+    rsi_label = f"RSI({data['rsi_period']})"
+    if len(data['rsi']) == n:
+        axs[1].plot(x, data['rsi'], label=rsi_label, color='orange')
+    axs[1].axhline(data['rsi_buy'], color='green', linestyle='--', alpha=0.5)
+    axs[1].axhline(data['rsi_sell'], color='red', linestyle='--', alpha=0.5)
+    axs[1].set_ylabel('RSI')
+    axs[1].legend()
+    axs[1].set_title(f'{rsi_label} (по свечам)')
+    # 3. Equity
+    equity = data['equity']
+    axs[2].plot(x[:len(equity)], equity, label='Equity Curve', color='green')
+    axs[2].set_ylabel('Equity')
+    axs[2].set_xlabel('Time')
+    axs[2].legend()
+    axs[2].set_title('Equity Curve (по свечам)')
+    for ax in axs:
+        ax.xaxis_date()
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    fig.tight_layout()
+
+def _render_window(data, path, dpi=100):
+    """Окно в файл без pyplot и GUI (Figure + Agg) — безопасно в процессах пула"""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(14, 9))
+    _draw_window(fig, data)
+    fig.savefig(path, dpi=dpi)
+    return path
+
+def plot_strategy(strategy, window=100, output_dir=None, fmt='png', workers=1, dpi=100):
+    """Графики стратегии окнами по window свечей
+
+    output_dir=None — интерактивно (plt.show на каждое окно). Иначе окна
+    рисуются без GUI в файлы output_dir/window_0000.<fmt> (png или svg),
+    при workers > 1 — параллельно в пуле процессов; возвращает пути файлов
+    в порядке окон.
+    """
+    # matplotlib нужен только для графиков — не тянем его в --multiple и векторные прогоны
+    payloads = _window_payloads(strategy, window)
+    if output_dir is None:
+        import matplotlib.pyplot as plt
+        for data in payloads:
+            fig = plt.figure(figsize=(14, 9))
+            _draw_window(fig, data)
+            plt.show()
+        return []
+
+    if fmt not in ('png', 'svg'):
+        raise ValueError(f"Неизвестный формат графиков: {fmt} (доступны png, svg)")
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(data, os.path.join(output_dir, f"window_{data['index']:04d}.{fmt}")) for data in payloads]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            futures = [executor.submit(_render_window, data, path, dpi) for data, path in jobs]
+            paths = [future.result() for future in futures]
+    else:
+        paths = [_render_window(data, path, dpi) for data, path in jobs]
+    print(f"🖼️ Графиков сохранено: {len(paths)} в {output_dir}")
+    return paths
+
+def backtest_file_summary(filename, strategy_params=None, engine='tick', vector_mode='candle', use_cache=True,
+                          include_trades=False):
+    """Бэктест одного файла -> компактный dict итогов (без объекта стратегии)
+
+    Ошибка не пробрасывается: возвращается {'filename', 'error'}, чтобы
+    один битый файл не останавливал массовый прогон (в том числе в воркере).
+    include_trades — добавить 'trades' (equity после каждой сделки).
+    """
+    try:
+        if engine == 'vector':
+            summary = run_vector_backtest(filename, strategy_params, mode=vector_mode, verbose=False,
+                                          use_cache=use_cache)
+            result = {'filename': filename}
+            result.update((key, summary[key]) for key in ('sharpe', 'equity', 'trades_count', 'candles_count',
+                                                           'entry_points', 'exit_points', 'pnl_percent'))
+            metrics = summary['metrics']
+            trades = summary['trades']
+        else:
+            strategy = run_backtest_on_file(filename, strategy_params, plot=False, verbose=False,
+                                            use_cache=use_cache)
+
+            result = {
+                'filename': filename,
+                'sharpe': float(strategy.sharpe()),
+                'equity': float(strategy.equity),
+                'trades_count': len(strategy.trades),
+                'candles_count': len(strategy.candles),
+                'entry_points': len(strategy.entry_points),
+                'exit_points': len(strategy.exit_points),
+                'pnl_percent': float(strategy.equity - 1.0) * 100
+            }
+            metrics = strategy.metrics.snapshot()
+            trades = strategy.trades
+        result.update((key, metrics[key]) for key in ('sortino', 'max_drawdown', 'win_rate', 'profit_factor'))
+        if include_trades:
+            result['trades'] = [float(e) for e in trades]
+        return result
+    except Exception as e:
+        return {'filename': filename, 'error': str(e)}
+
+def _summaries_in_order(files, strategy_params, engine, vector_mode, workers, use_cache, include_trades=False):
+    """Итоги по файлам в порядке files (workers > 1 — пул процессов)"""
+    if workers <= 1 or len(files) <= 1:
+        for filename in files:
+            yield backtest_file_summary(filename, strategy_params, engine, vector_mode, use_cache, include_trades)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+        futures = [executor.submit(backtest_file_summary, filename, strategy_params, engine, vector_mode,
+                                   use_cache, include_trades)
+                   for filename in files]
+        for filename, future in zip(files, futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # Воркер упал целиком (например, BrokenProcessPool)
+                yield {'filename': filename, 'error': f"{type(e).__name__}: {e}"}
+
+def _with_stored(files, stored, summaries):
+    """Итоги в порядке files: из базы (stored) или следующий из summaries"""
+    for filename in files:
+        yield stored[filename] if filename in stored else next(summaries)
+
+def run_multiple_backtests(pattern="data/BTCUSDT_2024-07-*.csv.gz", max_files=10, strategy_params=None,
+                           engine='tick', vector_mode='candle', workers=1, use_cache=True, store=None,
+                           store_trades=False):
+    """Запускает бэктесты на нескольких файлах без визуализации
+
+    engine='vector' — векторный движок vector_backtest (vector_mode='tick'
+    дает те же сделки, что и потиковый прогон, 'candle' — решения по
+    закрытию свечи). workers > 1 — файлы считаются параллельно в пуле
+    процессов (None — по числу ядер); результаты, кумулятивная доходность
+    и статистика все равно идут в порядке файлов. use_cache — читать тики
+    из колоночного кэша tick_cache, а векторному режиму 'candle' — сразу
+    свечи из candle_cache (оба создаются при первом прогоне).
+
+    store — путь к SQLite (или ResultsStore): прогон сохраняется в базу
+    results_store, а файлы, уже посчитанные с теми же параметрами, движком,
+    версией кода и окружением (бэкенд индикаторов, NumPy), берутся из нее
+    ссылкой на исходную запись. store_trades — хранить и список сделок.
+    """
     import glob
     
     files = sorted(glob.glob(pattern))[:max_files]
+    if workers is None:
+        workers = os.cpu_count() or 1
     
     print(f"📊 Массовый бэктест")
     print(f"Паттерн: {pattern}")
     print(f"Найдено файлов: {len(files)}")
     print(f"Тестируем первые {min(len(files), max_files)} файлов...")
+    if workers > 1:
+        print(f"Процессов: {workers}")
     print("=" * 80)
     
     results = []
     total_equity = 1.0
     
-    for i, filename in enumerate(files, 1):
-        print(f"\n[{i}/{len(files)}] {os.path.basename(filename)}")
-        try:
-            strategy = run_backtest_on_file(filename, strategy_params, plot=False, verbose=False)
-            
-            result = {
-                'filename': filename,
-                'sharpe': strategy.sharpe(),
-                'equity': strategy.equity,
-                'trades_count': len(strategy.trades),
-                'candles_count': len(strategy.candles),
-                'entry_points': len(strategy.entry_points),
-                'exit_points': len(strategy.exit_points),
-                'pnl_percent': (strategy.equity - 1.0) * 100
-            }
-            
-            # Кумулятивная доходность
-            total_equity *= strategy.equity
-            result['cumulative_equity'] = total_equity
-            
+    results_store = None
+    stored = {}
+    if store is not None:
+        from results_store import ResultsStore, params_hash
+        results_store = store if isinstance(store, ResultsStore) else ResultsStore(store)
+        run_hash = params_hash(strategy_params)
+        stored_mode = vector_mode if engine == 'vector' else None
+        for filename in files:
+            hit = results_store.lookup(filename, run_hash, engine, stored_mode, with_trades=store_trades)
+            if hit is not None:
+                stored[filename] = hit
+        print(f"🗄️ Из базы результатов ({results_store.path}): {len(stored)}/{len(files)} файлов")
+    
+    to_run = [filename for filename in files if filename not in stored]
+    summaries = _summaries_in_order(to_run, strategy_params, engine, vector_mode, workers, use_cache, store_trades)
+    for i, result in enumerate(_with_stored(files, stored, summaries), 1):
+        print(f"\n[{i}/{len(files)}] {os.path.basename(result['filename'])}")
+        if 'error' in result:
+            print(f"  ❌ ОШИБКА: {result['error']}")
             results.append(result)
-            
-            print(f"  📈 Sharpe: {result['sharpe']:8.4f}")
-            print(f"  💰 Equity: {result['equity']:8.4f} ({result['pnl_percent']:+6.2f}%)")
-            print(f"  🔄 Сделок: {result['trades_count']:3d}")
-            print(f"  📊 Кумул.: {result['cumulative_equity']:8.4f}")
-            
-        except Exception as e:
-            print(f"  ❌ ОШИБКА: {e}")
-            results.append({'filename': filename, 'error': str(e)})
+            continue
+        
+        # Кумулятивная доходность
+        total_equity *= result['equity']
+        result['cumulative_equity'] = total_equity
+        
+        results.append(result)
+        
+        print(f"  📈 Sharpe: {result['sharpe']:8.4f}")
+        print(f"  💰 Equity: {result['equity']:8.4f} ({result['pnl_percent']:+6.2f}%)")
+        print(f"  🔄 Сделок: {result['trades_count']:3d} (win rate {result['win_rate'] * 100:5.1f}%)")
+        print(f"  📉 Макс. просадка: {result['max_drawdown'] * 100:6.2f}%")
+        print(f"  📊 Кумул.: {result['cumulative_equity']:8.4f}")
+        if 'cached_from' in result:
+            print(f"  🗄️ Из базы (прогон {result['cached_from']})")
     
     # Общая статистика
     successful_results = [r for r in results if 'error' not in r]
@@ -163,6 +325,11 @@ def run_multiple_backtests(pattern="data/BTCUSDT_2024-07-*.csv.gz", max_files=10
         print(f"Медианный Sharpe: {sorted(sharpe_values)[len(sharpe_values)//2]:8.4f}")
         print(f"Мин/Макс Sharpe: {min(sharpe_values):8.4f} / {max(sharpe_values):8.4f}")
         
+        drawdowns = [r['max_drawdown'] * 100 for r in successful_results]
+        win_rates = [r['win_rate'] * 100 for r in successful_results]
+        print(f"Средняя/Макс просадка: {sum(drawdowns)/len(drawdowns):6.2f}% / {max(drawdowns):6.2f}%")
+        print(f"Средний win rate: {sum(win_rates)/len(win_rates):5.1f}%")
+        
         print(f"Средняя дневная доходность: {sum(pnl_values)/len(pnl_values):+6.2f}%")
         print(f"Медианная доходность: {sorted(pnl_values)[len(pnl_values)//2]:+6.2f}%")
         print(f"Мин/Макс доходность: {min(pnl_values):+6.2f}% / {max(pnl_values):+6.2f}%")
@@ -175,29 +342,233 @@ def run_multiple_backtests(pattern="data/BTCUSDT_2024-07-*.csv.gz", max_files=10
         print(f"Итоговый Equity: {total_equity:.4f}")
         print("=" * 80)
     
+    if results_store is not None:
+        run_id = results_store.save_run(results, strategy_params, engine, stored_mode, pattern)
+        print(f"🗄️ Прогон сохранен в {results_store.path}: id {run_id}")
+        if results_store is not store:
+            results_store.close()
+    
+    return results
+
+# Сколько свечей держать в памяти в непрерывном режиме (остальное — только счетчики)
+CONTINUOUS_HISTORY_WINDOW = 2000
+
+def _day_snapshot(strategy, filename, price, ticks):
+    """Состояние стратегии на конце файла; marked_equity учитывает открытую позицию по цене price"""
+    marked_equity = strategy.equity
+    if strategy.position != 0 and strategy.last_price:
+        marked_equity *= 1 + strategy.position * (price - strategy.last_price) / strategy.last_price
+    metrics = strategy.metrics
+    return {
+        'filename': filename,
+        'ticks': ticks,
+        'candles': len(strategy.candles),
+        'trades': len(strategy.trades),
+        'wins': metrics.wins,
+        'equity': float(strategy.equity),
+        'marked_equity': float(marked_equity),
+        'position': strategy.position,
+        'max_drawdown': metrics.max_drawdown,
+    }
+
+def _day_results(snapshots):
+    """Итоги по дням — разности соседних снимков"""
+    previous = {'candles': 0, 'trades': 0, 'wins': 0, 'marked_equity': 1.0}
+    results = []
+    for snapshot in snapshots:
+        trades = snapshot['trades'] - previous['trades']
+        wins = snapshot['wins'] - previous['wins']
+        day_equity = snapshot['marked_equity'] / previous['marked_equity']
+        results.append({
+            'filename': snapshot['filename'],
+            'ticks': snapshot['ticks'],
+            'candles_count': snapshot['candles'] - previous['candles'],
+            'trades_count': trades,
+            'win_rate': wins / trades if trades else 0.0,
+            'equity': day_equity,
+            'pnl_percent': (day_equity - 1.0) * 100,
+            'cumulative_equity': snapshot['marked_equity'],
+            'position': snapshot['position'],
+        })
+        previous = snapshot
     return results
 
+def run_continuous_backtest(pattern="data/BTCUSDT_2024-07-*.csv.gz", max_files=10, strategy_params=None,
+                            use_cache=True, verbose=True, keep_history=False):
+    """Один экземпляр стратегии на всех файлах подряд, как один поток тиков
+
+    В отличие от run_multiple_backtests индикаторы не стартуют заново
+    каждый день, а позиции переходят через полночь; on_finish — только
+    в конце последнего файла. Итоги по дням — разности снимков состояния
+    на границах файлов (PnL дня — по equity с учетом открытой позиции).
+    Память ограничена: тики идут кусками (iter_ticks_across), а история
+    стратегии — CONTINUOUS_HISTORY_WINDOW свечей, если в strategy_params
+    не задан свой history_window.
+
+    keep_history=True — историю потом читают графики или HTML-отчет: окно
+    остается только вместе с архивом (archive_dir, по умолчанию
+    HISTORY_ARCHIVE_DIR из config), без архива вся история держится в памяти.
+    """
+    import glob
+    from config import HISTORY_ARCHIVE_DIR
+
+    files = sorted(glob.glob(pattern))[:max_files]
+    strategy_params = dict(strategy_params or {})
+    if keep_history:
+        strategy_params.setdefault('archive_dir', HISTORY_ARCHIVE_DIR)
+        if not strategy_params['archive_dir']:
+            strategy_params['history_window'] = None
+    strategy_params.setdefault('history_window', CONTINUOUS_HISTORY_WINDOW)
+    print(f"📊 Непрерывный бэктест: {len(files)} файлов одним потоком")
+    print("=" * 80)
+    strategy = RSIStrategyBase(**strategy_params)
+
+    snapshots = []
+    current_file = None
+    file_ticks = 0
+    price = None
+    for filename, timestamps, prices, volumes in iter_ticks_across(files, use_cache=use_cache):
+        if filename != current_file:
+            if current_file is not None:
+                snapshots.append(_day_snapshot(strategy, current_file, price, file_ticks))
+            current_file, file_ticks = filename, 0
+        for ts, price, volume in zip(timestamps.tolist(), prices.tolist(), volumes.tolist()):
+            strategy.on_tick_ms(price, ts, volume)
+        file_ticks += len(prices)
+    if price is None:
+        print("❌ В файлах нет тиков")
+        return None
+    strategy.on_finish(price)
+    snapshots.append(_day_snapshot(strategy, current_file, price, file_ticks))
+
+    days = _day_results(snapshots)
+    metrics = strategy.metrics.snapshot()
+    if verbose:
+        for i, day in enumerate(days, 1):
+            position = {1: ' (лонг на конец дня)', -1: ' (шорт на конец дня)'}.get(day['position'], '')
+            print(f"[{i}/{len(days)}] {os.path.basename(day['filename'])}: "
+                  f"{day['pnl_percent']:+6.2f}%, сделок {day['trades_count']:3d}, "
+                  f"кумул. {day['cumulative_equity']:8.4f}{position}")
+        skipped = len(files) - len(days)
+        if skipped:
+            print(f"⚠️ Файлов без новых тиков: {skipped}")
+        print("=" * 80)
+        print(f"Sharpe: {strategy.sharpe():.4f}")
+        print(f"Equity: {strategy.equity:.4f} ({(strategy.equity - 1.0) * 100:+.2f}%)")
+        print(f"Сделок: {len(strategy.trades)}, свечей: {len(strategy.candles)}")
+        print_metrics(metrics)
+    return {'days': days, 'metrics': metrics, 'strategy': strategy}
+
 if __name__ == '__main__':
     import sys
     
-    if len(sys.argv) > 1:
-        if sys.argv[1] == '--multiple' or sys.argv[1] == '-m':
+    # --vector: векторный движок (решения по закрытию свечи),
+    # --vector-ticks: векторный движок с потиковыми сигналами
+    argv = sys.argv[1:]
+    # --workers N / -j N: параллельный массовый бэктест (0 — по числу ядер)
+    workers = 1
+    for option in ('--workers', '-j'):
+        if option in argv:
+            k = argv.index(option)
+            workers = int(argv[k + 1]) or None
+            del argv[k:k + 2]
+    # --plot-dir DIR: графики в файлы DIR/window_NNNN.png (--svg — в SVG) без GUI, параллельно при -j (файл или --continuous)
+    # --html PATH: один интерактивный HTML-отчет на весь прогон (файл или --continuous)
+    # --store: сохранять массовый прогон в SQLite (--db PATH — своя база), --store-trades — и сделки
+    plot_dir = None
+    html_path = None
+    db_path = None
+    for option in ('--plot-dir', '--html', '--db'):
+        if option in argv:
+            k = argv.index(option)
+            if option == '--plot-dir':
+                plot_dir = argv[k + 1]
+            elif option == '--html':
+                html_path = argv[k + 1]
+            else:
+                db_path = argv[k + 1]
+            del argv[k:k + 2]
+    flags = {a for a in argv if a in ('--no-plot', '--vector', '--vector-ticks', '--no-cache', '--continuous', '--svg',
+                                      '--store', '--store-trades')}
+    args = [a for a in argv if a not in flags]
+    engine = 'vector' if flags & {'--vector', '--vector-ticks'} else 'tick'
+    vector_mode = 'tick' if '--vector-ticks' in flags else 'candle'
+    # --no-cache: разбирать .csv.gz каждый раз, без кэшей тиков (tick_cache) и свечей (candle_cache)
+    use_cache = '--no-cache' not in flags
+    store = None
+    if db_path or flags & {'--store', '--store-trades'}:
+        from results_store import DEFAULT_DB_PATH
+        store = db_path or DEFAULT_DB_PATH
+    store_trades = '--store-trades' in flags
+    
+    if len(args) > 0:
+        if args[0] == '--sweep':
+            # Перебор параметров на векторном движке (сетка по умолчанию, см. param_sweep.py)
+            from param_sweep import run_sweep
+            pattern = args[1] if len(args) > 1 else "data/BTCUSDT_2024-07-*.csv.gz"
+            max_files = int(args[2]) if len(args) > 2 else 10
+            print(f'--- Перебор параметров: {pattern} (макс {max_files} файлов) ---')
+            run_sweep(pattern, max_files=max_files, mode='tick' if '--vector-ticks' in flags else 'candle',
+                      workers=workers or os.cpu_count() or 1, use_cache=use_cache)
+        elif args[0] == '--walk-forward':
+            # Walk-forward: подбор по train_days дням, проверка на следующих test_days (см. walk_forward.py)
+            from walk_forward import run_walk_forward
+            pattern = args[1] if len(args) > 1 else "data/BTCUSDT_2024-07-*.csv.gz"
+            train_days = int(args[2]) if len(args) > 2 else 10
+            test_days = int(args[3]) if len(args) > 3 else 2
+            print(f'--- Walk-forward: {pattern} (обучение {train_days} дн., тест {test_days} дн.) ---')
+            run_walk_forward(pattern, train_days, test_days, mode='tick' if '--vector-ticks' in flags else 'candle',
+                             workers=workers or os.cpu_count() or 1, use_cache=use_cache)
+        elif args[0] == '--multiple' or args[0] == '-m':
             # Массовое тестирование
-            pattern = sys.argv[2] if len(sys.argv) > 2 else "data/BTCUSDT_2024-07-*.csv.gz"
-            max_files = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+            pattern = args[1] if len(args) > 1 else "data/BTCUSDT_2024-07-*.csv.gz"
+            max_files = int(args[2]) if len(args) > 2 else 10
             print(f'--- Массовый бэктест: {pattern} (макс {max_files} файлов) ---')
-            run_multiple_backtests(pattern, max_files)
+            if '--continuous' in flags:
+                # Один экземпляр стратегии на все файлы (только потиковый движок, без параллели)
+                # Графикам и HTML нужна вся история — окно в памяти только вместе с архивом
+                continuous = run_continuous_backtest(pattern, max_files, use_cache=use_cache,
+                                                     keep_history=bool(html_path or plot_dir))
+                if continuous is not None:
+                    if plot_dir:
+                        plot_strategy(continuous['strategy'], output_dir=plot_dir,
+                                      fmt='svg' if '--svg' in flags else 'png', workers=workers)
+                    if html_path:
+                        from html_report import write_html_report
+                        write_html_report(continuous['strategy'], html_path, title=f'Непрерывный бэктест: {pattern}')
+            else:
+                run_multiple_backtests(pattern, max_files, engine=engine, vector_mode=vector_mode, workers=workers,
+                                       use_cache=use_cache, store=store, store_trades=store_trades)
         else:
             # Одиночный файл
-            filename = sys.argv[1]
-            plot = '--no-plot' not in sys.argv
+            filename = args[0]
+            plot = '--no-plot' not in flags
             print(f'--- Бэктест на {filename} ---')
-            run_backtest_on_file(filename, plot=plot)
+            if engine == 'vector':
+                run_vector_backtest(filename, mode=vector_mode, use_cache=use_cache)
+            else:
+                strategy = run_backtest_on_file(filename, plot=plot and not html_path, use_cache=use_cache,
+                                                plot_dir=plot_dir, plot_format='svg' if '--svg' in flags else 'png',
+                                                plot_workers=workers)
+                if html_path:
+                    from html_report import write_html_report
+                    write_html_report(strategy, html_path, title=f'Бэктест: {os.path.basename(filename)}')
     else:
         # По умолчанию массовое тестирование июля 2024
         print('--- Массовый бэктест (по умолчанию: июль 2024, первые 10 файлов) ---')
         print('Для одиночного файла: python backtester.py <filename>')
         print('Для массового теста: python backtester.py --multiple <pattern> <max_files>')
         print('Для отключения графиков: python backtester.py <filename> --no-plot')
+        print('Графики в файлы без GUI: python backtester.py <filename> --plot-dir charts [--svg] [-j N]')
+        print('Один HTML-отчет на весь прогон: --html report.html (с <filename> или --multiple ... --continuous)')
+        print('Сохранять результаты в SQLite: --store [--db PATH] [--store-trades] (запросы — python results_store.py -h)')
+        print('Векторный движок: --vector (по свечам) или --vector-ticks (потиковые сигналы)')
+        print('Параллельно: --workers N (или -j N, 0 — по числу ядер)')
+        print('Без кэша тиков и свечей: --no-cache')
+        print('Файлы одним потоком, без сброса стратегии по дням: --multiple <pattern> <max_files> --continuous [--html PATH | --plot-dir DIR]')
+        print('Перебор параметров: python backtester.py --sweep <pattern> <max_files> (сетка — python param_sweep.py -h)')
+        print('Walk-forward: python backtester.py --walk-forward <pattern> <train_days> <test_days> '
+              '(настройки — python walk_forward.py -h)')
         print()
-        run_multiple_backtests() 
\ No newline at end of file
+        run_multiple_backtests(engine=engine, vector_mode=vector_mode, workers=workers, use_cache=use_cache,
+                               store=store, store_trades=store_trades) 
\ No newline at end of file
@@ -10,9 +10,15 @@ import logging
 import threading
 import requests
 import json
+import numpy as np
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from rsi_strategy import RSIStrategyBase
-from config import USE_CUSTOM_RSI, USE_DUAL_RSI, USE_NEURAL_FILTER, NEURAL_CONFIDENCE_THRESHOLD
+from candle_series import ms_to_dt
+from history_archive import iter_retained
+from tick_resampler import resample_ohlcv
+from config import USE_CUSTOM_RSI, USE_DUAL_RSI, USE_NEURAL_FILTER, NEURAL_CONFIDENCE_THRESHOLD, NEURAL_MODEL_PATH
+from config import NEURAL_INFERENCE, NEURAL_STALE_POLICY, NEURAL_MAX_WAIT
+from config import HISTORY_WINDOW, HISTORY_ARCHIVE_DIR
 
 # === ЛОГГЕР ===
 def setup_logging():
@@ -88,7 +94,8 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
                         'last_tick': global_bot_instance.last_tick_time.isoformat() if global_bot_instance.last_tick_time else None,
                         'reconnect_attempts': global_bot_instance.reconnect_attempts,
                         'equity': global_bot_instance.strategy.equity,
-                        'trades_count': len(global_bot_instance.strategy.trades)
+                        'trades_count': len(global_bot_instance.strategy.trades),
+                        'metrics': global_bot_instance.strategy.metrics.snapshot()
                     }
                     self.send_response(200)
                 else:
@@ -183,8 +190,10 @@ def create_debug_dump(bot_instance, signal_name="MANUAL"):
                 "equity": bot_instance.strategy.equity,
                 "total_candles": len(bot_instance.strategy.candles),
                 "total_rsi_values": len(bot_instance.strategy.rsi_values),
-                "total_trades": len(bot_instance.strategy.trades)
+                "total_trades": len(bot_instance.strategy.trades),
+                "history_archive": bot_instance.strategy.archive_path
             },
+            "performance_metrics": bot_instance.strategy.metrics.snapshot(),
             "recent_candles": [],
             "rsi_values": [],
             "bb_values": [],
@@ -218,11 +227,11 @@ def create_debug_dump(bot_instance, signal_name="MANUAL"):
             }
             dump_data["current_candle"] = current_candle
         
-        # Добавляем последние 100 значений RSI
-        dump_data["rsi_values"] = bot_instance.strategy.rsi_values[-100:] if len(bot_instance.strategy.rsi_values) > 100 else bot_instance.strategy.rsi_values
+        # Добавляем последние 100 значений RSI (истории — ArchivedList, в JSON только обычный list)
+        dump_data["rsi_values"] = list(iter_retained(bot_instance.strategy.rsi_values))[-100:]
         
         # Добавляем последние 100 значений BB
-        recent_bb = bot_instance.strategy.bb_values[-100:] if len(bot_instance.strategy.bb_values) > 100 else bot_instance.strategy.bb_values
+        recent_bb = list(iter_retained(bot_instance.strategy.bb_values))[-100:]
         for bb in recent_bb:
             if bb[0] is not None:  # ma, upper, lower
                 dump_data["bb_values"].append({
@@ -234,34 +243,37 @@ def create_debug_dump(bot_instance, signal_name="MANUAL"):
                 dump_data["bb_values"].append(None)
         
         # Добавляем точки входа и выхода
-        for entry_time, entry_price in bot_instance.strategy.entry_points:
+        for entry_time, entry_price in iter_retained(bot_instance.strategy.entry_points):
             dump_data["entry_points"].append({
                 "time": entry_time.isoformat(),
                 "price": entry_price
             })
         
-        for exit_time, exit_price in bot_instance.strategy.exit_points:
+        for exit_time, exit_price in iter_retained(bot_instance.strategy.exit_points):
             dump_data["exit_points"].append({
                 "time": exit_time.isoformat(), 
                 "price": exit_price
             })
         
         # Добавляем кривую эквити
-        dump_data["equity_curve"] = bot_instance.strategy.equity_curve[-200:] if len(bot_instance.strategy.equity_curve) > 200 else bot_instance.strategy.equity_curve
+        dump_data["equity_curve"] = list(iter_retained(bot_instance.strategy.equity_curve))[-200:]
         
-        # Рассчитываем текущий RSI вручную для проверки
+        # Текущие значения индикаторов из графа стратегии (кэш на свечу),
+        # без повторного расчета RSI по всей истории
         if len(bot_instance.strategy.candles) > 0:
-            closes = [c.close for c in bot_instance.strategy.candles]
+            closes = bot_instance.strategy.candles.closes[-15:].tolist()
             if bot_instance.strategy.current_candle:
-                closes.append(bot_instance.strategy.current_candle.close)
-            
-            from rsi_strategy import compute_rsi
-            manual_rsi = compute_rsi(closes, bot_instance.strategy.rsi_period)
+                closes = (closes + [bot_instance.strategy.current_candle.close])[-15:]
+            indicator_values = bot_instance.strategy.indicator_values()
+            dump_data["indicator_values"] = {
+                name: list(value) if isinstance(value, tuple) else value
+                for name, value in indicator_values.items()
+            }
             dump_data["manual_rsi_check"] = {
-                "calculated_rsi": manual_rsi,
+                "calculated_rsi": indicator_values.get("rsi"),
                 "last_strategy_rsi": bot_instance.strategy.rsi_values[-1] if bot_instance.strategy.rsi_values else None,
-                "closes_used": closes[-15:],  # последние 15 цен закрытия
-                "total_closes": len(closes)
+                "closes_used": closes,  # последние 15 цен закрытия
+                "total_closes": len(bot_instance.strategy.candles) + (1 if bot_instance.strategy.current_candle else 0)
             }
         
         # Сохраняем в файл
@@ -570,7 +582,13 @@ class RSIBot:
             use_custom_rsi=USE_CUSTOM_RSI,  # 🏆 Конфигурируется в config.py
             use_dual_rsi=USE_DUAL_RSI,
             use_neural_filter=USE_NEURAL_FILTER,  # 🧠 AI-фильтр
-            neural_confidence_threshold=NEURAL_CONFIDENCE_THRESHOLD
+            neural_confidence_threshold=NEURAL_CONFIDENCE_THRESHOLD,
+            neural_model_path=NEURAL_MODEL_PATH,
+            neural_inference=NEURAL_INFERENCE,
+            neural_stale_policy=NEURAL_STALE_POLICY,
+            neural_max_wait=NEURAL_MAX_WAIT,
+            history_window=HISTORY_WINDOW,  # 💾 Ограничение памяти + архив истории
+            archive_dir=HISTORY_ARCHIVE_DIR
         )
         self.position = 0  # 1 = long, -1 = short, 0 = flat
         self.last_signal = 0
@@ -717,7 +735,16 @@ class RSIBot:
         
         # Используем стратегию для обработки тика
         signal = self.strategy.on_tick(price, dt)
-        
+        self._process_signal(signal, price, int(dt.timestamp()) // 60)
+
+    def on_tick_ms(self, price, ts_ms):
+        """on_tick для метки времени сделки в мс (без datetime на каждый тик)"""
+        self.last_tick_time = time.time()
+        signal = self.strategy.on_tick_ms(price, ts_ms)
+        self._process_signal(signal, price, ts_ms // 60000)
+
+    def _process_signal(self, signal, price, current_minute):
+        """Торговля по сигналу и статус раз в минуту (current_minute — номер минуты Unix)"""
         # Получаем текущие значения для логирования
         if self.strategy.rsi_values:
             self.last_rsi = self.strategy.rsi_values[-1]
@@ -752,7 +779,6 @@ class RSIBot:
             self.last_signal = signal
         
         # --- Вывод RSI, цены и BB раз в минуту ---
-        current_minute = dt.replace(second=0, microsecond=0)
         if self.last_rsi_print_minute is None or current_minute > self.last_rsi_print_minute:
             bb_str = ""
             if self.strategy.bb_values and len(self.strategy.bb_values) > 0:
@@ -1020,15 +1046,11 @@ def main():
     )
     # klines['result']['list'] — список свечей от новых к старым!
     raw_candles = klines['result']['list'][::-1]  # теперь от старых к новым
-    preload = []
-    for c in raw_candles:
-        preload.append({
-            'open': float(c[1]),
-            'high': float(c[2]),
-            'low': float(c[3]),
-            'close': float(c[4]),
-            'start_time': datetime.fromtimestamp(int(c[0]) / 1000, timezone.utc)
-        })
+    # [start, open, high, low, close, volume, turnover] -> колонки numpy,
+    # 5-минутные свечи сворачиваем в интервал стратегии
+    kline_rows = np.array([c[:6] for c in raw_candles], dtype=np.float64).reshape(-1, 6)
+    preload = resample_ohlcv(kline_rows[:, 0].astype(np.int64), kline_rows[:, 1], kline_rows[:, 2],
+                             kline_rows[:, 3], kline_rows[:, 4], kline_rows[:, 5], CANDLE_MINUTES)
     # --- Вывод баланса ---
     try:
         balance = http.get_wallet_balance(accountType="UNIFIED", coin="USDT")
@@ -1073,16 +1095,16 @@ def main():
     logger.info(f"🤖 [BOT] Экземпляр бота зарегистрирован для дебаг-дампов (PID: {os.getpid()})")
     
     # Предзагружаем исторические данные в стратегию
-    for candle in preload:
-        # Конвертируем в формат, который ожидает стратегия
-        # Стратегия ожидает datetime объект, а не timestamp
-        bot.strategy.on_tick(candle['close'], candle['start_time'])
+    # (последняя свеча — текущая, живые тики продолжат её)
+    bot.strategy.load_candles(preload['start_ms'], preload['open'], preload['high'],
+                              preload['low'], preload['close'], preload['volume'])
     
     # --- Вывод последнего RSI и цены ---
     if bot.strategy.rsi_values:
         last_rsi = bot.strategy.rsi_values[-1]
-        last_price = preload[-1]['close'] if preload else 0
-        last_time = preload[-1]['start_time'] if preload else datetime.now(timezone.utc)
+        has_preload = len(preload['close']) > 0
+        last_price = preload['close'][-1] if has_preload else 0
+        last_time = ms_to_dt(preload['start_ms'][-1]) if has_preload else datetime.now(timezone.utc)
         logger.info(f"Last candle: {last_time.strftime('%Y-%m-%d %H:%M:%S')} Close: {last_price} RSI({RSI_PERIOD}): {last_rsi:.2f}")
     
     # ВАЖНО: Синхронизируем позиции бота и стратегии
@@ -1109,9 +1131,8 @@ def main():
             for trade in msg['data']:
                 price = float(trade['p'])
                 ts = int(trade['T'])
-                # Конвертируем timestamp в datetime объект
-                dt = datetime.fromtimestamp(ts / 1000, timezone.utc)
-                bot.on_tick(price, dt)
+                # Метка времени в мс идет в стратегию как есть (datetime — только на границе свечи)
+                bot.on_tick_ms(price, ts)
     
     try:
         ws.trade_stream(
@@ -0,0 +1,127 @@
+"""
+Постоянный кэш готовых свечей по файлу тиков и candle_minutes
+
+Прогонам, которым не нужны тики (векторный движок в режиме 'candle'),
+хватает свечей OHLCV. Они сохраняются в <папка файла>/.candle_cache/
+(или cache_dir) под ключом "имя файла + отпечаток исходника + candle_minutes";
+отпечаток — размер, mtime и путь исходника, поэтому измененный файл просто
+получает новый ключ, а старые записи уходят при вытеснении.
+
+Размер кэша ограничен max_bytes: при записи удаляются давно не
+использованные файлы (LRU по mtime, который обновляется при каждом чтении).
+"""
+
+import hashlib
+import os
+import uuid
+import zipfile
+
+import numpy as np
+
+from tick_cache import load_ticks
+from tick_resampler import resample_ticks
+
+CACHE_DIRNAME = '.candle_cache'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CANDLE_FIELDS = ('start_ms', 'open', 'high', 'low', 'close', 'volume')
+
+
+def source_fingerprint(filename):
+    """Отпечаток исходного файла: путь, размер и mtime"""
+    stat = os.stat(filename)
+    key = f"{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_base_dir(filename, cache_dir=None):
+    return cache_dir or os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIRNAME)
+
+
+def cache_path(filename, candle_minutes, cache_dir=None):
+    name = f"{os.path.basename(filename)}.{source_fingerprint(filename)}.{candle_minutes}m.npz"
+    return os.path.join(cache_base_dir(filename, cache_dir), name)
+
+
+def build_candles(filename, candle_minutes=5, use_tick_cache=True):
+    """Свечи из тиков файла (без кэша свечей); ticks_count — число тиков"""
+    timestamps, prices, volumes = load_ticks(filename, use_cache=use_tick_cache)
+    candles = resample_ticks(timestamps, prices, volumes, candle_minutes)
+    result = {field: candles[field] for field in CANDLE_FIELDS}
+    result['ticks_count'] = len(prices)
+    return result
+
+
+def _read(path):
+    with np.load(path) as data:
+        candles = {field: data[field] for field in CANDLE_FIELDS}
+        candles['ticks_count'] = int(data['ticks_count'])
+    return candles
+
+
+def _write(path, candles):
+    """Запись через уникальный временный файл: параллельные процессы не пишут в один .tmp"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **candles)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def evict(cache_dir, max_bytes=DEFAULT_MAX_BYTES, keep=None):
+    """Удаляет давно не использованные записи, пока кэш больше max_bytes"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.npz'):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue    # удалил параллельный процесс
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed.append(path)
+    return removed
+
+
+def load_candles(filename, candle_minutes=5, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, use_cache=True):
+    """Свечи файла (dict массивов start_ms/open/high/low/close/volume + ticks_count)
+
+    Из кэша, если запись есть, иначе строятся из тиков и сохраняются.
+    """
+    if not use_cache:
+        return build_candles(filename, candle_minutes, use_tick_cache=False)
+    path = cache_path(filename, candle_minutes, cache_dir)
+    if os.path.exists(path):
+        try:
+            candles = _read(path)
+            os.utime(path)  # LRU: время последнего использования
+            return candles
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            pass  # поврежденная или обрезанная запись — пересобираем
+    candles = build_candles(filename, candle_minutes)
+    try:
+        _write(path, candles)
+        evict(os.path.dirname(path), max_bytes, keep=path)
+    except OSError as e:
+        print(f"⚠️ Не удалось записать кэш свечей для {filename}: {e}")
+    return candles
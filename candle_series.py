@@ -0,0 +1,250 @@
+"""
+Колоночное хранилище свечей
+
+CandleSeries хранит свечи в заранее выделенных numpy-буферах
+(start_time в int64 мс, open/high/low/close/volume в float64), которые
+растут удвоением. Индикаторы получают представления (views) колонок без
+копирования, а индексация по-прежнему отдает объекты Candle, поэтому
+create_debug_dump, plot_strategy и прочий код со списком свечей работает
+без изменений.
+
+С maxlen ряд держит в памяти только последние maxlen свечей, а вытесненные
+дописывает в архив (history_archive.ArchiveFile). len() и индексы при этом
+остаются глобальными, строки из архива читаются прозрачно.
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+class Candle:
+    """Свеча (строка CandleSeries или формирующаяся свеча стратегии)"""
+
+    __slots__ = ('start_time', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, start_time, open=None, high=None, low=None, close=None, volume=0.0):
+        self.start_time = start_time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def add_tick(self, price, volume):
+        if self.open is None:
+            self.open = price
+        self.high = price if self.high is None else max(self.high, price)
+        self.low = price if self.low is None else min(self.low, price)
+        self.close = price
+        self.volume += volume
+
+    def to_tuple(self):
+        return (self.start_time, self.open, self.high, self.low, self.close, self.volume)
+
+    def to_dict(self):
+        return {
+            'start_time': self.start_time,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume
+        }
+
+    def __repr__(self):
+        return f"Candle({self.start_time}, o={self.open}, h={self.high}, l={self.low}, c={self.close}, v={self.volume})"
+
+
+# Формат записи свечи в архиве
+CANDLE_DTYPE = np.dtype([('start', '<i8'), ('open', '<f8'), ('high', '<f8'),
+                         ('low', '<f8'), ('close', '<f8'), ('volume', '<f8')])
+
+
+def dt_to_ms(dt):
+    """datetime -> миллисекунды Unix (начала свечей кратны минуте, round безопасен)"""
+    return round(dt.timestamp() * 1000)
+
+
+def ms_to_dt(ms, tz=timezone.utc):
+    return datetime.fromtimestamp(int(ms) / 1000, tz)
+
+
+class CandleSeries:
+    """Колоночный ряд закрытых свечей
+
+    Свойства start_times/opens/highs/lows/closes/volumes возвращают
+    представления буферов без копирования (при maxlen — только удерживаемые
+    в памяти свечи). Представление остается корректным до следующего роста
+    или сдвига буфера (append при заполненной емкости), поэтому его не стоит
+    хранить между свечами.
+    """
+
+    def __init__(self, capacity=1024, tz=timezone.utc, maxlen=None, archive=None):
+        self._size = 0              # свечей в памяти
+        self.offset = 0             # вытеснено свечей (глобальный индекс первой в памяти)
+        self.tz = tz
+        self.maxlen = maxlen
+        self.archive = archive
+        if maxlen is not None:
+            # Сдвиг буфера раз в maxlen свечей — амортизированно O(1)
+            capacity = 2 * maxlen
+        self._allocate(max(int(capacity), 1))
+
+    def _allocate(self, capacity):
+        self._start = np.empty(capacity, dtype=np.int64)
+        self._open = np.empty(capacity, dtype=np.float64)
+        self._high = np.empty(capacity, dtype=np.float64)
+        self._low = np.empty(capacity, dtype=np.float64)
+        self._close = np.empty(capacity, dtype=np.float64)
+        self._volume = np.empty(capacity, dtype=np.float64)
+
+    @property
+    def capacity(self):
+        return len(self._close)
+
+    def _grow(self, min_capacity):
+        capacity = self.capacity
+        while capacity < min_capacity:
+            capacity *= 2
+        old = (self._start, self._open, self._high, self._low, self._close, self._volume)
+        self._allocate(capacity)
+        n = self._size
+        for dst, src in zip((self._start, self._open, self._high, self._low, self._close, self._volume), old):
+            dst[:n] = src[:n]
+
+    def _evict(self, count):
+        """Сбрасывает count старейших свечей в архив и сдвигает буфер"""
+        columns = (self._start, self._open, self._high, self._low, self._close, self._volume)
+        if self.archive is not None:
+            records = np.empty(count, dtype=CANDLE_DTYPE)
+            for name, column in zip(CANDLE_DTYPE.names, columns):
+                records[name] = column[:count]
+            self.archive.append(records)
+        n = self._size
+        for column in columns:
+            column[:n - count] = column[count:n]
+        self._size = n - count
+        self.offset += count
+
+    # --- Запись ---
+
+    def append(self, candle):
+        """Добавляет закрытую свечу (объект Candle)"""
+        if self._size == 0 and isinstance(candle.start_time, datetime):
+            self.tz = candle.start_time.tzinfo
+        self.append_values(dt_to_ms(candle.start_time), candle.open, candle.high,
+                           candle.low, candle.close, candle.volume)
+
+    def append_values(self, start_ms, open, high, low, close, volume=0.0):
+        if self._size == self.capacity:
+            if self.maxlen is not None:
+                self._evict(self._size - self.maxlen)
+            else:
+                self._grow(self._size + 1)
+        i = self._size
+        self._start[i] = start_ms
+        self._open[i] = open
+        self._high[i] = high
+        self._low[i] = low
+        self._close[i] = close
+        self._volume[i] = volume
+        self._size = i + 1
+
+    # --- Представления колонок (zero-copy) ---
+
+    @property
+    def start_times(self):
+        return self._start[:self._size]
+
+    @property
+    def opens(self):
+        return self._open[:self._size]
+
+    @property
+    def highs(self):
+        return self._high[:self._size]
+
+    @property
+    def lows(self):
+        return self._low[:self._size]
+
+    @property
+    def closes(self):
+        return self._close[:self._size]
+
+    @property
+    def volumes(self):
+        return self._volume[:self._size]
+
+    def view(self, start=0, stop=None):
+        """Срез CandleSeries[start:stop] поверх тех же буферов (без копирования)
+
+        Индексы глобальные; вытесненные в архив свечи в срез не попадают.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        start = max(start, self.offset) - self.offset
+        stop = max(start, stop - self.offset)
+        sub = CandleSeries.__new__(CandleSeries)
+        sub.tz = self.tz
+        sub.offset = 0
+        sub.maxlen = None
+        sub.archive = None
+        sub._size = stop - start
+        sub._start = self._start[start:stop]
+        sub._open = self._open[start:stop]
+        sub._high = self._high[start:stop]
+        sub._low = self._low[start:stop]
+        sub._close = self._close[start:stop]
+        sub._volume = self._volume[start:stop]
+        return sub
+
+    # --- Совместимость со списком Candle ---
+
+    def __len__(self):
+        return self.offset + self._size
+
+    def _row(self, i):
+        return Candle(ms_to_dt(self._start[i], self.tz), float(self._open[i]), float(self._high[i]),
+                      float(self._low[i]), float(self._close[i]), float(self._volume[i]))
+
+    def _archived_rows(self, start, stop):
+        if self.archive is None:
+            raise IndexError('свеча вытеснена из памяти, архив не подключен')
+        return [Candle(ms_to_dt(r[0], self.tz), *r[1:]) for r in self.archive.read(start, stop).tolist()]
+
+    def __getitem__(self, index):
+        total = len(self)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(total)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            rows = []
+            if start < min(stop, self.offset):
+                rows = self._archived_rows(start, min(stop, self.offset))
+            rows.extend(self._row(i - self.offset) for i in range(max(start, self.offset), stop))
+            return rows
+        if index < 0:
+            index += total
+        if not 0 <= index < total:
+            raise IndexError('CandleSeries index out of range')
+        if index < self.offset:
+            return self._archived_rows(index, index + 1)[0]
+        return self._row(index - self.offset)
+
+    def __iter__(self):
+        """Все свечи по порядку; без архива при вытесненных свечах — IndexError, как у индексов"""
+        if self.offset:
+            if self.archive is None:
+                raise IndexError('свеча вытеснена из памяти, архив не подключен')
+            for start in range(0, self.offset, 65536):
+                yield from self._archived_rows(start, min(start + 65536, self.offset))
+        yield from self.iter_in_memory()
+
+    def iter_in_memory(self):
+        """Только свечи, которые еще в памяти (последние, начиная с offset)"""
+        for i in range(self._size):
+            yield self._row(i)
+
+    def __bool__(self):
+        return len(self) > 0
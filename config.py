@@ -34,6 +34,14 @@ SYMBOL = 'BTCUSDT'
 RECONNECT_DELAY = 30
 MAX_RECONNECT_ATTEMPTS = 10
 
+# 💾 Ограничение памяти живого бота
+HISTORY_WINDOW = 2000            # Свечей в памяти сверх окна индикаторов (None = хранить всё)
+HISTORY_ARCHIVE_DIR = 'data/history'  # Архив вытесненной истории (None = не сохранять)
+
 # 🧠 Нейронная сеть (AI-фильтр)
 USE_NEURAL_FILTER = False        # True = использовать нейронный фильтр для сигналов
 NEURAL_CONFIDENCE_THRESHOLD = 0.6  # Минимальная уверенность для входа (0.0-1.0)
+NEURAL_MODEL_PATH = 'models/neural_filter.npz'  # Веса сети (export_neural_filter.py)
+NEURAL_INFERENCE = 'thread'      # 'sync' = на тике, 'thread'/'process' = вне потока WebSocket при закрытии свечи
+NEURAL_STALE_POLICY = 'wait'     # Результат свечи не готов: 'trade' = входить, 'skip' = не входить, 'wait' = ждать
+NEURAL_MAX_WAIT = 0.05           # Сколько ждать при 'wait' (секунды), затем не входить
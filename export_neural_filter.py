@@ -0,0 +1,73 @@
+"""
+Выгрузка обученной Keras-модели нейронного фильтра в .npz для neural_filter
+
+TensorFlow нужен только здесь (офлайн), живой бот читает готовый .npz.
+
+Использование:
+    python export_neural_filter.py model.keras [--scaler scaler.joblib] [--lookback 20] [-o models/neural_filter.npz]
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from neural_filter import ACTIVATIONS, DEFAULT_LOOKBACK, DEFAULT_MODEL_PATH, FEATURE_NAMES
+
+
+def _activation_name(layer):
+    activation = layer.get_config().get('activation', 'linear')
+    if isinstance(activation, dict):
+        activation = activation.get('config', {}).get('name', activation.get('class_name', 'linear'))
+    return str(activation).lower()
+
+
+def export_model(model_path, output_path=DEFAULT_MODEL_PATH, scaler_path=None, lookback=DEFAULT_LOOKBACK):
+    """Веса Dense-слоев (+ стандартизация входа) -> .npz"""
+    import tensorflow as tf  # только для выгрузки
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    arrays = {'lookback': np.array(lookback)}
+    activations = []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            # InputLayer, Dropout и т.п. на инференс не влияют
+            continue
+        if layer.__class__.__name__ != 'Dense':
+            raise ValueError(f"Слой {layer.name} ({layer.__class__.__name__}) не поддерживается, нужны Dense")
+        activation = _activation_name(layer)
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Активация {activation} слоя {layer.name} не поддерживается")
+        kernel, bias = weights
+        arrays[f'kernel_{len(activations)}'] = kernel
+        arrays[f'bias_{len(activations)}'] = bias
+        activations.append(activation)
+
+    n_inputs = lookback * len(FEATURE_NAMES)
+    if arrays['kernel_0'].shape[0] != n_inputs:
+        raise ValueError(f"Вход модели {arrays['kernel_0'].shape[0]}, а окно {lookback} свечей дает {n_inputs} признаков")
+    if scaler_path:
+        import joblib
+        scaler = joblib.load(scaler_path)
+        arrays['mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+        arrays['scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+    else:
+        arrays['mean'] = np.zeros(n_inputs)
+        arrays['scale'] = np.ones(n_inputs)
+    arrays['activations'] = np.array(activations)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    np.savez(output_path, **arrays)
+    print(f"✅ Модель выгружена: {output_path} ({len(activations)} слоев: {', '.join(activations)})")
+    return output_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Выгрузка Keras-модели нейронного фильтра в .npz')
+    parser.add_argument('model', help='Путь к .keras/.h5 модели')
+    parser.add_argument('--scaler', help='StandardScaler (joblib), которым нормализовались признаки')
+    parser.add_argument('--lookback', type=int, default=DEFAULT_LOOKBACK, help='Свечей в окне признаков')
+    parser.add_argument('-o', '--output', default=DEFAULT_MODEL_PATH, help='Куда записать .npz')
+    args = parser.parse_args()
+    export_model(args.model, args.output, args.scaler, args.lookback)
@@ -0,0 +1,183 @@
+"""
+Ограничение памяти для долгоживущей стратегии
+
+ArchivedList ведет себя как список (len, индексы, срезы, итерация по всей
+истории), но держит в памяти только последние maxlen элементов. Вытесненные
+элементы дописываются в append-only архив на диске (ArchiveFile) и читаются
+оттуда прозрачно — дебаг-дамп и графики работают как со списком.
+
+Формат архива: сырые записи фиксированного numpy dtype подряд, без заголовка;
+dtype задается кодеком (FLOAT_CODEC, BB_CODEC, POINT_CODEC, CANDLE_DTYPE).
+"""
+
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+from candle_series import CANDLE_DTYPE, dt_to_ms, ms_to_dt
+
+# Сколько записей читать из архива за раз при итерации
+READ_CHUNK = 65536
+
+Codec = namedtuple('Codec', ['dtype', 'encode', 'decode'])
+
+
+def _encode_bb(bb):
+    return tuple(np.nan if v is None else v for v in bb)
+
+
+def _decode_bb(row):
+    ma, upper, lower = row
+    if np.isnan(ma):
+        return (None, None, None)
+    return (ma, upper, lower)
+
+
+def _encode_point(point):
+    t, price = point
+    return (dt_to_ms(t), price)
+
+
+def _decode_point(row):
+    ms, price = row
+    return (ms_to_dt(ms), price)
+
+
+# Значения индикаторов, equity, сделки
+FLOAT_CODEC = Codec(np.dtype('<f8'), float, float)
+# Bollinger Bands: (ma, upper, lower), None хранится как NaN
+BB_CODEC = Codec(np.dtype([('ma', '<f8'), ('upper', '<f8'), ('lower', '<f8')]), _encode_bb, _decode_bb)
+# Точки входа/выхода: (datetime UTC, цена)
+POINT_CODEC = Codec(np.dtype([('time', '<i8'), ('price', '<f8')]), _encode_point, _decode_point)
+
+
+def iter_retained(history):
+    """Элементы истории, доступные без архива: list — целиком, ArchivedList/CandleSeries — из памяти
+
+    Для мест, которым достаточно последних значений (дебаг-дамп) и которые
+    не должны падать при history_window без archive_dir.
+    """
+    iter_in_memory = getattr(history, 'iter_in_memory', None)
+    return iter_in_memory() if iter_in_memory is not None else iter(history)
+
+
+def create_session_dir(base_dir):
+    """Отдельная папка архива на каждый запуск процесса"""
+    name = f"{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+    path = os.path.join(base_dir, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class ArchiveFile:
+    """Append-only файл записей фиксированного dtype"""
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        # Архив всегда начинается с пустого файла текущей сессии
+        open(self.path, 'wb').close()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, records):
+        records = np.asarray(records, dtype=self.dtype)
+        with open(self.path, 'ab') as f:
+            records.tofile(f)
+        self.count += len(records)
+
+    def read(self, start, stop):
+        start = max(0, start)
+        stop = min(stop, self.count)
+        if stop <= start:
+            return np.empty(0, dtype=self.dtype)
+        return np.fromfile(self.path, dtype=self.dtype, count=stop - start,
+                           offset=start * self.dtype.itemsize)
+
+
+class ArchivedList:
+    """Список с ограничением памяти и прозрачным чтением архива
+
+    len() и индексы — глобальные (по всей истории). В памяти остаются
+    последние maxlen элементов; вытеснение идет пачками при достижении
+    2 * maxlen, поэтому append — амортизированно O(1). Без archive
+    вытесненные элементы отбрасываются, а обращение к ним дает IndexError.
+    """
+
+    def __init__(self, maxlen, archive=None, codec=FLOAT_CODEC):
+        self.maxlen = maxlen
+        self.archive = archive
+        self.codec = codec
+        self.offset = 0             # число вытесненных элементов
+        self._items = []
+
+    def append(self, item):
+        self._items.append(item)
+        if len(self._items) >= 2 * self.maxlen:
+            self._evict(len(self._items) - self.maxlen)
+
+    def _evict(self, count):
+        evicted = self._items[:count]
+        if self.archive is not None:
+            self.archive.append([self.codec.encode(item) for item in evicted])
+        del self._items[:count]
+        self.offset += count
+
+    def __len__(self):
+        return self.offset + len(self._items)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def _decode(self, rows):
+        if rows.dtype.names:
+            return [self.codec.decode(row) for row in rows.tolist()]
+        return [self.codec.decode(row) for row in rows]
+
+    def _read_archived(self, start, stop):
+        if self.archive is None:
+            raise IndexError('элемент вытеснен из памяти, архив не подключен')
+        return self._decode(self.archive.read(start, stop))
+
+    def __getitem__(self, index):
+        total = len(self)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(total)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if stop <= start:
+                return []
+            result = []
+            if start < self.offset:
+                result = self._read_archived(start, min(stop, self.offset))
+            if stop > self.offset:
+                result.extend(self._items[max(start, self.offset) - self.offset:stop - self.offset])
+            return result
+        if index < 0:
+            index += total
+        if not 0 <= index < total:
+            raise IndexError('ArchivedList index out of range')
+        if index >= self.offset:
+            return self._items[index - self.offset]
+        return self._read_archived(index, index + 1)[0]
+
+    def __iter__(self):
+        """Вся история по порядку; без архива при вытеснении — IndexError, как у индексов"""
+        if self.offset:
+            for start in range(0, self.offset, READ_CHUNK):
+                yield from self._read_archived(start, min(start + READ_CHUNK, self.offset))
+        yield from list(self._items)
+
+    def iter_in_memory(self):
+        """Только элементы, которые еще в памяти (последние, начиная с offset)"""
+        yield from list(self._items)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(list(self), dtype=dtype)
+
+    def __repr__(self):
+        return f"ArchivedList(len={len(self)}, in_memory={len(self._items)}, archived={self.offset})"
@@ -0,0 +1,385 @@
+"""
+Интерактивный HTML-отчет по бэктесту: один самодостаточный файл на весь прогон
+
+Вместо сотен окон plot_strategy — одна страница с ценой и Bollinger Bands,
+входами/выходами, RSI и equity. Обзор прореживается до point_budget точек:
+цена — min/max по корзинам (экстремумы не теряются), BB, RSI и equity —
+LTTB (Largest-Triangle-Three-Buckets). Полные данные лежат в том же файле
+тайлами по TILE_CANDLES свечей в <script type="application/json"> и
+разбираются только при приближении к их участку, поэтому даже год свечей
+открывается сразу. Внешних библиотек нет — графики рисуются на canvas.
+
+Использование:
+    python backtester.py <filename> --html report.html
+    python backtester.py --multiple <pattern> <max_files> --continuous --html report.html
+"""
+
+import html
+import json
+import math
+import os
+
+import numpy as np
+
+from history_archive import iter_retained
+
+DEFAULT_POINT_BUDGET = 2000
+TILE_CANDLES = 2048
+
+
+def lttb(x, y, threshold):
+    """Индексы точек после прореживания Largest-Triangle-Three-Buckets
+
+    NaN (например, BB до накопления периода) пропускаются.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if threshold >= n or threshold < 3:
+        return valid
+    xv = np.asarray(x, dtype=float)[valid]
+    yv = np.asarray(y, dtype=float)[valid]
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    bucket = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(math.floor(i * bucket)) + 1
+        stop = int(math.floor((i + 1) * bucket)) + 1
+        next_stop = min(int(math.floor((i + 2) * bucket)) + 1, n)
+        # Вершина треугольника в следующей корзине — ее среднее
+        avg_x = xv[stop:next_stop].mean() if next_stop > stop else xv[-1]
+        avg_y = yv[stop:next_stop].mean() if next_stop > stop else yv[-1]
+        area = np.abs((xv[a] - avg_x) * (yv[start:stop] - yv[a]) - (xv[a] - xv[start:stop]) * (avg_y - yv[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return valid[selected]
+
+
+def minmax_buckets(y, buckets):
+    """Индексы минимума и максимума каждой корзины (по возрастанию)"""
+    n = len(y)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    full = n // size * size
+    blocks = np.asarray(y[:full], dtype=float).reshape(-1, size)
+    offsets = np.arange(0, full, size)
+    indices = [offsets + np.nanargmin(blocks, axis=1), offsets + np.nanargmax(blocks, axis=1)]
+    if full < n:
+        tail = np.asarray(y[full:], dtype=float)
+        indices.append(np.array([full + np.nanargmin(tail), full + np.nanargmax(tail)]))
+    return np.unique(np.concatenate(indices))
+
+
+def _series_from_strategy(strategy):
+    """Колонки прогона (свечи, индикаторы, equity), выровненные по свечам
+
+    С history_window без архива в отчет попадает только то, что осталось
+    в памяти, — об этом печатается предупреждение.
+    """
+    candles = strategy.candles
+    histories = (strategy.rsi_values, strategy.bb_values, strategy.equity_curve)
+    n = min(len(candles), *(len(h) for h in histories))
+    start = 0
+    if strategy.archive_path is None:
+        start = max([candles.offset] + [getattr(h, 'offset', 0) for h in histories])
+    start = min(start, n)
+    if start:
+        print(f"⚠️ HTML-отчет неполный: первые {start} свечей вытеснены из памяти, архив не подключен "
+              f"(history_window без archive_dir) — отчет начинается со свечи {start + 1} из {n}")
+    if start >= candles.offset:
+        view = candles.view(start, n)
+        start_ms = np.array(view.start_times, dtype=np.int64)
+        ohlc = [np.array(column, dtype=float) for column in (view.opens, view.highs, view.lows, view.closes)]
+    else:
+        rows = candles[start:n]
+        start_ms = np.array([int(c.start_time.timestamp() * 1000) for c in rows], dtype=np.int64)
+        ohlc = [np.array([getattr(c, field) for c in rows], dtype=float) for field in ('open', 'high', 'low', 'close')]
+    bb = np.array(strategy.bb_values[start:n], dtype=float).reshape(-1, 3)
+    return {
+        't': start_ms,
+        'o': ohlc[0], 'h': ohlc[1], 'l': ohlc[2], 'c': ohlc[3],
+        'bbm': bb[:, 0], 'bbu': bb[:, 1], 'bbl': bb[:, 2],
+        'rsi': np.array(strategy.rsi_values[start:n], dtype=float),
+        'eq': np.array(strategy.equity_curve[start:n], dtype=float),
+    }
+
+
+def _points(points, start_ms, end_ms):
+    """[(datetime, цена)] -> [[мс, цена]] только внутри [start_ms, end_ms)"""
+    result = []
+    for t, p in points:
+        ms = int(t.timestamp() * 1000)
+        if start_ms <= ms < end_ms:
+            result.append([ms, float(p)])
+    return result
+
+
+def _trade_points(strategy, points):
+    """Все точки входов/выходов; без архива — только оставшиеся в памяти"""
+    return iter(points) if strategy.archive_path is not None else iter_retained(points)
+
+
+# Знаков после запятой для рядов индикаторов в тайлах (цены пишутся как есть)
+ROUND_DIGITS = {'bbm': 4, 'bbu': 4, 'bbl': 4, 'rsi': 3, 'eq': 6}
+
+
+def _json_values(values, digits=None):
+    """Массив -> список для JSON (NaN -> null)"""
+    if digits is not None:
+        values = np.round(values, digits)
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _overview(series, budget):
+    """Прореженные ряды обзора: {имя: [[мс, значение], ...]}"""
+    t = series['t']
+    overview = {}
+    price_idx = minmax_buckets(series['c'], max(budget // 2, 1))
+    overview['c'] = [[int(t[i]), float(series['c'][i])] for i in price_idx]
+    for name in ('bbm', 'bbu', 'bbl', 'rsi', 'eq'):
+        idx = lttb(t, series[name], budget)
+        overview[name] = [[int(t[i]), float(series[name][i])] for i in idx]
+    return overview
+
+
+def build_report_data(strategy, point_budget=DEFAULT_POINT_BUDGET, tile_candles=TILE_CANDLES, title=None):
+    """(данные обзора, тайлы полного разрешения) для отчета"""
+    series = _series_from_strategy(strategy)
+    t = series['t']
+    candle_ms = strategy.candle_minutes * 60000
+    # Входы/выходы — только на свечах отчета (без архива ранние уже не в памяти)
+    span = (int(t[0]), int(t[-1]) + candle_ms) if len(t) else (0, 0)
+    tiles = []
+    for start in range(0, len(t), tile_candles):
+        stop = start + tile_candles
+        tiles.append({name: _json_values(values[start:stop], ROUND_DIGITS.get(name))
+                      for name, values in series.items()})
+    data = {
+        'title': title or 'Backtest report',
+        'candle_ms': candle_ms,
+        'rsi_buy': strategy.rsi_buy,
+        'rsi_sell': strategy.rsi_sell,
+        'rsi_period': strategy.rsi_period,
+        'budget': point_budget,
+        'count': len(t),
+        'tiles': [[int(tile['t'][0]), int(tile['t'][-1])] for tile in tiles],
+        'overview': _overview(series, point_budget) if len(t) else {},
+        'entries': _points(_trade_points(strategy, strategy.entry_points), *span),
+        'exits': _points(_trade_points(strategy, strategy.exit_points), *span),
+        'summary': {
+            'equity': float(strategy.equity),
+            'sharpe': float(strategy.sharpe()),
+            'trades': len(strategy.trades),
+            'candles': len(strategy.candles),
+        },
+    }
+    return data, tiles
+
+
+def _script_json(value):
+    # "</" внутри <script> закрыл бы тег
+    return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
+
+
+def write_html_report(strategy, path, point_budget=DEFAULT_POINT_BUDGET, tile_candles=TILE_CANDLES, title=None):
+    """Пишет самодостаточный HTML-отчет по стратегии после прогона, возвращает path"""
+    data, tiles = build_report_data(strategy, point_budget, tile_candles, title)
+    tile_tags = ''.join(f'<script type="application/json" id="tile-{i}">{_script_json(tile)}</script>\n'
+                        for i, tile in enumerate(tiles))
+    page = (_TEMPLATE
+            .replace('__TITLE__', html.escape(data['title']))
+            .replace('__DATA__', _script_json(data))
+            .replace('__TILES__', tile_tags))
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    print(f"📄 HTML-отчет: {path} ({data['count']} свечей, {len(tiles)} тайлов, "
+          f"{os.path.getsize(path) / 1024 / 1024:.1f} МБ)")
+    return path
+
+
+_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+  body { font-family: sans-serif; margin: 12px; background: #fafafa; color: #222; }
+  h1 { font-size: 18px; margin: 0 0 4px; }
+  #info { font-size: 13px; color: #555; margin-bottom: 8px; }
+  canvas { display: block; width: 100%; background: #fff; border: 1px solid #ddd; margin-bottom: 6px; cursor: crosshair; }
+</style>
+</head>
+<body>
+<h1>__TITLE__</h1>
+<div id="info"></div>
+<canvas id="price" height="380"></canvas>
+<canvas id="rsi" height="160"></canvas>
+<canvas id="equity" height="180"></canvas>
+<script type="application/json" id="report-data">__DATA__</script>
+__TILES__<script>
+(function () {
+  const D = JSON.parse(document.getElementById('report-data').textContent);
+  const tiles = {};  // разобранные тайлы: JSON.parse только при приближении
+  const full = D.tiles.length ? [D.tiles[0][0], D.tiles[D.tiles.length - 1][1] + D.candle_ms] : [0, 1];
+  let view = full.slice();
+  const panels = [
+    {id: 'price', label: 'Цена / BB'},
+    {id: 'rsi', label: 'RSI(' + D.rsi_period + ')', range: [0, 100]},
+    {id: 'equity', label: 'Equity'},
+  ];
+  panels.forEach(p => { p.canvas = document.getElementById(p.id); p.ctx = p.canvas.getContext('2d'); });
+
+  function tile(i) {
+    if (!tiles[i]) tiles[i] = JSON.parse(document.getElementById('tile-' + i).textContent);
+    return tiles[i];
+  }
+  // Полные данные видимого участка или null, если свечей больше бюджета
+  function fullRes() {
+    const visible = (view[1] - view[0]) / D.candle_ms;
+    if (visible > D.budget) return null;
+    const out = {t: [], o: [], h: [], l: [], c: [], bbm: [], bbu: [], bbl: [], rsi: [], eq: []};
+    D.tiles.forEach((range, i) => {
+      if (range[1] < view[0] - D.candle_ms || range[0] > view[1] + D.candle_ms) return;
+      const T = tile(i);
+      // Только видимые свечи (плюс по одной с краев, чтобы линии доходили до границ)
+      let a = 0, b = T.t.length;
+      while (a < b && T.t[a] < view[0] - D.candle_ms) a++;
+      while (b > a && T.t[b - 1] > view[1] + D.candle_ms) b--;
+      for (const k in out) out[k] = out[k].concat(T[k].slice(a, b));
+    });
+    return out;
+  }
+  function pairs(data, key) { return data.t.map((t, i) => [t, data[key][i]]); }
+  function inView(points) {
+    return points.filter(p => p[0] >= view[0] - D.candle_ms && p[0] <= view[1] + D.candle_ms);
+  }
+  function bounds(series, fixed) {
+    if (fixed) return fixed;
+    let lo = Infinity, hi = -Infinity;
+    series.forEach(s => s.forEach(p => { if (p[1] !== null) { lo = Math.min(lo, p[1]); hi = Math.max(hi, p[1]); } }));
+    if (!isFinite(lo)) return [0, 1];
+    const pad = (hi - lo) * 0.05 || Math.abs(hi) * 0.001 || 1;
+    return [lo - pad, hi + pad];
+  }
+  function setup(p) {
+    const ratio = window.devicePixelRatio || 1;
+    const w = p.canvas.clientWidth, h = p.canvas.height / (p.ratio || 1);
+    p.canvas.width = w * ratio; p.canvas.height = h * ratio; p.ratio = ratio;
+    p.w = w; p.h = h; p.canvas.style.height = h + 'px';
+    p.ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+    p.ctx.clearRect(0, 0, w, h);
+  }
+  const X = (p, t) => 60 + (t - view[0]) / (view[1] - view[0]) * (p.w - 70);
+  const Y = (p, v) => 10 + (1 - (v - p.y[0]) / (p.y[1] - p.y[0])) * (p.h - 30);
+  function line(p, points, color, dash) {
+    const ctx = p.ctx;
+    ctx.strokeStyle = color; ctx.lineWidth = 1; ctx.setLineDash(dash || []);
+    ctx.beginPath();
+    let open = false;
+    points.forEach(pt => {
+      if (pt[1] === null) { open = false; return; }
+      const x = X(p, pt[0]), y = Y(p, pt[1]);
+      if (open) ctx.lineTo(x, y); else { ctx.moveTo(x, y); open = true; }
+    });
+    ctx.stroke(); ctx.setLineDash([]);
+  }
+  function hline(p, v, color) { line(p, [[view[0], v], [view[1], v]], color, [4, 4]); }
+  function markers(p, points, color, up) {
+    const ctx = p.ctx;
+    ctx.fillStyle = color;
+    inView(points).forEach(pt => {
+      const x = X(p, pt[0]), y = Y(p, pt[1]), s = up ? 6 : -6;
+      ctx.beginPath(); ctx.moveTo(x, y); ctx.lineTo(x - 4, y + s); ctx.lineTo(x + 4, y + s); ctx.fill();
+    });
+  }
+  function candles(p, data) {
+    const ctx = p.ctx;
+    const half = Math.max(1, (X(p, D.candle_ms) - X(p, 0)) * 0.35);
+    data.t.forEach((t, i) => {
+      const x = X(p, t), up = data.c[i] >= data.o[i];
+      ctx.strokeStyle = ctx.fillStyle = up ? 'green' : 'red';
+      ctx.beginPath(); ctx.moveTo(x, Y(p, data.h[i])); ctx.lineTo(x, Y(p, data.l[i])); ctx.stroke();
+      const top = Y(p, Math.max(data.o[i], data.c[i])), bottom = Y(p, Math.min(data.o[i], data.c[i]));
+      ctx.fillRect(x - half, top, 2 * half, Math.max(1, bottom - top));
+    });
+  }
+  function axes(p, label) {
+    const ctx = p.ctx;
+    ctx.fillStyle = '#555'; ctx.font = '11px sans-serif';
+    ctx.fillText(label, 64, 12);
+    for (let k = 0; k <= 4; k++) {
+      const v = p.y[0] + (p.y[1] - p.y[0]) * k / 4;
+      ctx.fillText(Math.abs(v) >= 1000 ? v.toFixed(0) : v.toFixed(3), 2, Y(p, v) + 4);
+    }
+    for (let k = 0; k <= 6; k++) {
+      const t = view[0] + (view[1] - view[0]) * k / 6;
+      const s = new Date(t).toISOString().replace('T', ' ').slice(0, 16);
+      ctx.fillText(s, Math.min(X(p, t) - 40, p.w - 100), p.h - 4);
+    }
+  }
+  function draw() {
+    const data = fullRes();
+    const get = key => data ? pairs(data, key) : inView(D.overview[key] || []);
+    const [price, rsi, equity] = panels;
+    panels.forEach(setup);
+    const closes = get('c');
+    const priceSeries = data ? [pairs(data, 'h'), pairs(data, 'l')] : [closes];
+    price.y = bounds(priceSeries.concat([get('bbu'), get('bbl')]));
+    if (data && data.t.length <= 400) candles(price, data); else line(price, closes, '#333');
+    line(price, get('bbm'), 'blue', [6, 3]);
+    line(price, get('bbu'), 'purple', [2, 2]);
+    line(price, get('bbl'), 'purple', [2, 2]);
+    markers(price, D.entries, 'blue', false);
+    markers(price, D.exits, 'orange', true);
+    axes(price, price.label + (data ? ' — полные данные' : ' — обзор'));
+    rsi.y = [0, 100];
+    hline(rsi, D.rsi_buy, 'green'); hline(rsi, D.rsi_sell, 'red');
+    line(rsi, get('rsi'), 'orange');
+    axes(rsi, rsi.label);
+    const eq = get('eq');
+    equity.y = bounds([eq]);
+    line(equity, eq, 'green');
+    axes(equity, equity.label);
+    const S = D.summary;
+    document.getElementById('info').textContent =
+      'Equity ' + S.equity.toFixed(4) + ' (' + ((S.equity - 1) * 100).toFixed(2) + '%), Sharpe ' +
+      S.sharpe.toFixed(4) + ', сделок ' + S.trades + ', свечей ' + S.candles +
+      '. Колесо — масштаб, перетаскивание — сдвиг, двойной клик — весь прогон.';
+  }
+  function clamp() {
+    const span = Math.min(full[1] - full[0], Math.max(view[1] - view[0], D.candle_ms * 10));
+    let a = Math.max(full[0], Math.min(view[0], full[1] - span));
+    view = [a, a + span];
+  }
+  panels.forEach(p => {
+    p.canvas.addEventListener('wheel', e => {
+      e.preventDefault();
+      const rect = p.canvas.getBoundingClientRect();
+      const frac = Math.min(1, Math.max(0, (e.clientX - rect.left - 60) / (p.w - 70)));
+      const at = view[0] + (view[1] - view[0]) * frac;
+      const k = e.deltaY < 0 ? 0.8 : 1.25;
+      view = [at - (at - view[0]) * k, at + (view[1] - at) * k];
+      clamp(); draw();
+    }, {passive: false});
+    let drag = null;
+    p.canvas.addEventListener('mousedown', e => { drag = [e.clientX, view.slice()]; });
+    window.addEventListener('mouseup', () => { drag = null; });
+    window.addEventListener('mousemove', e => {
+      if (!drag) return;
+      const shift = (drag[0] - e.clientX) / (p.w - 70) * (drag[1][1] - drag[1][0]);
+      view = [drag[1][0] + shift, drag[1][1] + shift];
+      clamp(); draw();
+    });
+    p.canvas.addEventListener('dblclick', () => { view = full.slice(); draw(); });
+  });
+  window.addEventListener('resize', draw);
+  draw();
+})();
+</script>
+</body>
+</html>
+"""
@@ -0,0 +1,112 @@
+"""
+Граф потоковых индикаторов с общими промежуточными значениями
+
+Каждый индикатор объявляет, какие входы ему нужны: поля свечи (SOURCES),
+общие промежуточные значения (DERIVED: дельта закрытия, True Range) или
+значения других индикаторов. Граф считает каждый вход один раз на свечу:
+- values(candle) — значения всех индикаторов для формирующейся свечи,
+  кэшируются по номеру свечи (и её high/low/close);
+- close(candle) — закрытие свечи: входы update всех индикаторов
+  вычисляются один раз, затем индикаторы обновляются.
+
+Новый индикатор добавляется через add() и получает готовые дельты/TR
+вместо собственного прохода по истории.
+"""
+
+from streaming_indicators import true_range
+
+# Поля свечи
+SOURCES = ('open', 'high', 'low', 'close', 'volume')
+
+
+def _delta(close, prev_close):
+    return None if prev_close is None else close - prev_close
+
+
+def _true_range(high, low, prev_close):
+    return None if prev_close is None else true_range(high, low, prev_close)
+
+
+# Общие промежуточные значения: имя -> (входы, функция);
+# prev_close — закрытие предыдущей закрытой свечи (None до первой)
+DERIVED = {
+    'delta': (('close', 'prev_close'), _delta),
+    'true_range': (('high', 'low', 'prev_close'), _true_range),
+}
+
+
+class IndicatorGraph:
+    """Реестр потоковых индикаторов, считающий общие входы один раз на свечу"""
+
+    def __init__(self):
+        self.nodes = {}             # имя -> (входы, provisional, входы update, update)
+        self.derived = dict(DERIVED)
+        self.prev_close = None
+        self.count = 0              # закрытых свечей
+        self._cache_key = None
+        self._cache = None
+
+    def add(self, name, inputs, provisional, update=None, update_inputs=None):
+        """Регистрирует индикатор
+
+        provisional(*inputs) — значение для формирующейся свечи,
+        update(*update_inputs) — закрытие свечи (по умолчанию те же входы).
+        Входы — имена из SOURCES, DERIVED или уже добавленных индикаторов
+        (при закрытии это значение индикатора для закрываемой свечи).
+        """
+        if name in self.nodes or name in self.derived or name in SOURCES or name == 'prev_close':
+            raise ValueError(f"Имя {name} уже занято")
+        if update_inputs is None:
+            update_inputs = inputs
+        known = set(SOURCES) | set(self.derived) | set(self.nodes) | {'prev_close', name}
+        for input_name in tuple(inputs) + tuple(update_inputs):
+            if input_name not in known or (input_name == name and input_name in inputs):
+                raise ValueError(f"Индикатор {name}: неизвестный вход {input_name}")
+        self.nodes[name] = (tuple(inputs), provisional, tuple(update_inputs), update)
+        self._cache_key = None
+
+    def add_derived(self, name, inputs, func):
+        """Регистрирует общее промежуточное значение func(*inputs)"""
+        if name in self.nodes or name in self.derived or name in SOURCES:
+            raise ValueError(f"Имя {name} уже занято")
+        self.derived[name] = (tuple(inputs), func)
+        self._cache_key = None
+
+    def _resolve(self, name, candle, memo):
+        if name in memo:
+            return memo[name]
+        if name in SOURCES:
+            value = getattr(candle, name)
+        elif name == 'prev_close':
+            value = self.prev_close
+        elif name in self.derived:
+            inputs, func = self.derived[name]
+            value = func(*[self._resolve(i, candle, memo) for i in inputs])
+        else:
+            inputs, provisional, _, _ = self.nodes[name]
+            value = provisional(*[self._resolve(i, candle, memo) for i in inputs])
+        memo[name] = value
+        return value
+
+    def values(self, candle):
+        """{индикатор: значение} для формирующейся свечи"""
+        # Все поля SOURCES: узел может зависеть от любого из них
+        key = (self.count, candle.open, candle.high, candle.low, candle.close, candle.volume)
+        if key != self._cache_key:
+            memo = {}
+            self._cache = {name: self._resolve(name, candle, memo) for name in self.nodes}
+            self._cache_key = key
+        return self._cache
+
+    def close(self, candle):
+        """Закрывает свечу: обновляет все индикаторы"""
+        memo = {}
+        # Входы считаются до обновлений — значения индикаторов для закрываемой свечи
+        args = [[self._resolve(i, candle, memo) for i in update_inputs]
+                for _, _, update_inputs, _ in self.nodes.values()]
+        for (_, _, _, update), node_args in zip(self.nodes.values(), args):
+            if update is not None:
+                update(*node_args)
+        self.prev_close = candle.close
+        self.count += 1
+        self._cache_key = None
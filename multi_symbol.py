@@ -0,0 +1,404 @@
+"""
+Много символов в одном процессе: состояние в массивах numpy (struct-of-arrays)
+
+MultiSymbolHost ведет ту же RSI-стратегию, что RSIStrategyBase (без
+нейронного фильтра), для десятков-сотен символов. Все состояние — массивы
+формы (число символов,) или (число символов, окно), индекс — id символа:
+- формирующиеся свечи: open/high/low/close/volume;
+- последние закрытые свечи (кольцо closes/highs/lows, новые справа);
+- суммы RSI, состояние ATR, последние значения BB/ATR/коэффициента
+  волатильности, цены срабатывания RSI, позиции и equity.
+
+Тик одного символа — обновление его свечи и два сравнения с ценами
+срабатывания (как RSITriggers). Свечи закрываются по времени: первый тик
+следующего интервала (любого символа) закрывает свечи всех символов, у
+которых были тики, и индикаторы для них пересчитываются одним векторным
+вызовом. Символ без тиков за интервал свечу не получает — как и отдельная
+стратегия. Тик с меткой времени раньше текущего интервала учитывается в
+текущей свече.
+
+Сигналы и сделки совпадают с RSIStrategyBase на каждом символе при
+упорядоченном по времени потоке (суммы RSI считаются по окну заново, а не
+скользящими суммами, — отличие только в округлении, см. RSITriggers).
+"""
+
+import numpy as np
+
+import rsi_strategy
+from performance_metrics import PerformanceMetrics
+from streaming_indicators import TALIB_EPSILON, TRIGGER_TOLERANCE
+
+ATR_PERIOD = 14
+VOLATILITY_LOOKBACK = 50
+
+
+def _crossing_prices(last_close, gain, loss, ratio):
+    """Векторный аналог streaming_indicators._crossing_price"""
+    above = gain < ratio * loss
+    return np.where(above, last_close + (ratio * loss - gain), last_close - (gain / ratio - loss))
+
+
+class MultiSymbolHost:
+    """Стратегия RSI для многих символов с общим векторным закрытием свечей"""
+
+    def __init__(self, symbols, rsi_period=14, rsi_buy=30, rsi_sell=70, bb_period=20, bb_std=2,
+                 candle_minutes=5, use_custom_rsi=True):
+        self.symbols = list(symbols)
+        self.ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.rsi_period = rsi_period
+        self.rsi_buy = rsi_buy
+        self.rsi_sell = rsi_sell
+        self.bb_period = bb_period
+        self.bb_std = bb_std
+        self.candle_minutes = candle_minutes
+        # Тот же выбор реализаций, что и в RSIStrategyBase
+        self.wilder_rsi = not use_custom_rsi and rsi_strategy.TALIB_AVAILABLE
+        self.wilder_atr = rsi_strategy.TALIB_AVAILABLE
+        self._inv_period = 1.0 / rsi_period
+        self._thresholds_ok = 0 < rsi_buy < 100 and 0 < rsi_sell < 100
+
+        n = len(self.symbols)
+        window = max(rsi_period + 1, bb_period, ATR_PERIOD + 1)
+
+        # --- Формирующиеся свечи ---
+        self.candle_ms = None                       # начало текущего интервала (общее)
+        self.has_ticks = np.zeros(n, dtype=bool)
+        self.open = np.full(n, np.nan)
+        self.high = np.full(n, np.nan)
+        self.low = np.full(n, np.nan)
+        self.close = np.full(n, np.nan)
+        self.volume = np.zeros(n)
+
+        # --- Закрытые свечи (последние window, новые справа) ---
+        self.closed_count = np.zeros(n, dtype=np.int64)
+        self.closes = np.full((n, window), np.nan)
+        self.highs = np.full((n, window), np.nan)
+        self.lows = np.full((n, window), np.nan)
+
+        # --- RSI: суммы закрытого окна (как base_sums потоков) ---
+        self.rsi_ready = np.zeros(n, dtype=bool)
+        self.last_close = np.full(n, np.nan)
+        self.gain_base = np.zeros(n)
+        self.loss_base = np.zeros(n)
+        self.loss_count = np.zeros(n, dtype=np.int64)
+        self._gain_acc = np.zeros(n)                # затравка Уайлдера
+        self._loss_acc = np.zeros(n)
+        self.avg_gain = np.full(n, np.nan)          # NaN — затравка не закончена
+        self.avg_loss = np.full(n, np.nan)
+
+        # --- Цены срабатывания RSI для текущей свечи ---
+        self.buy_below = np.full(n, np.inf if 50.0 < rsi_buy else -np.inf)
+        self.sell_above = np.full(n, -np.inf if 50.0 > rsi_sell else np.inf)
+        self.zero_below = np.zeros(n, dtype=bool)   # SMA без убытков: RSI = 0 при цене >= last_close
+        self.exact = np.zeros(n, dtype=bool)
+        self.tolerance = np.zeros(n)
+
+        # --- BB / ATR / волатильность закрытого ряда ---
+        self.bb_ma = np.full(n, np.nan)
+        self.bb_upper = np.full(n, np.nan)
+        self.bb_lower = np.full(n, np.nan)
+        self.tr_history = np.full((n, ATR_PERIOD), np.nan)
+        self._tr_acc = np.zeros(n)
+        self._atr_state = np.full(n, np.nan)
+        self.atr = np.zeros(n)
+        self.atr_history = np.full((n, VOLATILITY_LOOKBACK), np.nan)
+        self.volatility_ratio = np.ones(n)
+
+        # --- Позиции и equity ---
+        self.position = np.zeros(n, dtype=np.int8)
+        self.last_price = np.full(n, np.nan)
+        self.equity = np.ones(n)
+        self.entries = np.zeros(n, dtype=np.int64)
+        self.exits = np.zeros(n, dtype=np.int64)
+        self.trades = [[] for _ in range(n)]        # equity после каждой сделки
+        self.metrics = [PerformanceMetrics() for _ in range(n)]  # Sharpe, просадка, win rate символа
+
+        print(f"📊 Multi-symbol host: {n} символов, {candle_minutes}m, "
+              f"RSI {'Wilder' if self.wilder_rsi else 'SMA'}, ATR {'Wilder' if self.wilder_atr else 'SMA'}")
+
+    # === ТИКИ ===
+
+    def on_tick(self, symbol, price, ts_ms, volume=0):
+        """Тик символа; возвращает сигнал (позицию) этого символа"""
+        sid = self.ids[symbol]
+        minutes = ts_ms // 60000
+        start_ms = (minutes - minutes % 60 % self.candle_minutes) * 60000
+        if self.candle_ms is None or start_ms > self.candle_ms:
+            self.close_candles()
+            self.candle_ms = start_ms
+        if self.has_ticks[sid]:
+            if price > self.high[sid]:
+                self.high[sid] = price
+            if price < self.low[sid]:
+                self.low[sid] = price
+        else:
+            self.has_ticks[sid] = True
+            self.open[sid] = self.high[sid] = self.low[sid] = price
+        self.close[sid] = price
+        self.volume[sid] += volume
+        is_buy, is_sell = self._signals(sid, price)
+        return self._trade(sid, price, is_buy, is_sell)
+
+    def _signals(self, sid, price):
+        """(RSI < rsi_buy, RSI > rsi_sell) — как RSITriggers.signals"""
+        tolerance = self.tolerance[sid]
+        buy_below = self.buy_below[sid]
+        sell_above = self.sell_above[sid]
+        if self.exact[sid] or abs(price - buy_below) <= tolerance or abs(price - sell_above) <= tolerance:
+            rsi = self.rsi(sid, price)
+            return rsi < self.rsi_buy, rsi > self.rsi_sell
+        if self.zero_below[sid] and price >= self.last_close[sid]:
+            return True, False
+        return price < buy_below, price > sell_above
+
+    def rsi(self, sid, price):
+        """RSI формирующейся свечи символа sid при цене price (provisional)"""
+        if not self.rsi_ready[sid]:
+            return 50.0
+        delta = price - self.last_close[sid]
+        gain = float(self.gain_base[sid])
+        loss = float(self.loss_base[sid])
+        if self.wilder_rsi:
+            if delta < 0:
+                loss -= delta
+            else:
+                gain += delta
+            gain *= self._inv_period
+            loss *= self._inv_period
+            total = gain + loss
+            if -TALIB_EPSILON < total < TALIB_EPSILON:
+                return 0.0
+            return 100.0 * (gain / total)
+        loss_count = int(self.loss_count[sid])
+        if delta > 0:
+            gain += delta
+        elif delta < 0:
+            loss -= delta
+            loss_count += 1
+        up = gain / self.rsi_period
+        down = loss / self.rsi_period
+        rs = up / down if loss_count != 0 else 0
+        return 100. - 100. / (1. + rs)
+
+    def _trade(self, sid, price, is_buy, is_sell):
+        position = int(self.position[sid])
+        signal = position
+        if is_buy and position == 0:
+            signal = 1
+            self.entries[sid] += 1
+        elif is_sell and position == 1:
+            signal = 0
+            self.exits[sid] += 1
+        elif is_sell and position == 0:
+            signal = -1
+            self.entries[sid] += 1
+        elif is_buy and position == -1:
+            signal = 0
+            self.exits[sid] += 1
+        if signal != position:
+            self._close_position(sid, price)
+            if signal != 0:
+                self.last_price[sid] = price
+            self.position[sid] = signal
+        return signal
+
+    def _close_position(self, sid, price):
+        position = self.position[sid]
+        last_price = self.last_price[sid]
+        if position == 1:
+            pnl = (price - last_price) / last_price
+        elif position == -1:
+            pnl = (last_price - price) / last_price
+        else:
+            return
+        self.equity[sid] *= (1 + pnl)
+        self.trades[sid].append(float(self.equity[sid]))
+        self.metrics[sid].on_trade(float(self.equity[sid]))
+
+    # === ЗАКРЫТИЕ СВЕЧЕЙ (векторно по символам) ===
+
+    def close_candles(self):
+        """Закрывает текущие свечи всех символов с тиками и пересчитывает индикаторы"""
+        idx = np.flatnonzero(self.has_ticks)
+        if len(idx) == 0:
+            return
+        close, high, low = self.close[idx], self.high[idx], self.low[idx]
+        prev_close = self.closes[idx, -1]
+        has_prev = self.closed_count[idx] > 0
+        count_before = self.closed_count[idx]
+
+        for ring, values in ((self.closes, close), (self.highs, high), (self.lows, low)):
+            ring[idx, :-1] = ring[idx, 1:]
+            ring[idx, -1] = values
+        self.closed_count[idx] += 1
+        count = self.closed_count[idx]
+
+        self._update_rsi(idx, close, close - prev_close, has_prev, count_before, count)
+        self._update_bollinger(idx, count)
+        tr = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+        self._update_atr(idx, tr, has_prev, count)
+        self._update_triggers(idx)
+
+        self.has_ticks[idx] = False
+        self.volume[idx] = 0.0
+
+    def _update_rsi(self, idx, close, delta, has_prev, count_before, count):
+        period = self.rsi_period
+        if self.wilder_rsi:
+            # Порядок операций WilderRSIStream.update
+            seeding = has_prev & np.isnan(self.avg_gain[idx])
+            smoothing = has_prev & ~np.isnan(self.avg_gain[idx])
+            up = np.where(delta >= 0, delta, 0.0)
+            down = np.where(delta < 0, delta, 0.0)
+            gain_acc = np.where(seeding, self._gain_acc[idx] + up, self._gain_acc[idx])
+            loss_acc = np.where(seeding, self._loss_acc[idx] - down, self._loss_acc[idx])
+            self._gain_acc[idx] = gain_acc
+            self._loss_acc[idx] = loss_acc
+            seeded = seeding & (count_before == period)
+            avg_gain = self.avg_gain[idx]
+            avg_loss = self.avg_loss[idx]
+            smooth_gain = (avg_gain * (period - 1) + up) * self._inv_period
+            smooth_loss = (avg_loss * (period - 1) - down) * self._inv_period
+            avg_gain = np.where(seeded, gain_acc * self._inv_period, np.where(smoothing, smooth_gain, avg_gain))
+            avg_loss = np.where(seeded, loss_acc * self._inv_period, np.where(smoothing, smooth_loss, avg_loss))
+            self.avg_gain[idx] = avg_gain
+            self.avg_loss[idx] = avg_loss
+            unseeded = np.isnan(avg_gain)
+            self.gain_base[idx] = np.where(unseeded, gain_acc, avg_gain * (period - 1))
+            self.loss_base[idx] = np.where(unseeded, loss_acc, avg_loss * (period - 1))
+        elif period > 1:
+            # Последние period-1 закрытых дельт из кольца цен закрытия
+            deltas = np.diff(self.closes[idx, -period:], axis=1)
+            self.gain_base[idx] = np.where(deltas > 0, deltas, 0.0).sum(axis=1)
+            self.loss_base[idx] = -np.where(deltas < 0, deltas, 0.0).sum(axis=1)
+            self.loss_count[idx] = (deltas < 0).sum(axis=1)
+        self.last_close[idx] = close
+        self.rsi_ready[idx] = count >= period
+
+    def _update_bollinger(self, idx, count):
+        ready = count >= self.bb_period
+        window = self.closes[idx, -self.bb_period:]
+        with np.errstate(invalid='ignore'):
+            ma = window.mean(axis=1)
+            std = window.std(axis=1)
+        self.bb_ma[idx] = np.where(ready, ma, np.nan)
+        self.bb_upper[idx] = np.where(ready, ma + self.bb_std * std, np.nan)
+        self.bb_lower[idx] = np.where(ready, ma - self.bb_std * std, np.nan)
+
+    def _update_atr(self, idx, tr, has_prev, count):
+        """ATR закрытого ряда (compute_atr) и коэффициент волатильности"""
+        period = ATR_PERIOD
+        tr = np.where(has_prev, tr, np.nan)
+        self.tr_history[idx, :-1] = self.tr_history[idx, 1:]
+        self.tr_history[idx, -1] = tr
+        if self.wilder_atr:
+            # Ветки ATRStream(wilder=True)
+            state = self._atr_state[idx]
+            seeding = has_prev & np.isnan(state)
+            tr_acc = np.where(seeding, self._tr_acc[idx] + np.where(has_prev, tr, 0.0), self._tr_acc[idx])
+            self._tr_acc[idx] = tr_acc
+            smoothed = (state * (period - 1) + tr) / period
+            state = np.where(seeding & (count == period + 1), tr_acc / period,
+                             np.where(has_prev & ~np.isnan(state), smoothed, state))
+            self._atr_state[idx] = state
+            with np.errstate(invalid='ignore', divide='ignore'):
+                early = tr_acc / (count - 1)
+            atr = np.where(count < 2, 0.0, np.where(count < period, early,
+                           np.where(count == period, 0.0, state)))
+        else:
+            with np.errstate(invalid='ignore'):
+                atr = np.where(count < 2, 0.0, np.nanmean(np.where(count[:, None] < 2, 0.0,
+                                                                    self.tr_history[idx]), axis=1))
+        self.atr[idx] = atr
+        history = self.atr_history
+        history[idx, :-1] = history[idx, 1:]
+        history[idx, -1] = atr
+
+        # compute_volatility_ratio: ATR свечей с индексами >= ATR_PERIOD + 1 в окне lookback
+        lookback = VOLATILITY_LOOKBACK
+        positions = np.arange(lookback)
+        in_window = positions[None, :] >= (ATR_PERIOD + 1 + lookback - count)[:, None]
+        values = history[idx]
+        positive = in_window & (values > 0)
+        total = np.where(positive, values, 0.0).sum(axis=1)
+        n_positive = positive.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = total / n_positive
+            ratio = np.where((n_positive > 0) & (atr != 0) & (avg > 0), atr / avg, 1.0)
+        self.volatility_ratio[idx] = np.where(count < lookback, 1.0, ratio)
+
+    def _update_triggers(self, idx):
+        """Цены срабатывания RSI для следующей свечи — векторный RSITriggers"""
+        ready = self.rsi_ready[idx]
+        last_close = self.last_close[idx]
+        gain = self.gain_base[idx]
+        loss = self.loss_base[idx]
+        if self.wilder_rsi:
+            zero_below = np.zeros(len(idx), dtype=bool)
+            exact = (gain + loss) * self._inv_period < 100 * TALIB_EPSILON
+        else:
+            zero_below = self.loss_count[idx] == 0
+            exact = ~zero_below & (loss <= 0)
+        if not self._thresholds_ok:
+            exact = np.ones(len(idx), dtype=bool)
+            buy_below = sell_above = last_close
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                buy_below = _crossing_prices(last_close, gain, loss, self.rsi_buy / (100 - self.rsi_buy))
+                sell_above = _crossing_prices(last_close, gain, loss, self.rsi_sell / (100 - self.rsi_sell))
+        warm_buy = np.inf if 50.0 < self.rsi_buy else -np.inf
+        warm_sell = -np.inf if 50.0 > self.rsi_sell else np.inf
+        self.buy_below[idx] = np.where(ready, buy_below, warm_buy)
+        self.sell_above[idx] = np.where(ready, sell_above, warm_sell)
+        self.zero_below[idx] = ready & zero_below
+        self.exact[idx] = ready & exact
+        self.tolerance[idx] = np.where(ready, TRIGGER_TOLERANCE * (np.abs(last_close) + gain + loss), 0.0)
+
+    # === ИТОГИ ===
+
+    def on_finish(self, prices=None):
+        """Закрывает свечи и позиции; prices — {символ: цена}, по умолчанию последняя цена"""
+        last = np.where(self.has_ticks, self.close, self.closes[:, -1])
+        self.close_candles()
+        for sid, symbol in enumerate(self.symbols):
+            price = prices[symbol] if prices and symbol in prices else last[sid]
+            if self.position[sid] != 0:
+                self._close_position(sid, price)
+                self.position[sid] = 0
+
+    def sharpe(self, symbol):
+        """Sharpe символа из его PerformanceMetrics (как RSIStrategyBase.sharpe)"""
+        return self.metrics[self.ids[symbol]].sharpe()
+
+    def summary(self, symbol):
+        """Итоги символа в формате run_multiple_backtests"""
+        sid = self.ids[symbol]
+        equity = float(self.equity[sid])
+        metrics = self.metrics[sid].snapshot()
+        return {
+            'symbol': symbol,
+            'sharpe': self.sharpe(symbol),
+            'equity': equity,
+            'trades_count': len(self.trades[sid]),
+            'candles_count': int(self.closed_count[sid]),
+            'entry_points': int(self.entries[sid]),
+            'exit_points': int(self.exits[sid]),
+            'pnl_percent': (equity - 1.0) * 100,
+            'sortino': metrics['sortino'],
+            'max_drawdown': metrics['max_drawdown'],
+            'win_rate': metrics['win_rate'],
+            'profit_factor': metrics['profit_factor'],
+        }
+
+    def indicators(self, symbol):
+        """Текущие значения символа: RSI формирующейся свечи и индикаторы закрытого ряда"""
+        sid = self.ids[symbol]
+        price = self.close[sid] if self.has_ticks[sid] else self.last_close[sid]
+        bb = (self.bb_ma[sid], self.bb_upper[sid], self.bb_lower[sid])
+        return {
+            'rsi': self.rsi(sid, price),
+            'bb': (None, None, None) if np.isnan(bb[0]) else tuple(float(v) for v in bb),
+            'atr': float(self.atr[sid]),
+            'volatility_ratio': float(self.volatility_ratio[sid]),
+            'position': int(self.position[sid]),
+        }
@@ -0,0 +1,171 @@
+"""
+Несколько таймфреймов из одного потока тиков
+
+TimeframeAggregator один раз на тик определяет свечу младшего таймфрейма
+(целочисленно, как on_tick_ms) и обновляет только её. Старшие таймфреймы
+сворачиваются из закрытых свечей младшего (RollupCandle), поэтому тик
+стоит почти одинаково при любом числе таймфреймов.
+
+Стратегии подписываются на свой таймфрейм (subscribe) и получают общий
+ряд свечей этого таймфрейма — история свечей хранится один раз, сколько бы
+стратегий её ни читали. Свечи, сигналы и сделки совпадают с отдельной
+стратегией на том же candle_minutes; объем свечи старшего таймфрейма —
+сумма объемов младших свечей (отличие только в округлении).
+"""
+
+from candle_series import Candle, CandleSeries, ms_to_dt
+from tick_resampler import candle_start_ms, check_rollup
+
+_NO_CLOSED = {}
+
+
+class RollupCandle:
+    """Формирующаяся свеча старшего таймфрейма
+
+    Хранит свертку уже закрытых свечей младшего таймфрейма и ссылку на
+    формирующуюся младшую свечу; OHLCV вычисляется при чтении.
+    """
+
+    __slots__ = ('start_time', 'start_ms', 'base', '_open', '_high', '_low', '_close', '_volume')
+
+    def __init__(self, start_time, start_ms, base):
+        self.start_time = start_time
+        self.start_ms = start_ms
+        self.base = base            # формирующаяся свеча младшего таймфрейма
+        self._open = None           # свертка закрытых младших свечей
+        self._high = None
+        self._low = None
+        self._close = None
+        self._volume = 0.0
+
+    def fold(self, candle):
+        """Добавляет закрытую младшую свечу"""
+        if self._open is None:
+            self._open = candle.open
+            self._high = candle.high
+            self._low = candle.low
+        else:
+            self._high = max(self._high, candle.high)
+            self._low = min(self._low, candle.low)
+        self._close = candle.close
+        self._volume += candle.volume
+
+    @property
+    def open(self):
+        return self.base.open if self._open is None else self._open
+
+    @property
+    def high(self):
+        return self.base.high if self._high is None else max(self._high, self.base.high)
+
+    @property
+    def low(self):
+        return self.base.low if self._low is None else min(self._low, self.base.low)
+
+    @property
+    def close(self):
+        return self.base.close
+
+    @property
+    def volume(self):
+        return self._volume + self.base.volume
+
+    def folded_candle(self):
+        """Свеча только из закрытых младших свечей (при закрытии старшей)"""
+        return Candle(self.start_time, self._open, self._high, self._low, self._close, self._volume)
+
+    def to_candle(self):
+        return Candle(self.start_time, self.open, self.high, self.low, self.close, self.volume)
+
+    def __repr__(self):
+        return f"RollupCandle({self.start_time}, o={self.open}, h={self.high}, l={self.low}, c={self.close}, v={self.volume})"
+
+
+class TimeframeAggregator:
+    """Общий агрегатор свечей нескольких таймфреймов
+
+    timeframes — минуты свечей; младший должен делить 60 и остальные
+    таймфреймы (tick_resampler.check_rollup).
+    """
+
+    def __init__(self, timeframes=(1, 5, 15)):
+        self.timeframes = check_rollup(timeframes)
+        self.base = self.timeframes[0]
+        self.series = {m: CandleSeries() for m in self.timeframes}
+        self.current = {m: None for m in self.timeframes}   # формирующиеся свечи
+        self._base_ms = None
+        self._subscribers = []      # (таймфрейм, стратегия) в порядке подписки
+
+    def subscribe(self, strategy, timeframe=None):
+        """Подключает стратегию к общему ряду свечей её candle_minutes"""
+        if timeframe is None:
+            timeframe = strategy.candle_minutes
+        if timeframe not in self.series:
+            raise ValueError(f"Таймфрейм {timeframe}m не агрегируется (есть {self.timeframes})")
+        if timeframe != strategy.candle_minutes:
+            raise ValueError(f"Стратегия настроена на {strategy.candle_minutes}m, а не {timeframe}m")
+        strategy.use_shared_candles(self.series[timeframe])
+        self._subscribers.append((timeframe, strategy))
+        return strategy
+
+    def candles(self, timeframe):
+        return self.series[timeframe]
+
+    def _open_base(self, start_ms):
+        """Закрывает свечи на границе младшего таймфрейма, возвращает закрытые"""
+        closed = {}
+        closed_base = self.current[self.base]
+        if closed_base is not None:
+            self._append(self.base, self._base_ms, closed_base)
+            closed[self.base] = closed_base
+        new_base = Candle(ms_to_dt(start_ms))
+        for m in self.timeframes[1:]:
+            rollup = self.current[m]
+            if rollup is not None:
+                rollup.fold(closed_base)
+            start = int(candle_start_ms(start_ms, m))
+            if rollup is None or start != rollup.start_ms:
+                if rollup is not None:
+                    closed_candle = rollup.folded_candle()
+                    self._append(m, rollup.start_ms, closed_candle)
+                    closed[m] = closed_candle
+                start_time = new_base.start_time if start == start_ms else ms_to_dt(start)
+                self.current[m] = RollupCandle(start_time, start, new_base)
+            else:
+                rollup.base = new_base
+        self.current[self.base] = new_base
+        self._base_ms = start_ms
+        return closed
+
+    def _append(self, timeframe, start_ms, candle):
+        self.series[timeframe].append_values(start_ms, candle.open, candle.high, candle.low,
+                                             candle.close, candle.volume)
+
+    def on_tick(self, price, ts_ms, volume=0):
+        """Тик для всех таймфреймов; возвращает сигналы подписчиков по порядку"""
+        minutes = ts_ms // 60000
+        start_ms = (minutes - minutes % 60 % self.base) * 60000
+        closed = _NO_CLOSED
+        if start_ms != self._base_ms:
+            closed = self._open_base(start_ms)
+        self.current[self.base].add_tick(price, volume)
+        return [strategy.on_shared_tick(price, self.current[m], self._candle_ms(m), closed.get(m))
+                for m, strategy in self._subscribers]
+
+    def _candle_ms(self, timeframe):
+        if timeframe == self.base:
+            return self._base_ms
+        return self.current[timeframe].start_ms
+
+    def on_finish(self, price):
+        """Закрывает формирующиеся свечи всех таймфреймов и завершает стратегии"""
+        if self._base_ms is None:
+            return
+        for m in self.timeframes:
+            start_ms = self._candle_ms(m)
+            candle = self.current[m]
+            if m != self.base:
+                candle = candle.to_candle()
+            self._append(m, start_ms, candle)
+        for _, strategy in self._subscribers:
+            strategy.on_finish(price)
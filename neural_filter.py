@@ -0,0 +1,262 @@
+"""
+Нейронный фильтр сигналов RSI на чистом NumPy
+
+Модель — полносвязная сеть (Dense-слои), обученная в TensorFlow/Keras и
+выгруженная в .npz скриптом export_neural_filter.py. В живом процессе
+TensorFlow не импортируется: прямой проход — несколько матричных умножений.
+
+Признаки строятся по последним lookback свечам (FEATURE_NAMES на свечу):
+RSI, положение цены в полосах Боллинджера, ширина полос, ATR к цене,
+коэффициент волатильности и цена относительно последней в окне.
+FeatureWindow хранит сырые значения в кольцевом буфере и обновляется раз
+на свечу, поэтому вход модели не пересобирается из историй на каждом тике.
+
+Формат .npz:
+- lookback — число свечей в окне;
+- mean, scale — стандартизация входа (StandardScaler), длина lookback * 6;
+- kernel_0, bias_0, kernel_1, ... — веса Dense-слоев по порядку;
+- activations — активации слоев (relu, tanh, sigmoid, linear, softmax).
+Выход — уверенность: один нейрон (sigmoid) или softmax, тогда берется
+вероятность последнего класса.
+
+NeuralInferenceWorker выносит прямой проход в отдельный поток или процесс:
+стратегия отправляет признаки при закрытии свечи, воркер публикует
+NeuralDecision, а тик только читает опубликованный результат. Если он
+относится к предыдущей свече, решает политика устаревания (STALE_POLICIES).
+"""
+
+import multiprocessing
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = 'models/neural_filter.npz'
+DEFAULT_LOOKBACK = 20
+
+FEATURE_NAMES = ('rsi', 'bb_position', 'bb_width', 'atr_ratio', 'volatility_ratio', 'price_change')
+
+# Колонки сырых значений в FeatureWindow
+_RAW_COLUMNS = ('rsi', 'bb_ma', 'bb_upper', 'bb_lower', 'atr', 'volatility_ratio', 'price')
+
+
+def _softmax(x):
+    e = np.exp(x - np.max(x))
+    return e / e.sum()
+
+
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0.0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    'linear': lambda x: x,
+    'softmax': _softmax,
+}
+
+
+def features_from_raw(raw):
+    """Сырые значения окна (lookback, 7) -> вектор признаков или None
+
+    None — если в окне есть незаполненные значения (BB до заполнения
+    периода, нет цены и т.п.).
+    """
+    raw = np.asarray(raw, dtype=np.float64)
+    if not np.all(np.isfinite(raw)):
+        return None
+    rsi, ma, upper, lower, atr, volatility_ratio, price = raw.T
+    if np.any(price <= 0) or np.any(ma == 0):
+        return None
+    width = upper - lower
+    with np.errstate(divide='ignore', invalid='ignore'):
+        position = np.where(width > 0, (price - lower) / width, 0.5)
+    features = np.column_stack((
+        rsi / 100.0,
+        position,
+        width / ma,
+        atr / price,
+        volatility_ratio,
+        price / price[-1] - 1.0,
+    ))
+    return features.ravel()
+
+
+class FeatureWindow:
+    """Кольцевой буфер сырых значений последних lookback свечей"""
+
+    def __init__(self, lookback=DEFAULT_LOOKBACK):
+        self.lookback = lookback
+        self._raw = np.full((lookback, len(_RAW_COLUMNS)), np.nan)
+        self._pos = 0               # куда писать следующую свечу
+        self.count = 0
+
+    def push(self, rsi, bb, atr, volatility_ratio, price):
+        """Добавляет значения свечи (bb — (ma, upper, lower), None допускается)"""
+        ma, upper, lower = (np.nan if v is None else v for v in bb)
+        self._raw[self._pos] = (rsi, ma, upper, lower, atr, volatility_ratio,
+                                np.nan if price is None else price)
+        self._pos = (self._pos + 1) % self.lookback
+        self.count += 1
+
+    @property
+    def full(self):
+        return self.count >= self.lookback
+
+    def raw(self):
+        """Значения окна в хронологическом порядке"""
+        return np.concatenate((self._raw[self._pos:], self._raw[:self._pos]))
+
+    def features(self):
+        if not self.full:
+            return None
+        return features_from_raw(self.raw())
+
+
+class NeuralSignalFilter:
+    """Фильтр сигналов: уверенность сети в том, что вход по сигналу стоит делать"""
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or DEFAULT_MODEL_PATH
+        with np.load(self.model_path, allow_pickle=False) as data:
+            self.lookback = int(data['lookback'])
+            self.mean = data['mean'].astype(np.float64)
+            self.scale = data['scale'].astype(np.float64)
+            activations = [str(a) for a in data['activations']]
+            self.layers = []
+            for i, activation in enumerate(activations):
+                if activation not in ACTIVATIONS:
+                    raise ValueError(f"Неизвестная активация слоя {i}: {activation}")
+                self.layers.append((data[f'kernel_{i}'].astype(np.float64),
+                                    data[f'bias_{i}'].astype(np.float64), ACTIVATIONS[activation]))
+        n_inputs = self.lookback * len(FEATURE_NAMES)
+        if self.layers[0][0].shape[0] != n_inputs or len(self.mean) != n_inputs:
+            raise ValueError(f"Модель ожидает {self.layers[0][0].shape[0]} признаков, а окно дает {n_inputs}")
+
+    def create_window(self):
+        return FeatureWindow(self.lookback)
+
+    def prepare_features(self, recent_rsi, recent_bb, recent_atr, recent_vol_ratio, recent_prices):
+        """Признаки из списков значений (последние lookback элементов каждого)"""
+        n = self.lookback
+        if min(len(recent_rsi), len(recent_bb), len(recent_atr), len(recent_vol_ratio), len(recent_prices)) < n:
+            return None
+        raw = np.empty((n, len(_RAW_COLUMNS)))
+        raw[:, 0] = recent_rsi[-n:]
+        raw[:, 1:4] = [[np.nan if v is None else v for v in bb] for bb in recent_bb[-n:]]
+        raw[:, 4] = recent_atr[-n:]
+        raw[:, 5] = recent_vol_ratio[-n:]
+        raw[:, 6] = recent_prices[-n:]
+        return features_from_raw(raw)
+
+    def predict(self, features):
+        """Уверенность 0..1 для вектора признаков"""
+        x = (np.asarray(features, dtype=np.float64) - self.mean) / self.scale
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return float(x[-1])
+
+    def should_trade(self, features, threshold=0.6):
+        """(разрешить вход, уверенность)"""
+        confidence = self.predict(features)
+        return confidence >= threshold, confidence
+
+
+# Решение фильтра: key — номер окна признаков (свечи), published_at — time.time()
+NeuralDecision = namedtuple('NeuralDecision', 'approved confidence key published_at')
+
+INFERENCE_MODES = ('sync', 'thread', 'process')
+
+# Что делать со входом, если результат для текущей свечи еще не готов:
+# trade — входить без фильтра, skip — не входить,
+# wait — ждать не дольше max_wait секунд, затем не входить
+STALE_POLICIES = ('trade', 'skip', 'wait')
+
+_worker_filter = None   # фильтр внутри процесса-воркера
+
+
+def _init_worker(model_path):
+    global _worker_filter
+    _worker_filter = NeuralSignalFilter(model_path)
+
+
+def _worker_should_trade(features, threshold):
+    return _worker_filter.should_trade(features, threshold)
+
+
+class NeuralInferenceWorker:
+    """Инференс фильтра вне потока тиков (mode: thread или process)
+
+    Воркер один, задачи выполняются по порядку; еще не начатая задача
+    прошлой свечи отменяется при отправке новой. Процесс запускается через
+    spawn, поэтому запускающий скрипт должен иметь if __name__ == '__main__'.
+    """
+
+    def __init__(self, neural_filter, mode='thread', stale_policy='wait', max_wait=0.05):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Неизвестный режим инференса: {mode}")
+        if stale_policy not in STALE_POLICIES:
+            raise ValueError(f"Неизвестная политика устаревания: {stale_policy}")
+        self.filter = neural_filter
+        self.mode = mode
+        self.stale_policy = stale_policy
+        self.max_wait = max_wait
+        if mode == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='neural')
+        else:
+            # spawn, а не fork: в боте уже работают потоки websocket и health-сервера,
+            # а fork многопоточного процесса может унаследовать захваченные блокировки
+            self._executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                                 initargs=(neural_filter.model_path,),
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        self.latest = NeuralDecision(True, 0.5, None, 0.0)
+        self.stale_count = 0        # сколько раз вход решала политика устаревания
+        self._pending = None
+        self._pending_key = None
+
+    def submit(self, key, features, threshold):
+        """Отправляет признаки свечи key на инференс (не блокирует)"""
+        if self._pending is not None:
+            self._pending.cancel()
+        if self.mode == 'thread':
+            future = self._executor.submit(self.filter.should_trade, features, threshold)
+        else:
+            future = self._executor.submit(_worker_should_trade, features, threshold)
+        self._pending = future
+        self._pending_key = key
+        future.add_done_callback(lambda f: self._publish_future(key, f))
+
+    def publish(self, key, approved, confidence):
+        """Публикует решение, если оно не старше уже опубликованного"""
+        latest = self.latest
+        if latest.key is None or key >= latest.key:
+            self.latest = NeuralDecision(bool(approved), float(confidence), key, time.time())
+
+    def _publish_future(self, key, future):
+        if future.cancelled():
+            return
+        try:
+            approved, confidence = future.result()
+        except Exception as e:
+            print(f"⚠️ Ошибка нейронного фильтра: {e}")
+            approved, confidence = True, 0.5  # Fallback к обычной логике
+        self.publish(key, approved, confidence)
+
+    def decision(self, key):
+        """Решение для свечи key с учетом политики устаревания"""
+        latest = self.latest
+        if latest.key == key:
+            return latest
+        if self.stale_policy == 'wait' and self._pending_key == key:
+            pending = self._pending
+            wait((pending,), timeout=self.max_wait)
+            if pending.done():
+                # колбэк мог еще не отработать — публикуем сами
+                self._publish_future(key, pending)
+            latest = self.latest
+            if latest.key == key:
+                return latest
+        self.stale_count += 1
+        return NeuralDecision(self.stale_policy == 'trade', latest.confidence, latest.key, latest.published_at)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
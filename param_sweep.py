@@ -0,0 +1,334 @@
+"""
+Перебор параметров стратегии на векторном движке
+
+Для каждого файла тики/свечи загружаются один раз (через tick_cache и
+candle_cache), свечи строятся один раз на candle_minutes, RSI считается
+для всех периодов сразу — массив (периоды x точки сигнала). Дальше каждая
+пара порогов rsi_buy/rsi_sell — только сравнения и автомат позиций над
+готовыми строками RSI.
+
+Сигналы стратегии зависят только от RSI, поэтому bb_period/bb_std на
+сделки не влияют и не перебираются (в сетке допускаются, но отбрасываются).
+
+Сетка делится на задачи (файл, группа периодов RSI), которые можно
+раскидать по процессам; итоги по файлам сводятся в порядке файлов и
+ранжируются. Sharpe комбинации считается по сделкам всех файлов сразу
+(моменты приращений equity, включая первую сделку файла, объединяются),
+а не усредняется по файлам:
+файл с одной-двумя сделками дает std = 0 и Sharpe порядка 1e6, который
+в среднем перекрыл бы все остальные.
+
+Использование:
+    python param_sweep.py "data/BTCUSDT_2024-07-*.csv.gz" --rsi-period 7,14,21 --rsi-buy 20,25,30 --rsi-sell 70,75,80 -j 4
+"""
+
+import argparse
+import glob
+import math
+import os
+from itertools import product
+
+import numpy as np
+
+from candle_cache import load_candles
+from performance_metrics import ANNUALIZATION, EPSILON, PerformanceMetrics
+from tick_cache import load_ticks
+from tick_resampler import resample_ticks
+from vector_backtest import (DEFAULT_PARAMS, _rsi_stream, _rsi_states, rsi_at_prices, simulate_positions,
+                             equity_from_positions)
+
+# Перебираемые параметры в порядке вложенности циклов
+GRID_KEYS = ('candle_minutes', 'use_custom_rsi', 'rsi_period', 'rsi_buy', 'rsi_sell')
+# Параметры, не влияющие на сигналы
+NO_EFFECT_KEYS = ('bb_period', 'bb_std')
+
+DEFAULT_GRID = {
+    'rsi_period': (7, 14, 21),
+    'rsi_buy': (20, 25, 30, 35),
+    'rsi_sell': (65, 70, 75, 80),
+}
+
+# Метрики ранжирования: имя -> чем больше, тем лучше
+RANK_METRICS = {'sharpe': True, 'equity': True, 'win_rate': True, 'max_drawdown': False}
+
+# Меньше приращений equity — Sharpe не считается (0.0): std по одному значению равно 0
+MIN_SHARPE_RETURNS = 2
+
+
+def normalize_grid(grid=None):
+    """Сетка -> {параметр: кортеж значений} для всех GRID_KEYS"""
+    grid = dict(DEFAULT_GRID if grid is None else grid)
+    ignored = [key for key in NO_EFFECT_KEYS if grid.pop(key, None) is not None]
+    if ignored:
+        print(f"ℹ️ {', '.join(ignored)} не влияют на сигналы — не перебираются")
+    unknown = set(grid) - set(GRID_KEYS)
+    if unknown:
+        raise ValueError(f"Параметры {sorted(unknown)} не перебираются (доступны {GRID_KEYS})")
+    normalized = {}
+    for key in GRID_KEYS:
+        values = grid.get(key, (DEFAULT_PARAMS[key],))
+        if not isinstance(values, (list, tuple)):
+            values = (values,)
+        if not values:
+            raise ValueError(f"Пустой список значений {key}")
+        normalized[key] = tuple(values)
+    return normalized
+
+
+def grid_size(grid):
+    return math.prod(len(values) for values in normalize_grid(grid).values())
+
+
+def _signal_path(filename, candle_minutes, mode, use_cache):
+    """(свечи, цены сигналов, свеча каждой цены) для режима mode"""
+    if mode == 'candle':
+        candles = load_candles(filename, candle_minutes, use_cache=use_cache)
+        closes = np.asarray(candles['close'], dtype=np.float64)
+        return candles, closes, np.arange(len(closes))
+    timestamps, prices, volumes = load_ticks(filename, use_cache=use_cache)
+    prices = np.asarray(prices, dtype=np.float64)
+    candles = resample_ticks(timestamps, prices, volumes, candle_minutes)
+    return candles, prices, candles['candle_ids']
+
+
+def rsi_matrix(closes, signal_prices, signal_candles, periods, use_custom_rsi=True):
+    """RSI для всех периодов: массив (len(periods), len(signal_prices))"""
+    rsi = np.empty((len(periods), len(signal_prices)))
+    for row, period in zip(rsi, periods):
+        stream = _rsi_stream({'rsi_period': period, 'use_custom_rsi': use_custom_rsi})
+        row[:] = rsi_at_prices(signal_prices, signal_candles, _rsi_states(closes, stream), stream)
+    return rsi
+
+
+def evaluate_thresholds(rsi, signal_prices, rsi_buy, rsi_sell):
+    """Итоги одной пары порогов по готовой строке RSI"""
+    change_idx, change_pos = simulate_positions(rsi < rsi_buy, rsi > rsi_sell)
+    final_price = signal_prices[-1] if len(signal_prices) else 0.0
+    trades = equity_from_positions(signal_prices, change_idx, change_pos, final_price)
+    metrics = PerformanceMetrics.from_trades(trades)
+    # Приращения equity с первой сделкой (от 1.0): для Sharpe по всем файлам вместе
+    changes = np.diff(np.concatenate(([1.0], np.asarray(trades, dtype=np.float64))))
+    returns_mean = float(changes.mean()) if len(changes) else 0.0
+    return {
+        'sharpe': float(metrics.sharpe()),
+        'returns': len(changes),
+        'returns_mean': returns_mean,
+        'returns_m2': float(((changes - returns_mean) ** 2).sum()),
+        'equity': float(metrics.equity),
+        'trades_count': len(trades),
+        'wins': metrics.wins,
+        'max_drawdown': metrics.max_drawdown,
+    }
+
+
+def sweep_file(filename, grid=None, mode='candle', use_cache=True):
+    """Все комбинации сетки на одном файле -> список dict (параметры + итоги)"""
+    grid = normalize_grid(grid)
+    results = []
+    for candle_minutes in grid['candle_minutes']:
+        candles, signal_prices, signal_candles = _signal_path(filename, candle_minutes, mode, use_cache)
+        closes = np.asarray(candles['close'], dtype=np.float64)
+        for use_custom_rsi in grid['use_custom_rsi']:
+            rsi = rsi_matrix(closes, signal_prices, signal_candles, grid['rsi_period'], use_custom_rsi)
+            for rsi_period, row in zip(grid['rsi_period'], rsi):
+                for rsi_buy, rsi_sell in product(grid['rsi_buy'], grid['rsi_sell']):
+                    result = evaluate_thresholds(row, signal_prices, rsi_buy, rsi_sell)
+                    result.update(candle_minutes=candle_minutes, use_custom_rsi=use_custom_rsi,
+                                  rsi_period=rsi_period, rsi_buy=rsi_buy, rsi_sell=rsi_sell)
+                    results.append(result)
+    return results
+
+
+def _sweep_task(filename, grid, mode, use_cache):
+    try:
+        return sweep_file(filename, grid, mode, use_cache)
+    except Exception as e:
+        return {'filename': filename, 'error': str(e)}
+
+
+def _tasks(files, grid, workers):
+    """(файл, подсетка): периоды RSI делятся на группы, чтобы загрузить процессы"""
+    periods = grid['rsi_period']
+    groups = min(len(periods), max(1, -(-workers // max(len(files), 1))))
+    size = -(-len(periods) // groups)
+    for filename in files:
+        for start in range(0, len(periods), size):
+            yield filename, dict(grid, rsi_period=periods[start:start + size])
+
+
+def _params_key(result):
+    return tuple(result[key] for key in GRID_KEYS)
+
+
+def _warm_caches(files, grid, mode):
+    """Кэши тиков/свечей создаются заранее, чтобы процессы не строили их одновременно"""
+    for filename in files:
+        for candle_minutes in grid['candle_minutes']:
+            try:
+                _signal_path(filename, candle_minutes, mode, True)
+            except Exception:
+                pass  # ошибка попадет в итоги задачи
+
+
+def sweep_files(files, grid=None, mode='candle', workers=1, use_cache=True):
+    """Сетка на каждом файле -> {файл: список итогов} или {файл: {'error': ...}}
+
+    Порядок ключей — порядок files, независимо от числа процессов.
+    """
+    grid = normalize_grid(grid)
+    if use_cache:
+        _warm_caches(files, grid, mode)
+
+    tasks = list(_tasks(files, grid, workers))
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = [executor.submit(_sweep_task, filename, subgrid, mode, use_cache)
+                       for filename, subgrid in tasks]
+            outputs = []
+            for (filename, _), future in zip(tasks, futures):
+                try:
+                    outputs.append(future.result())
+                except Exception as e:
+                    outputs.append({'filename': filename, 'error': f"{type(e).__name__}: {e}"})
+    else:
+        outputs = [_sweep_task(filename, subgrid, mode, use_cache) for filename, subgrid in tasks]
+
+    by_file = {filename: [] for filename in files}
+    for (filename, _), output in zip(tasks, outputs):
+        if isinstance(by_file[filename], dict):
+            continue
+        if isinstance(output, dict):
+            print(f"  ❌ {filename}: {output['error']}")
+            by_file[filename] = {'error': output['error']}
+        else:
+            by_file[filename].extend(output)
+    return by_file
+
+
+def _merge_moments(a, b):
+    """Моменты (число, среднее, M2) объединения двух выборок (Чан и др.)"""
+    count = a[0] + b[0]
+    if count == 0:
+        return a
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / count
+    m2 = a[2] + b[2] + delta * delta * a[0] * b[0] / count
+    return count, mean, m2
+
+
+def pooled_sharpe(moments):
+    """Sharpe по объединенным приращениям equity; 0.0, если их меньше MIN_SHARPE_RETURNS"""
+    count, mean, m2 = moments
+    if count < MIN_SHARPE_RETURNS:
+        return 0.0
+    std = math.sqrt(max(m2, 0.0) / count)
+    return mean / (std + EPSILON) * ANNUALIZATION
+
+
+def combine_results(per_file):
+    """Итоги по файлам (списки из sweep_file, в порядке файлов) -> итоги по комбинациям
+
+    equity — произведение equity по файлам, sharpe — по приращениям equity
+    всех файлов вместе (pooled_sharpe, моменты остаются в 'moments'),
+    max_drawdown — худший, win_rate — по всем сделкам.
+    """
+    combined = {}
+    for results in per_file:
+        for result in results:
+            row = combined.setdefault(_params_key(result), dict(
+                zip(GRID_KEYS, _params_key(result)), files=0, equity=1.0, moments=(0, 0.0, 0.0),
+                trades_count=0, wins=0, max_drawdown=0.0))
+            row['files'] += 1
+            row['equity'] *= result['equity']
+            row['moments'] = _merge_moments(row['moments'], (result['returns'], result['returns_mean'],
+                                                             result['returns_m2']))
+            row['trades_count'] += result['trades_count']
+            row['wins'] += result['wins']
+            row['max_drawdown'] = max(row['max_drawdown'], result['max_drawdown'])
+    rows = []
+    for row in combined.values():
+        row['sharpe'] = pooled_sharpe(row['moments'])
+        row['win_rate'] = row['wins'] / row['trades_count'] if row['trades_count'] else 0.0
+        row['pnl_percent'] = (row['equity'] - 1.0) * 100
+        rows.append(row)
+    return rows
+
+
+def rank_results(rows, rank_by='sharpe'):
+    if rank_by not in RANK_METRICS:
+        raise ValueError(f"Неизвестная метрика ранжирования: {rank_by} (доступны {list(RANK_METRICS)})")
+    return sorted(rows, key=lambda r: r[rank_by], reverse=RANK_METRICS[rank_by])
+
+
+def run_sweep(pattern="data/BTCUSDT_2024-07-*.csv.gz", grid=None, max_files=10, mode='candle', workers=1,
+              use_cache=True, rank_by='sharpe', top=20, min_trades=0):
+    """Перебор сетки по файлам -> ранжированный список итогов по комбинациям (см. combine_results)
+
+    min_trades — комбинации с меньшим числом сделок за все файлы отбрасываются.
+    """
+    if rank_by not in RANK_METRICS:
+        raise ValueError(f"Неизвестная метрика ранжирования: {rank_by} (доступны {list(RANK_METRICS)})")
+    grid = normalize_grid(grid)
+    files = sorted(glob.glob(pattern))[:max_files]
+    print(f"🔍 Перебор параметров: {len(files)} файлов x {grid_size(grid)} комбинаций (режим {mode})")
+
+    by_file = sweep_files(files, grid, mode, workers, use_cache)
+    rows = combine_results(results for results in by_file.values() if isinstance(results, list))
+    if min_trades:
+        kept = [row for row in rows if row['trades_count'] >= min_trades]
+        if len(kept) < len(rows):
+            print(f"ℹ️ Меньше {min_trades} сделок: {len(rows) - len(kept)} комбинаций отброшено")
+        rows = kept
+    rows = rank_results(rows, rank_by)
+    print_ranking(rows, rank_by, top)
+    return rows
+
+
+def print_ranking(rows, rank_by='sharpe', top=20):
+    print("=" * 96)
+    print(f"🏆 Топ-{min(top, len(rows))} из {len(rows)} комбинаций (по {rank_by})")
+    print(f"{'#':>3} {'свеча':>5} {'RSI':>6} {'период':>6} {'buy':>5} {'sell':>5} {'Sharpe':>9} "
+          f"{'Equity':>8} {'PnL %':>8} {'сделок':>7} {'win %':>6} {'просадка %':>10}")
+    for i, row in enumerate(rows[:top], 1):
+        rsi_type = 'SMA' if row['use_custom_rsi'] else 'Wilder'
+        print(f"{i:>3} {row['candle_minutes']:>4}m {rsi_type:>6} {row['rsi_period']:>6} {row['rsi_buy']:>5} "
+              f"{row['rsi_sell']:>5} {row['sharpe']:>9.4f} {row['equity']:>8.4f} {row['pnl_percent']:>+8.2f} "
+              f"{row['trades_count']:>7} {row['win_rate'] * 100:>6.1f} {row['max_drawdown'] * 100:>10.2f}")
+    print("=" * 96)
+
+
+def _number(text):
+    return float(text) if '.' in text else int(text)
+
+
+def _values(text, cast=int):
+    return tuple(cast(v) for v in text.split(',') if v)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Перебор параметров стратегии (векторный движок)')
+    parser.add_argument('pattern', nargs='?', default="data/BTCUSDT_2024-07-*.csv.gz")
+    parser.add_argument('max_files', nargs='?', type=int, default=10)
+    parser.add_argument('--rsi-period', type=_values, default=DEFAULT_GRID['rsi_period'])
+    parser.add_argument('--rsi-buy', type=lambda t: _values(t, _number), default=DEFAULT_GRID['rsi_buy'])
+    parser.add_argument('--rsi-sell', type=lambda t: _values(t, _number), default=DEFAULT_GRID['rsi_sell'])
+    parser.add_argument('--candle-minutes', type=_values, default=(DEFAULT_PARAMS['candle_minutes'],))
+    parser.add_argument('--wilder', action='store_true', help='RSI Уайлдера (TA-Lib) вместо SMA')
+    parser.add_argument('--ticks', action='store_true', help='Потиковые сигналы (как живой бот), медленнее')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='Процессов (0 — по числу ядер)')
+    parser.add_argument('--rank-by', default='sharpe', choices=list(RANK_METRICS))
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--min-trades', type=int, default=0, help='Минимум сделок за все файлы')
+    parser.add_argument('--no-cache', action='store_true', help='Без кэшей тиков и свечей')
+    args = parser.parse_args()
+    sweep_grid = {
+        'rsi_period': args.rsi_period,
+        'rsi_buy': args.rsi_buy,
+        'rsi_sell': args.rsi_sell,
+        'candle_minutes': args.candle_minutes,
+        'use_custom_rsi': (not args.wilder,),
+    }
+    run_sweep(args.pattern, sweep_grid, args.max_files, 'tick' if args.ticks else 'candle',
+              args.workers or os.cpu_count() or 1, not args.no_cache, args.rank_by, args.top,
+              args.min_trades)
@@ -0,0 +1,145 @@
+"""
+Потоковые метрики качества стратегии
+
+PerformanceMetrics обновляется при закрытии каждой сделки (on_trade) и на
+каждой точке кривой equity (on_equity) и читается в любой момент за O(1):
+бэктестер, /health и дебаг-дамп берут готовые значения вместо пересчета
+по спискам сделок.
+
+- Sharpe и Sortino — по приращениям equity между сделками, как
+  RSIStrategyBase.sharpe (np.diff(trades)), через бегущие моменты Уэлфорда;
+- просадка — от бегущего максимума equity;
+- win rate, profit factor, серии — по доходности сделки
+  (equity после сделки / equity до нее - 1).
+"""
+
+import math
+
+ANNUALIZATION = math.sqrt(252)
+
+# Добавка к знаменателю, как в RSIStrategyBase.sharpe
+EPSILON = 1e-8
+
+
+class PerformanceMetrics:
+    """Бегущие метрики по сделкам и кривой equity"""
+
+    def __init__(self, initial_equity=1.0):
+        self.initial_equity = initial_equity
+        self.equity = initial_equity
+        self.last_trade_equity = None   # equity после предыдущей сделки
+        # Моменты приращений equity между сделками (Уэлфорд)
+        self.returns_count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._downside_sq = 0.0         # сумма квадратов отрицательных приращений
+        # Сделки
+        self.trades = 0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.streak = 0                 # > 0 — серия прибыльных, < 0 — убыточных
+        self.max_win_streak = 0
+        self.max_loss_streak = 0
+        # Просадка
+        self.peak_equity = initial_equity
+        self.max_drawdown = 0.0
+        self.equity_samples = 0
+
+    @classmethod
+    def from_trades(cls, trades, initial_equity=1.0):
+        """Метрики по готовому ряду equity после сделок"""
+        metrics = cls(initial_equity)
+        for equity in trades:
+            metrics.on_trade(float(equity))
+        return metrics
+
+    def on_trade(self, equity):
+        """Закрытие сделки; equity — капитал после нее"""
+        previous = self.equity
+        pnl = equity / previous - 1 if previous else 0.0
+        self.trades += 1
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+            self.streak = self.streak + 1 if self.streak > 0 else 1
+            self.max_win_streak = max(self.max_win_streak, self.streak)
+        elif pnl < 0:
+            self.losses += 1
+            self.gross_loss -= pnl
+            self.streak = self.streak - 1 if self.streak < 0 else -1
+            self.max_loss_streak = max(self.max_loss_streak, -self.streak)
+        else:
+            self.streak = 0
+
+        if self.last_trade_equity is not None:
+            change = equity - self.last_trade_equity
+            self.returns_count += 1
+            delta = change - self._mean
+            self._mean += delta / self.returns_count
+            self._m2 += delta * (change - self._mean)
+            if change < 0:
+                self._downside_sq += change * change
+        self.last_trade_equity = equity
+        self._update_equity(equity)
+
+    def on_equity(self, equity):
+        """Точка кривой equity (закрытие свечи)"""
+        self.equity_samples += 1
+        self._update_equity(equity)
+
+    def _update_equity(self, equity):
+        self.equity = equity
+        if equity > self.peak_equity:
+            self.peak_equity = equity
+        elif self.peak_equity > 0:
+            drawdown = 1 - equity / self.peak_equity
+            if drawdown > self.max_drawdown:
+                self.max_drawdown = drawdown
+
+    @property
+    def drawdown(self):
+        """Текущая просадка от максимума (доля)"""
+        return 1 - self.equity / self.peak_equity if self.peak_equity > 0 else 0.0
+
+    def sharpe(self):
+        if self.returns_count == 0:
+            return 0.0
+        std = math.sqrt(max(self._m2, 0.0) / self.returns_count)
+        return self._mean / (std + EPSILON) * ANNUALIZATION
+
+    def sortino(self):
+        if self.returns_count == 0:
+            return 0.0
+        downside = math.sqrt(self._downside_sq / self.returns_count)
+        return self._mean / (downside + EPSILON) * ANNUALIZATION
+
+    def win_rate(self):
+        return self.wins / self.trades if self.trades else 0.0
+
+    def profit_factor(self):
+        """Сумма прибылей / сумма убытков (None, если убыточных сделок нет)"""
+        if self.gross_loss == 0:
+            return None
+        return self.gross_profit / self.gross_loss
+
+    def snapshot(self):
+        """Все метрики одним словарем (JSON-совместимо)"""
+        profit_factor = self.profit_factor()
+        return {
+            'trades': self.trades,
+            'equity': float(self.equity),
+            'sharpe': float(self.sharpe()),
+            'sortino': float(self.sortino()),
+            'max_drawdown': float(self.max_drawdown),
+            'drawdown': float(self.drawdown),
+            'peak_equity': float(self.peak_equity),
+            'win_rate': self.win_rate(),
+            'profit_factor': None if profit_factor is None else float(profit_factor),
+            'wins': self.wins,
+            'losses': self.losses,
+            'streak': self.streak,
+            'max_win_streak': self.max_win_streak,
+            'max_loss_streak': self.max_loss_streak,
+        }
@@ -0,0 +1,398 @@
+"""
+Хранилище результатов бэктестов в локальной SQLite
+
+Каждый массовый прогон (run_multiple_backtests с store=...) сохраняется:
+параметры стратегии, версия кода, отпечаток каждого файла, метрики по
+файлам и, по желанию, список сделок (equity после каждой). Индексы — по
+хэшу параметров и по дате файла/прогона.
+
+Результат для той же пары (параметры, файл) при том же движке, той же
+версии кода и том же окружении берется из базы, а не считается заново.
+Версия кода — хэш исходников модулей, влияющих на итоги (RESULT_MODULES):
+их правка делает старые записи недоступными для повторного использования
+(но не удаляет их), а правка отчетов и CLI-утилит — нет. Окружение — бэкенд индикаторов (TA-Lib или NumPy) и версия
+NumPy: от них зависят BB/ATR и округления. Взятый из базы итог не
+копируется: строка прогона ссылается на исходную (source_id), метрики и
+сделки хранятся один раз.
+
+Использование:
+    python results_store.py runs [--params HASH] [--since 2024-07-01] [--limit 20]
+    python results_store.py show RUN_ID [--trades]
+    python results_store.py compare RUN_A RUN_B
+    python results_store.py files --date 2024-07-01 [--params HASH]
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import re
+import sqlite3
+import subprocess
+from datetime import datetime, timezone
+
+from candle_cache import source_fingerprint
+
+DEFAULT_DB_PATH = 'backtest_results.sqlite'
+# Поля итогов файла, которые хранятся отдельными колонками (для запросов и сравнения)
+METRIC_COLUMNS = ('sharpe', 'equity', 'pnl_percent', 'trades_count', 'candles_count', 'entry_points',
+                  'exit_points', 'sortino', 'max_drawdown', 'win_rate', 'profit_factor')
+# Параметры, которые на результат не влияют и в хэш не входят
+NON_RESULT_PARAMS = ('history_window', 'archive_dir')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    pattern TEXT,
+    engine TEXT NOT NULL,
+    vector_mode TEXT,
+    params_hash TEXT NOT NULL,
+    params_json TEXT NOT NULL,
+    code_version TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    git_revision TEXT,
+    files_count INTEGER NOT NULL,
+    reused_count INTEGER NOT NULL,
+    total_equity REAL,
+    mean_sharpe REAL
+);
+CREATE TABLE IF NOT EXISTS file_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    filename TEXT NOT NULL,
+    file_date TEXT,
+    file_fingerprint TEXT NOT NULL,
+    params_hash TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    vector_mode TEXT,
+    code_version TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    source_id INTEGER REFERENCES file_results(id),
+    sharpe REAL, equity REAL, pnl_percent REAL, trades_count INTEGER, candles_count INTEGER,
+    entry_points INTEGER, exit_points INTEGER, sortino REAL, max_drawdown REAL, win_rate REAL,
+    profit_factor REAL,
+    has_trades INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS trades (
+    result_id INTEGER NOT NULL REFERENCES file_results(id),
+    seq INTEGER NOT NULL,
+    equity REAL NOT NULL,
+    PRIMARY KEY (result_id, seq)
+);
+CREATE INDEX IF NOT EXISTS runs_params ON runs(params_hash, created_at);
+CREATE INDEX IF NOT EXISTS runs_created ON runs(created_at);
+CREATE INDEX IF NOT EXISTS file_results_lookup
+    ON file_results(params_hash, file_fingerprint, engine, vector_mode, code_version, environment);
+CREATE INDEX IF NOT EXISTS file_results_date ON file_results(file_date, params_hash);
+CREATE INDEX IF NOT EXISTS file_results_run ON file_results(run_id);
+-- Строки прогонов с метриками исходной записи (для взятых из базы — по source_id)
+CREATE VIEW IF NOT EXISTS resolved_results AS
+    SELECT r.id, r.run_id, r.filename, r.file_date, r.file_fingerprint, r.params_hash, r.engine, r.vector_mode,
+           r.code_version, r.environment, r.source_id, s.id AS data_id,
+           s.sharpe, s.equity, s.pnl_percent, s.trades_count, s.candles_count, s.entry_points, s.exit_points,
+           s.sortino, s.max_drawdown, s.win_rate, s.profit_factor, s.has_trades
+    FROM file_results r JOIN file_results s ON s.id = COALESCE(r.source_id, r.id);
+"""
+
+
+def resolve_strategy_params(strategy_params=None):
+    """Параметры RSIStrategyBase со значениями по умолчанию (без не влияющих на результат)"""
+    from rsi_strategy import RSIStrategyBase
+    signature = inspect.signature(RSIStrategyBase.__init__)
+    params = {name: p.default for name, p in signature.parameters.items()
+              if name != 'self' and p.default is not inspect.Parameter.empty}
+    params.update(strategy_params or {})
+    for name in NON_RESULT_PARAMS:
+        params.pop(name, None)
+    return params
+
+
+def params_hash(strategy_params=None):
+    """Короткий хэш полного набора параметров (порядок ключей не важен)"""
+    canonical = json.dumps(resolve_strategy_params(strategy_params), sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+# Модули, от которых зависят итоги бэктеста: стратегия, индикаторы, оба движка,
+# чтение тиков и построение свечей. Отчеты, CLI-утилиты и бот в версию не входят
+RESULT_MODULES = ('backtester', 'candle_cache', 'candle_series', 'indicator_graph', 'neural_filter',
+                  'performance_metrics', 'rsi_strategy', 'streaming_indicators', 'tick_cache', 'tick_reader',
+                  'tick_resampler', 'vector_backtest')
+
+_code_version = None
+
+
+def code_version():
+    """Хэш исходников RESULT_MODULES (считается один раз на процесс)"""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in RESULT_MODULES:
+            path = os.path.join(directory, name + '.py')
+            digest.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()[:12]
+    return _code_version
+
+
+def environment():
+    """Бэкенд индикаторов и версия NumPy — результат зависит от них, а не только от кода"""
+    import numpy as np
+    from rsi_strategy import TALIB_AVAILABLE
+    return f"{'talib' if TALIB_AVAILABLE else 'numpy'}/numpy-{np.__version__}"
+
+
+def git_revision():
+    """Коммит git (для справки; None вне репозитория, например в Docker)"""
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def file_date(filename):
+    """Дата из имени файла (BTCUSDT_2024-07-01.csv.gz -> 2024-07-01) или None"""
+    match = re.search(r'(\d{4}-\d{2}-\d{2})', os.path.basename(filename))
+    return match.group(1) if match else None
+
+
+class ResultsStore:
+    """Прогоны и итоги по файлам в SQLite"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, filename, params_hash, engine, vector_mode=None, with_trades=False):
+        """Сохраненный итог файла (dict как у backtest_file_summary) или None
+
+        with_trades=True — только запись, где сохранен список сделок. Ищутся
+        только исходные записи (source_id IS NULL), 'result_id' — ее id.
+        """
+        row = self.conn.execute(
+            "SELECT * FROM file_results WHERE params_hash = ? AND file_fingerprint = ? AND engine = ? "
+            "AND vector_mode IS ? AND code_version = ? AND environment = ? AND source_id IS NULL "
+            "AND has_trades >= ? ORDER BY id DESC LIMIT 1",
+            (params_hash, source_fingerprint(filename), engine, vector_mode, code_version(), environment(),
+             int(with_trades)),
+        ).fetchone()
+        if row is None:
+            return None
+        result = {'filename': filename}
+        result.update((column, row[column]) for column in METRIC_COLUMNS)
+        if with_trades:
+            result['trades'] = self.trades(row['id'])
+        result['cached_from'] = row['run_id']
+        result['result_id'] = row['id']
+        return result
+
+    def trades(self, result_id):
+        rows = self.conn.execute("SELECT equity FROM trades WHERE result_id = ? ORDER BY seq", (result_id,))
+        return [row[0] for row in rows]
+
+    def save_run(self, results, strategy_params=None, engine='tick', vector_mode=None, pattern=None):
+        """Сохраняет прогон (список итогов по файлам в порядке файлов), возвращает id прогона
+
+        Итоги с ключом 'error' не сохраняются; 'trades' — если есть в итоге.
+        Итоги из базы (lookup, с 'result_id') сохраняются ссылкой на исходную
+        запись, без повторных метрик и сделок.
+        """
+        ok = [r for r in results if 'error' not in r]
+        total_equity = 1.0
+        for r in ok:
+            total_equity *= r['equity']
+        p_hash = params_hash(strategy_params)
+        version = code_version()
+        env = environment()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (created_at, pattern, engine, vector_mode, params_hash, params_json, code_version, "
+                "environment, git_revision, files_count, reused_count, total_equity, mean_sharpe) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (datetime.now(timezone.utc).isoformat(timespec='seconds'), pattern, engine, vector_mode, p_hash,
+                 json.dumps(resolve_strategy_params(strategy_params), sort_keys=True, default=str), version, env,
+                 git_revision(), len(ok), sum(1 for r in ok if 'result_id' in r),
+                 total_equity if ok else None, sum(r['sharpe'] for r in ok) / len(ok) if ok else None))
+            run_id = cursor.lastrowid
+            for r in ok:
+                keys = (run_id, os.path.abspath(r['filename']), file_date(r['filename']),
+                        source_fingerprint(r['filename']), p_hash, engine, vector_mode, version, env)
+                if 'result_id' in r:
+                    self.conn.execute(
+                        "INSERT INTO file_results (run_id, filename, file_date, file_fingerprint, params_hash, engine, "
+                        "vector_mode, code_version, environment, source_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (*keys, r['result_id']))
+                    continue
+                trades = r.get('trades')
+                cursor = self.conn.execute(
+                    f"INSERT INTO file_results (run_id, filename, file_date, file_fingerprint, params_hash, engine, "
+                    f"vector_mode, code_version, environment, {', '.join(METRIC_COLUMNS)}, has_trades) "
+                    f"VALUES ({', '.join('?' * (len(keys) + len(METRIC_COLUMNS) + 1))})",
+                    (*keys, *(r.get(column) for column in METRIC_COLUMNS), int(trades is not None)))
+                if trades is not None:
+                    self.conn.executemany("INSERT INTO trades (result_id, seq, equity) VALUES (?, ?, ?)",
+                                          ((cursor.lastrowid, i, float(e)) for i, e in enumerate(trades)))
+        return run_id
+
+    # --- Запросы ---
+
+    def runs(self, params_hash=None, since=None, limit=20):
+        query = "SELECT * FROM runs WHERE 1 = 1"
+        args = []
+        if params_hash:
+            query += " AND params_hash LIKE ?"
+            args.append(params_hash + '%')
+        if since:
+            query += " AND created_at >= ?"
+            args.append(since)
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        return [dict(row) for row in self.conn.execute(query, args)]
+
+    def run(self, run_id):
+        row = self.conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def run_results(self, run_id):
+        rows = self.conn.execute("SELECT * FROM resolved_results WHERE run_id = ? ORDER BY id", (run_id,))
+        return [dict(row) for row in rows]
+
+    def file_results(self, date=None, params_hash=None, limit=100):
+        query = "SELECT * FROM resolved_results WHERE 1 = 1"
+        args = []
+        if date:
+            query += " AND file_date = ?"
+            args.append(date)
+        if params_hash:
+            query += " AND params_hash LIKE ?"
+            args.append(params_hash + '%')
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        return [dict(row) for row in self.conn.execute(query, args)]
+
+
+def _params_diff(run_a, run_b):
+    a = json.loads(run_a['params_json'])
+    b = json.loads(run_b['params_json'])
+    return {key: (a.get(key), b.get(key)) for key in sorted(set(a) | set(b)) if a.get(key) != b.get(key)}
+
+
+def print_runs(runs):
+    print(f"{'id':>5} {'дата':>20} {'движок':>12} {'параметры':>16} {'код':>12} {'файлов':>6} {'из базы':>7} "
+          f"{'Equity':>8} {'Sharpe':>9}")
+    for run in runs:
+        engine = run['engine'] + (f"/{run['vector_mode']}" if run['vector_mode'] else '')
+        equity = f"{run['total_equity']:8.4f}" if run['total_equity'] is not None else f"{'—':>8}"
+        sharpe = f"{run['mean_sharpe']:9.4f}" if run['mean_sharpe'] is not None else f"{'—':>9}"
+        print(f"{run['id']:>5} {run['created_at'][:19]:>20} {engine:>12} {run['params_hash']:>16} "
+              f"{run['code_version']:>12} {run['files_count']:>6} {run['reused_count']:>7} {equity} {sharpe}")
+
+
+def print_results(results, show_run=False):
+    run_header = f"{'прогон':>6} {'движок':>12} " if show_run else ''
+    print(f"{run_header}{'файл':>32} {'Sharpe':>9} {'Equity':>8} {'PnL %':>8} {'сделок':>7} {'win %':>6} {'просадка %':>10}")
+    for r in results:
+        run_text = ''
+        if show_run:
+            engine = r['engine'] + (f"/{r['vector_mode']}" if r['vector_mode'] else '')
+            run_text = f"{r['run_id']:>6} {engine:>12} "
+        print(f"{run_text}{os.path.basename(r['filename']):>32} {r['sharpe']:9.4f} {r['equity']:8.4f} {r['pnl_percent']:+8.2f} "
+              f"{r['trades_count']:>7} {r['win_rate'] * 100:6.1f} {r['max_drawdown'] * 100:10.2f}")
+
+
+def compare_runs(store, run_a, run_b):
+    """Сравнение двух прогонов по общим файлам"""
+    a, b = store.run(run_a), store.run(run_b)
+    if a is None or b is None:
+        print(f"❌ Нет прогона {run_a if a is None else run_b}")
+        return None
+    print(f"🔀 Прогон {run_a} vs {run_b}")
+    diff = _params_diff(a, b)
+    for key, (value_a, value_b) in diff.items():
+        print(f"  {key}: {value_a} -> {value_b}")
+    if not diff:
+        print("  Параметры совпадают")
+    for key in ('engine', 'vector_mode'):
+        if a[key] != b[key]:
+            print(f"  {key}: {a[key]} -> {b[key]}")
+    if a['code_version'] != b['code_version']:
+        print(f"  Версия кода: {a['code_version']} -> {b['code_version']}")
+    if a['environment'] != b['environment']:
+        print(f"  Окружение: {a['environment']} -> {b['environment']}")
+    results_b = {r['filename']: r for r in store.run_results(run_b)}
+    rows = [(r, results_b[r['filename']]) for r in store.run_results(run_a) if r['filename'] in results_b]
+    print(f"{'файл':>32} {'PnL % A':>9} {'PnL % B':>9} {'Δ PnL':>8} {'Sharpe A':>10} {'Sharpe B':>10} "
+          f"{'сделок A':>9} {'сделок B':>9}")
+    for ra, rb in rows:
+        print(f"{os.path.basename(ra['filename']):>32} {ra['pnl_percent']:+9.2f} {rb['pnl_percent']:+9.2f} "
+              f"{rb['pnl_percent'] - ra['pnl_percent']:+8.2f} {ra['sharpe']:10.4f} {rb['sharpe']:10.4f} "
+              f"{ra['trades_count']:>9} {rb['trades_count']:>9}")
+    if rows:
+        equity_a = equity_b = 1.0
+        for ra, rb in rows:
+            equity_a *= ra['equity']
+            equity_b *= rb['equity']
+        print(f"Общих файлов: {len(rows)}; кумулятивная доходность: {(equity_a - 1) * 100:+.2f}% -> "
+              f"{(equity_b - 1) * 100:+.2f}%")
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Результаты бэктестов из SQLite')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    runs_parser = commands.add_parser('runs', help='Список прогонов')
+    runs_parser.add_argument('--params', help='Префикс хэша параметров')
+    runs_parser.add_argument('--since', help='Не раньше даты (YYYY-MM-DD)')
+    runs_parser.add_argument('--limit', type=int, default=20)
+    show_parser = commands.add_parser('show', help='Итоги прогона по файлам')
+    show_parser.add_argument('run_id', type=int)
+    show_parser.add_argument('--trades', action='store_true', help='Показать сохраненные сделки')
+    compare_parser = commands.add_parser('compare', help='Сравнить два прогона')
+    compare_parser.add_argument('run_a', type=int)
+    compare_parser.add_argument('run_b', type=int)
+    files_parser = commands.add_parser('files', help='Итоги по дате файла')
+    files_parser.add_argument('--date', help='Дата файла (YYYY-MM-DD)')
+    files_parser.add_argument('--params', help='Префикс хэша параметров')
+    files_parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"База {args.db} не найдена")
+    with ResultsStore(args.db) as results_store:
+        if args.command == 'runs':
+            print_runs(results_store.runs(args.params, args.since, args.limit))
+        elif args.command == 'show':
+            run_info = results_store.run(args.run_id)
+            if run_info is None:
+                parser.error(f"Нет прогона {args.run_id}")
+            print_runs([run_info])
+            print(f"Параметры: {run_info['params_json']}")
+            stored = results_store.run_results(args.run_id)
+            print_results(stored)
+            if args.trades:
+                for r in stored:
+                    if r['has_trades']:
+                        equities = ', '.join(f'{e:.4f}' for e in results_store.trades(r['data_id']))
+                        print(f"  {os.path.basename(r['filename'])}: {equities}")
+        elif args.command == 'compare':
+            compare_runs(results_store, args.run_a, args.run_b)
+        else:
+            print_results(results_store.file_results(args.date, args.params, args.limit), show_run=True)
@@ -1,42 +1,30 @@
+import os
+from importlib.util import find_spec
 import numpy as np
 from datetime import datetime, timedelta
+from candle_series import Candle, CandleSeries, CANDLE_DTYPE, dt_to_ms, ms_to_dt
+from history_archive import ArchiveFile, ArchivedList, FLOAT_CODEC, BB_CODEC, POINT_CODEC, create_session_dir
+from streaming_indicators import (SMARSIStream, WilderRSIStream, BollingerStream, ATRStream,
+                                  VolatilityRatioStream, RSITriggers)
+from indicator_graph import IndicatorGraph
+from performance_metrics import PerformanceMetrics
 
-try:
-    import talib
-    TALIB_AVAILABLE = True
-except ImportError:
-    TALIB_AVAILABLE = False
+# TA-Lib импортируется при первом вызове (_talib): потоковым индикаторам он не нужен,
+# а импорт заметно удлиняет старт бота и каждого процесса бэктеста
+TALIB_AVAILABLE = find_spec('talib') is not None
+if not TALIB_AVAILABLE:
     print("⚠️  TA-Lib не установлен. Используется кастомная реализация RSI.")
 
-class Candle:
-    def __init__(self, start_time):
-        self.start_time = start_time
-        self.open = None
-        self.high = None
-        self.low = None
-        self.close = None
-        self.volume = 0.0
-
-    def add_tick(self, price, volume):
-        if self.open is None:
-            self.open = price
-        self.high = price if self.high is None else max(self.high, price)
-        self.low = price if self.low is None else min(self.low, price)
-        self.close = price
-        self.volume += volume
-
-    def to_tuple(self):
-        return (self.start_time, self.open, self.high, self.low, self.close, self.volume)
-
-    def to_dict(self):
-        return {
-            'start_time': self.start_time,
-            'open': self.open,
-            'high': self.high,
-            'low': self.low,
-            'close': self.close,
-            'volume': self.volume
-        }
+_talib_module = None
+
+
+def _talib():
+    """Модуль talib (импорт при первом использовании)"""
+    global _talib_module
+    if _talib_module is None:
+        import talib
+        _talib_module = talib
+    return _talib_module
 
 # === КАСТОМНЫЕ ИНДИКАТОРЫ (наша реализация) ===
 
@@ -76,7 +64,7 @@ def compute_rsi(prices, period=14):
         prices_array = np.array(prices, dtype=np.float64)
         if len(prices_array) < period + 1:
             return 50.0
-        rsi_values = talib.RSI(prices_array, timeperiod=period)
+        rsi_values = _talib().RSI(prices_array, timeperiod=period)
         return rsi_values[-1] if not np.isnan(rsi_values[-1]) else 50.0
     else:
         # Fallback к кастомной реализации
@@ -88,7 +76,7 @@ def compute_bollinger_bands(prices, period=20, num_std=2):
         prices_array = np.array(prices, dtype=np.float64)
         if len(prices_array) < period:
             return None, None, None
-        upper, middle, lower = talib.BBANDS(prices_array, timeperiod=period, nbdevup=num_std, nbdevdn=num_std, matype=0)
+        upper, middle, lower = _talib().BBANDS(prices_array, timeperiod=period, nbdevup=num_std, nbdevdn=num_std, matype=0)
         if np.isnan(upper[-1]) or np.isnan(middle[-1]) or np.isnan(lower[-1]):
             return None, None, None
         return middle[-1], upper[-1], lower[-1]
@@ -98,11 +86,28 @@ def compute_bollinger_bands(prices, period=20, num_std=2):
 
 # === ИНДИКАТОРЫ ВОЛАТИЛЬНОСТИ ===
 
+def _candle_arrays(candles):
+    """high/low/close массивы свечей: представления CandleSeries или сборка из списка Candle"""
+    if isinstance(candles, CandleSeries):
+        return candles.highs, candles.lows, candles.closes
+    highs = np.array([c.high for c in candles], dtype=np.float64)
+    lows = np.array([c.low for c in candles], dtype=np.float64)
+    closes = np.array([c.close for c in candles], dtype=np.float64)
+    return highs, lows, closes
+
 def compute_atr_custom(candles, period=14):
     """Кастомная реализация Average True Range (ATR)"""
     if len(candles) < 2:
         return 0.0
     
+    if isinstance(candles, CandleSeries):
+        # Векторный True Range по колонкам (без копирования свечей)
+        highs, lows, closes = _candle_arrays(candles)
+        prev_closes = closes[:-1]
+        true_ranges = np.maximum(highs[1:] - lows[1:],
+                                 np.maximum(np.abs(highs[1:] - prev_closes), np.abs(lows[1:] - prev_closes)))
+        return np.mean(true_ranges[-period:])
+    
     true_ranges = []
     for i in range(1, len(candles)):
         prev_candle = candles[i-1]
@@ -129,12 +134,10 @@ def compute_atr(candles, period=14):
     if TALIB_AVAILABLE and len(candles) >= period:
         try:
             # Подготавливаем данные для TA-Lib
-            highs = np.array([c.high for c in candles], dtype=np.float64)
-            lows = np.array([c.low for c in candles], dtype=np.float64)
-            closes = np.array([c.close for c in candles], dtype=np.float64)
+            highs, lows, closes = _candle_arrays(candles)
             
             if len(highs) >= period:
-                atr_values = talib.ATR(highs, lows, closes, timeperiod=period)
+                atr_values = _talib().ATR(highs, lows, closes, timeperiod=period)
                 return atr_values[-1] if not np.isnan(atr_values[-1]) else 0.0
             else:
                 return 0.0
@@ -155,7 +158,8 @@ def compute_volatility_ratio(candles, atr_period=14, lookback=50):
     # Вычисляем ATR для каждого периода в lookback окне
     atr_values = []
     for i in range(max(atr_period + 1, len(candles) - lookback), len(candles)):
-        atr_val = compute_atr(candles[:i+1], atr_period)
+        prefix = candles.view(0, i + 1) if isinstance(candles, CandleSeries) else candles[:i+1]
+        atr_val = compute_atr(prefix, atr_period)
         if atr_val > 0:
             atr_values.append(atr_val)
     
@@ -168,7 +172,9 @@ def compute_volatility_ratio(candles, atr_period=14, lookback=50):
 class RSIStrategyBase:
     def __init__(self, rsi_period=14, rsi_buy=30, rsi_sell=70, bb_period=20, bb_std=2, candle_minutes=5, 
                  use_custom_rsi=True, use_dual_rsi=False, use_neural_filter=False, 
-                 neural_confidence_threshold=0.6):  # 🏆 По умолчанию используем выигрышную стратегию!
+                 neural_confidence_threshold=0.6, history_window=None, archive_dir=None,
+                 neural_model_path=None, neural_inference='sync', neural_stale_policy='wait',
+                 neural_max_wait=0.05):  # 🏆 По умолчанию используем выигрышную стратегию!
         self.rsi_period = rsi_period
         self.rsi_buy = rsi_buy
         self.rsi_sell = rsi_sell
@@ -180,36 +186,75 @@ class RSIStrategyBase:
         self.use_neural_filter = use_neural_filter  # 🧠 Использовать нейронный фильтр
         self.neural_confidence_threshold = neural_confidence_threshold
         
+        # 💾 Ограничение памяти: history_window=None — хранить всю историю в памяти,
+        # иначе держим max_lookback() + history_window последних значений,
+        # а вытесненные пишем в архив archive_dir (если задан)
+        self.history_window = history_window
+        self.archive_dir = archive_dir
+        self.archive_path = None
+        self.retained = None
+        if history_window is not None:
+            self.retained = self.max_lookback() + history_window
+            if archive_dir:
+                self.archive_path = create_session_dir(archive_dir)
+        
         self.position = 0  # 1 = long, -1 = short, 0 = flat
         self.last_price = None
-        self.candles = []
+        if self.retained is None:
+            self.candles = CandleSeries()  # 📦 Колоночное хранилище закрытых свечей
+        else:
+            self.candles = CandleSeries(maxlen=self.retained, archive=self._archive_file('candles', CANDLE_DTYPE))
         self.current_candle = None
         self.current_candle_time = None
+        self.current_candle_ms = None  # начало текущей свечи в мс (для on_tick_ms)
+        self.shared_candles = False    # свечи ведет агрегатор таймфреймов (use_shared_candles)
         
         # Массивы для хранения значений индикаторов
-        self.rsi_values = []           # Основной RSI (TA-Lib или кастомный)
-        self.rsi_custom_values = []    # Кастомный RSI (если используется dual mode)
-        self.bb_values = []
-        self.atr_values = []           # 📊 Значения ATR (волатильность)
-        self.volatility_ratios = []    # 📈 Коэффициенты волатильности
+        self.rsi_values = self._history('rsi_values')                  # Основной RSI (TA-Lib или кастомный)
+        self.rsi_custom_values = self._history('rsi_custom_values')    # Кастомный RSI (если используется dual mode)
+        self.bb_values = self._history('bb_values', BB_CODEC)
+        self.atr_values = self._history('atr_values')                  # 📊 Значения ATR (волатильность)
+        self.volatility_ratios = self._history('volatility_ratios')    # 📈 Коэффициенты волатильности
         
-        self.entry_points = []  # (datetime, цена)
-        self.exit_points = []   # (datetime, цена)
+        self.entry_points = self._history('entry_points', POINT_CODEC)  # (datetime, цена)
+        self.exit_points = self._history('exit_points', POINT_CODEC)    # (datetime, цена)
         self.equity = 1.0
-        self.equity_curve = []
-        self.trades = []
+        self.equity_curve = self._history('equity_curve')
+        self.trades = self._history('trades')
+        self.metrics = PerformanceMetrics(self.equity)  # 📈 Sharpe, просадка, win rate за O(1)
         
-        # Оптимизация работы с данными
-        self.cached_closes = []
-        self.last_candle_count = 0
+        # ⚡ Потоковые индикаторы: O(1) на тик вместо пересчёта по всей истории
+        if use_custom_rsi or not TALIB_AVAILABLE:
+            self.rsi_stream = SMARSIStream(rsi_period)
+        else:
+            self.rsi_stream = WilderRSIStream(rsi_period)
+        if use_dual_rsi and not isinstance(self.rsi_stream, SMARSIStream):
+            self.rsi_custom_stream = SMARSIStream(rsi_period)
+        else:
+            self.rsi_custom_stream = self.rsi_stream
+        self.bb_stream = BollingerStream(bb_period, bb_std)
+        self.atr_stream = ATRStream(14, wilder=TALIB_AVAILABLE)
+        self.volatility_stream = VolatilityRatioStream(atr_period=14, lookback=50)
+        self.indicators = self._build_indicator_graph()
+        # ⚡ Пороги RSI в ценах для текущей свечи: тик внутри свечи — два сравнения
+        self.rsi_triggers = RSITriggers(self.rsi_stream, rsi_buy, rsi_sell)
         
-        # 🧠 Нейронный фильтр
+        # 🧠 Нейронный фильтр (NumPy, веса из neural_model_path)
         self.neural_filter = None
+        self.neural_window = None      # окно признаков, обновляется раз на свечу
+        self.neural_decision = (True, 0.5)
+        # neural_inference='thread'/'process' — инференс вне потока тиков,
+        # neural_stale_policy решает вход, пока результат свечи не готов
+        self.neural_worker = None
         if use_neural_filter:
             try:
-                from neural_filter import NeuralSignalFilter
-                self.neural_filter = NeuralSignalFilter()
-                print("🧠 Нейронный фильтр загружен")
+                from neural_filter import NeuralSignalFilter, NeuralInferenceWorker
+                self.neural_filter = NeuralSignalFilter(neural_model_path)
+                self.neural_window = self.neural_filter.create_window()
+                if neural_inference != 'sync':
+                    self.neural_worker = NeuralInferenceWorker(self.neural_filter, neural_inference,
+                                                               neural_stale_policy, neural_max_wait)
+                print(f"🧠 Нейронный фильтр загружен (инференс: {neural_inference})")
             except Exception as e:
                 print(f"⚠️ Не удалось загрузить нейронный фильтр: {e}")
                 self.use_neural_filter = False
@@ -226,120 +271,130 @@ class RSIStrategyBase:
             rsi_type = "TA-Lib Wilder's" if TALIB_AVAILABLE else "Custom SMA-based (fallback)"
             print(f"📊 Standard Strategy: {rsi_type} RSI + TA-Lib Bollinger Bands + {atr_type} ATR{neural_info}")
 
+    def max_lookback(self):
+        """Самое длинное окно в свечах, которое нужно индикаторам и нейрофильтру"""
+        # RSI: period+1 цен, BB: period, ATR(14): 15 свечей,
+        # волатильность: 50 свечей, нейронный фильтр: 20 значений
+        return max(self.rsi_period + 1, self.bb_period, 14 + 1, 50, 20)
+
+    def _archive_file(self, name, dtype):
+        if self.archive_path is None:
+            return None
+        return ArchiveFile(os.path.join(self.archive_path, f'{name}.bin'), dtype)
+
+    def _history(self, name, codec=FLOAT_CODEC):
+        """Обычный список или ArchivedList в режиме ограничения памяти"""
+        if self.retained is None:
+            return []
+        return ArchivedList(self.retained, self._archive_file(name, codec.dtype), codec)
+
     def dt_to_candle_start(self, dt):
         discard = timedelta(minutes=dt.minute % self.candle_minutes,
                             seconds=dt.second,
                             microseconds=dt.microsecond)
         return dt - discard
 
+    def candle_start_ms(self, ts_ms):
+        """Целочисленный аналог dt_to_candle_start для метки времени в мс"""
+        minutes = ts_ms // 60000
+        return (minutes - minutes % 60 % self.candle_minutes) * 60000
+
     def on_tick(self, price, dt, volume=0):
         # --- Свечи ---
         candle_time = self.dt_to_candle_start(dt)
-        candle_closed = False
-        
         if self.current_candle is None or candle_time != self.current_candle_time:
+            return self._on_tick(price, volume, candle_time, dt_to_ms(candle_time))
+        return self._on_tick(price, volume)
+
+    def on_tick_ms(self, price, ts_ms, volume=0):
+        """⚡ on_tick для метки времени в мс (UTC)
+
+        Свеча определяется целочисленно, datetime создается только на
+        границе свечи, а не на каждый тик.
+        """
+        start_ms = self.candle_start_ms(ts_ms)
+        if self.current_candle is None or start_ms != self.current_candle_ms:
+            return self._on_tick(price, volume, ms_to_dt(start_ms), start_ms)
+        return self._on_tick(price, volume)
+
+    def _on_tick(self, price, volume, new_candle_time=None, new_candle_ms=None):
+        """Обработка тика; new_candle_time задан, если тик открывает новую свечу"""
+        closed_candle = None
+        
+        if new_candle_time is not None:
             if self.current_candle is not None:
-                self.candles.append(self.current_candle)
-                candle_closed = True
-            self.current_candle = Candle(candle_time)
-            self.current_candle_time = candle_time
+                closed_candle = self.current_candle
+                self.candles.append(closed_candle)
+            self.current_candle = Candle(new_candle_time)
+            self.current_candle_time = new_candle_time
+            self.current_candle_ms = new_candle_ms
         self.current_candle.add_tick(price, volume)
+        return self._evaluate_tick(price, closed_candle)
+
+    def use_shared_candles(self, candles):
+        """Подключает общий ряд свечей (см. multi_timeframe.TimeframeAggregator)
+
+        Свечи при этом ведет агрегатор: стратегия получает тики через
+        on_shared_tick и сама в ряд ничего не добавляет.
+        """
+        if len(self.candles) or self.current_candle is not None:
+            raise ValueError("Общий ряд свечей подключается до первого тика")
+        self.candles = candles
+        self.shared_candles = True
+
+    def on_shared_tick(self, price, candle, candle_ms, closed_candle=None):
+        """Тик от агрегатора таймфреймов
+
+        candle — формирующаяся свеча таймфрейма (тик уже учтен), closed_candle —
+        свеча, закрытая этим тиком (уже добавлена в общий ряд).
+        """
+        if candle is not self.current_candle:
+            self.current_candle = candle
+            self.current_candle_time = candle.start_time
+            self.current_candle_ms = candle_ms
+        return self._evaluate_tick(price, closed_candle)
+
+    def _evaluate_tick(self, price, closed_candle=None):
+        """Индикаторы, сигналы и позиция для тика текущей свечи"""
+        candle_closed = closed_candle is not None
         
-        # --- Оптимизированный расчет индикаторов ---
-        current_candle_count = len(self.candles)
-        
-        # Обновляем кэшированный массив closes только при необходимости
-        if candle_closed or current_candle_count != self.last_candle_count:
-            self.cached_closes = [c.close for c in self.candles]
-            self.last_candle_count = current_candle_count
-        
-        # Добавляем текущую цену для расчетов
-        closes_with_current = self.cached_closes + [self.current_candle.close]
-        
-        # 🏆 ОПТИМИЗИРОВАННАЯ СТРАТЕГИЯ:
-        # - RSI: используем нашу выигрышную кастомную реализацию (SMA-based)  
-        # - Bollinger Bands: используем TA-Lib (быстрее, результат тот же)
-        
-        if self.use_custom_rsi:
-            # Используем только кастомный RSI (выигрышная стратегия!)
-            rsi = compute_rsi_custom(closes_with_current, period=self.rsi_period)
-            rsi_custom = rsi  # Для совместимости
-        elif self.use_dual_rsi:
-            # Используем оба варианта RSI для сравнения
-            rsi = compute_rsi(closes_with_current, period=self.rsi_period)  # TA-Lib
-            rsi_custom = compute_rsi_custom(closes_with_current, period=self.rsi_period)  # Кастомный
-        else:
-            # Fallback к стандартному RSI (TA-Lib или кастомный)
-            rsi = compute_rsi(closes_with_current, period=self.rsi_period)
-            rsi_custom = rsi  # Для совместимости
-        
-        # Bollinger Bands всегда через TA-Lib (если доступен) - быстрее и результат тот же
-        ma, upper, lower = compute_bollinger_bands(closes_with_current, period=self.bb_period, num_std=self.bb_std)
-        
-        # 📊 Вычисляем индикаторы волатильности
-        atr = compute_atr(self.candles + [self.current_candle], period=14)
-        volatility_ratio = compute_volatility_ratio(self.candles + [self.current_candle], atr_period=14, lookback=50)
-        
-        # Сохраняем значения только при закрытии свечи
+        # --- Потоковый расчет индикаторов ---
+        # Закрытая свеча один раз попадает в скользящие суммы,
+        # для текущей свечи берем предварительные значения за O(1)
         if candle_closed:
-            self.rsi_values.append(rsi)
-            self.bb_values.append((ma, upper, lower))
-            self.atr_values.append(atr)
-            self.volatility_ratios.append(volatility_ratio)
-            if self.use_dual_rsi:
-                self.rsi_custom_values.append(rsi_custom)
-        elif len(self.rsi_values) == len(self.candles):
+            self._update_streams(closed_candle)
+        
+        # Сохраняем значения только при закрытии свечи — только тогда
+        # индикаторы и считаются, остальным тикам хватает цен срабатывания RSI
+        if candle_closed or len(self.rsi_values) == len(self.candles):
             # Для текущей свечи - обновляем последнее значение
-            self.rsi_values.append(rsi)
-            self.bb_values.append((ma, upper, lower))
-            self.atr_values.append(atr)
-            self.volatility_ratios.append(volatility_ratio)
-            if self.use_dual_rsi:
-                self.rsi_custom_values.append(rsi_custom)
+            self._record_values(*self._current_values())
+        rsi_below_buy, rsi_above_sell = self.rsi_triggers.signals(price)
         # --- Сигналы ---
         signal = self.position
         candle_dt = self.current_candle.start_time
         candle_close = self.current_candle.close
         
-        # 🧠 Нейронная фильтрация сигналов
+        # 🧠 Нейронная фильтрация сигналов: решение считается раз на свечу
+        # (см. _update_neural_decision), тик только читает его — и только
+        # когда есть сигнал на вход
         neural_approved = True
-        neural_confidence = 0.5
-        
-        if self.use_neural_filter and self.neural_filter and len(self.rsi_values) >= 20:
-            try:
-                # Подготавливаем признаки для нейронной сети
-                lookback = min(20, len(self.rsi_values))
-                recent_rsi = self.rsi_values[-lookback:]
-                recent_bb = self.bb_values[-lookback:]
-                recent_atr = self.atr_values[-lookback:]
-                recent_vol_ratio = self.volatility_ratios[-lookback:]
-                recent_prices = [c.close for c in self.candles[-lookback:]]
-                
-                features = self.neural_filter.prepare_features(
-                    recent_rsi, recent_bb, recent_atr, recent_vol_ratio, recent_prices
-                )
-                
-                if features is not None:
-                    neural_approved, neural_confidence = self.neural_filter.should_trade(
-                        features, self.neural_confidence_threshold
-                    )
-            except Exception as e:
-                print(f"⚠️ Ошибка нейронного фильтра: {e}")
-                neural_approved = True  # Fallback к обычной логике
+        if self.position == 0 and (rsi_below_buy or rsi_above_sell):
+            neural_approved = self._neural_approved()
         
         # Логика для лонгов (с нейронной фильтрацией)
-        if rsi < self.rsi_buy and self.position == 0 and neural_approved:
+        if rsi_below_buy and self.position == 0 and neural_approved:
             signal = 1  # открыть лонг
             self.entry_points.append((candle_dt, candle_close))
-        elif rsi > self.rsi_sell and self.position == 1:
+        elif rsi_above_sell and self.position == 1:
             signal = 0  # закрыть лонг (выход без фильтрации)
             self.exit_points.append((candle_dt, candle_close))
             
         # Логика для шортов (с нейронной фильтрацией)
-        elif rsi > self.rsi_sell and self.position == 0 and neural_approved:
+        elif rsi_above_sell and self.position == 0 and neural_approved:
             signal = -1  # открыть шорт
             self.entry_points.append((candle_dt, candle_close))
-        elif rsi < self.rsi_buy and self.position == -1:
+        elif rsi_below_buy and self.position == -1:
             signal = 0  # закрыть шорт (выход без фильтрации)
             self.exit_points.append((candle_dt, candle_close))
         # Управление позицией (эмулируем сделки для оффлайн-теста)
@@ -349,12 +404,12 @@ class RSIStrategyBase:
                 # Закрываем лонг
                 pnl = (price - self.last_price) / self.last_price
                 self.equity *= (1 + pnl)
-                self.trades.append(self.equity)
+                self._record_trade()
             elif self.position == -1 and self.last_price is not None:
                 # Закрываем шорт (обратный расчет PnL)
                 pnl = (self.last_price - price) / self.last_price
                 self.equity *= (1 + pnl)
-                self.trades.append(self.equity)
+                self._record_trade()
             
             # Открываем новую позицию
             if signal == 1 or signal == -1:
@@ -363,35 +418,26 @@ class RSIStrategyBase:
             self.position = signal
         # Сохраняем equity только при закрытии свечи
         if candle_closed:
-            self.equity_curve.append(self.equity)
+            self._record_equity()
         elif len(self.equity_curve) == len(self.candles):
             # Для текущей свечи - обновляем последнее значение
-            self.equity_curve.append(self.equity)
+            self._record_equity()
         
         # Возвращаем текущий сигнал для торгового бота
         return signal
 
     def on_finish(self, price):
         if self.current_candle is not None:
-            self.candles.append(self.current_candle)
+            # Финальные значения для последней свечи: та же логика что и в on_tick,
+            # текущая свеча выступает последней закрытой
+            values = self.indicators.values(self.current_candle)
+            rsi = values['rsi']
+            rsi_custom = values.get('rsi_custom', rsi)
+            ma, upper, lower = values['bb']
             
-            # Добавляем финальные RSI/BB значения для последней свечи
-            closes = [c.close for c in self.candles]
-            
-            # Вычисляем финальные значения индикаторов (используем ту же логику что и в on_tick)
-            if self.use_custom_rsi:
-                # Финальный расчет с выигрышной кастомной реализацией RSI
-                rsi = compute_rsi_custom(closes, period=self.rsi_period)
-                rsi_custom = rsi
-            elif self.use_dual_rsi:
-                rsi = compute_rsi(closes, period=self.rsi_period)
-                rsi_custom = compute_rsi_custom(closes, period=self.rsi_period)
-            else:
-                rsi = compute_rsi(closes, period=self.rsi_period)
-                rsi_custom = rsi
-            
-            # Bollinger Bands через TA-Lib (быстрее)
-            ma, upper, lower = compute_bollinger_bands(closes, period=self.bb_period, num_std=self.bb_std)
+            if not self.shared_candles:
+                self.candles.append(self.current_candle)
+            self._update_streams(self.current_candle)
             
             # Если у нас еще нет значения для последней свечи
             if len(self.rsi_values) < len(self.candles):
@@ -405,21 +451,145 @@ class RSIStrategyBase:
             # Закрываем лонг
             pnl = (price - self.last_price) / self.last_price
             self.equity *= (1 + pnl)
-            self.trades.append(self.equity)
+            self._record_trade()
             self.position = 0
         elif self.position == -1 and self.last_price is not None:
             # Закрываем шорт
             pnl = (self.last_price - price) / self.last_price
             self.equity *= (1 + pnl)
-            self.trades.append(self.equity)
+            self._record_trade()
             self.position = 0
         
         # Добавляем финальное значение equity только если его еще нет
         if len(self.equity_curve) < len(self.candles):
-            self.equity_curve.append(self.equity)
+            self._record_equity()
+        
+        if self.neural_worker is not None:
+            self.neural_worker.close()
+
+    def current_rsi(self):
+        """RSI формирующейся свечи по последней цене (считается по запросу)"""
+        if self.current_candle is None:
+            return None
+        return self.rsi_stream.provisional(self.current_candle.close)
+
+    def _current_values(self):
+        """Предварительные значения индикаторов для формирующейся свечи"""
+        # 🏆 ОПТИМИЗИРОВАННАЯ СТРАТЕГИЯ:
+        # - RSI: используем нашу выигрышную кастомную реализацию (SMA-based)  
+        # - Bollinger Bands: используем TA-Lib (быстрее, результат тот же)
+        # Выбор реализации RSI делается один раз в __init__ (см. rsi_stream),
+        # общие входы (дельта, True Range) граф считает один раз
+        values = self.indicators.values(self.current_candle)
+        rsi = values['rsi']
+        rsi_custom = values.get('rsi_custom', rsi)  # Для совместимости
+        return rsi, rsi_custom, values['bb'], values['atr'], values['volatility_ratio']
+
+    def _record_values(self, rsi, rsi_custom, bb, atr, volatility_ratio):
+        self.rsi_values.append(rsi)
+        self.bb_values.append(bb)
+        self.atr_values.append(atr)
+        self.volatility_ratios.append(volatility_ratio)
+        if self.use_dual_rsi:
+            self.rsi_custom_values.append(rsi_custom)
+        if self.neural_window is not None:
+            # Цена — закрытие последней закрытой свечи
+            price = float(self.candles.closes[-1]) if len(self.candles) else None
+            self.neural_window.push(rsi, bb, atr, volatility_ratio, price)
+            self._update_neural_decision()
+
+    def _update_neural_decision(self):
+        """🧠 Прогон сети по окну признаков — раз на свечу, признаки внутри свечи не меняются"""
+        self.neural_decision = (True, 0.5)
+        if not self.neural_window.full:
+            if self.neural_worker is not None:
+                self.neural_worker.publish(self.neural_window.count, True, 0.5)
+            return
+        try:
+            features = self.neural_window.features()
+            if self.neural_worker is not None:
+                # Результат опубликует воркер, тик прочитает его в _neural_approved
+                if features is None:
+                    self.neural_worker.publish(self.neural_window.count, True, 0.5)
+                else:
+                    self.neural_worker.submit(self.neural_window.count, features,
+                                              self.neural_confidence_threshold)
+            elif features is not None:
+                self.neural_decision = self.neural_filter.should_trade(
+                    features, self.neural_confidence_threshold
+                )
+        except Exception as e:
+            print(f"⚠️ Ошибка нейронного фильтра: {e}")
+            self.neural_decision = (True, 0.5)  # Fallback к обычной логике
+
+    def _neural_approved(self):
+        """Разрешен ли вход фильтром для текущей свечи"""
+        if self.neural_worker is not None:
+            decision = self.neural_worker.decision(self.neural_window.count)
+            self.neural_decision = (decision.approved, decision.confidence)
+        return self.neural_decision[0]
+
+    def load_candles(self, start_ms, opens, highs, lows, closes, volumes=None):
+        """📥 Массовая предзагрузка истории свечей (например, klines биржи)
+
+        Свечи уже должны быть в интервале candle_minutes (см.
+        tick_resampler.resample_ohlcv). Все свечи, кроме последней,
+        становятся закрытыми; последняя — текущей формирующейся, и живые тики
+        того же интервала продолжают её. Значения индикаторов записываются
+        по цене закрытия каждой свечи, сигналы и сделки не генерируются.
+        """
+        if self.shared_candles:
+            raise ValueError("Свечи ведет агрегатор таймфреймов, предзагрузка идет через него")
+        if volumes is None:
+            volumes = np.zeros(len(closes))
+        rows = zip(np.asarray(start_ms).tolist(), np.asarray(opens, dtype=float).tolist(),
+                   np.asarray(highs, dtype=float).tolist(), np.asarray(lows, dtype=float).tolist(),
+                   np.asarray(closes, dtype=float).tolist(), np.asarray(volumes, dtype=float).tolist())
+        for start, open_, high, low, close, volume in rows:
+            if self.current_candle is not None:
+                self.candles.append(self.current_candle)
+                self._update_streams(self.current_candle)
+            self.current_candle = Candle(ms_to_dt(start), open_, high, low, close, volume)
+            self.current_candle_time = self.current_candle.start_time
+            self.current_candle_ms = start
+            self._record_values(*self._current_values())
+            self._record_equity()
+
+    def _build_indicator_graph(self):
+        """🧮 Граф индикаторов: дельта закрытия и True Range считаются один раз на свечу"""
+        graph = IndicatorGraph()
+        graph.add('rsi', ('delta',), self.rsi_stream.provisional_delta,
+                  self.rsi_stream.update_delta, ('delta', 'close'))
+        if self.rsi_custom_stream is not self.rsi_stream:
+            graph.add('rsi_custom', ('delta',), self.rsi_custom_stream.provisional_delta,
+                      self.rsi_custom_stream.update_delta, ('delta', 'close'))
+        graph.add('bb', ('close',), self.bb_stream.provisional, self.bb_stream.update)
+        graph.add('atr', ('true_range',), self.atr_stream.provisional_tr,
+                  self.atr_stream.update_tr, ('true_range', 'close', 'atr'))
+        graph.add('volatility_ratio', ('atr',), self.volatility_stream.provisional,
+                  self.volatility_stream.update)
+        return graph
+
+    def indicator_values(self):
+        """Значения индикаторов формирующейся свечи (кэш графа на свечу)"""
+        if self.current_candle is None:
+            return {}
+        return self.indicators.values(self.current_candle)
+
+    def _update_streams(self, candle):
+        """Добавляет закрытую свечу в потоковые индикаторы"""
+        self.indicators.close(candle)
+        self.rsi_triggers = RSITriggers(self.rsi_stream, self.rsi_buy, self.rsi_sell)
+
+    def _record_trade(self):
+        """Сделка закрыта: equity в историю сделок и в метрики"""
+        self.trades.append(self.equity)
+        self.metrics.on_trade(self.equity)
+
+    def _record_equity(self):
+        """Точка кривой equity (раз на свечу)"""
+        self.equity_curve.append(self.equity)
+        self.metrics.on_equity(self.equity)
 
     def sharpe(self):
-        returns = np.diff(self.trades)
-        if len(returns) == 0:
-            return 0.0
-        return np.mean(returns) / (np.std(returns) + 1e-8) * np.sqrt(252) 
\ No newline at end of file
+        return self.metrics.sharpe() 
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Отчет о времени импорта бота и бэктестера
+
+Каждая цель импортируется в чистом процессе с `python -X importtime`,
+отчет показывает общее время, самые тяжелые модули и тяжелые зависимости,
+которые должны подгружаться лениво (графики, нейросеть, TA-Lib).
+Код выхода 1 — бюджет превышен или тяжелая зависимость импортирована на старте.
+
+Использование:
+    python startup_report.py [bot|backtester ...] [--top 15] [--budget 1500]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Цель -> (модуль, бюджет старта в мс)
+TARGETS = {
+    'bot': ('bybit_bot', 1500),
+    'backtester': ('backtester', 600),
+}
+
+# Импортируются только при первом использовании
+LAZY_MODULES = ('matplotlib', 'tensorflow', 'sklearn', 'pandas', 'joblib', 'talib')
+
+
+def measure_imports(module):
+    """[(модуль, собственное мкс, суммарное мкс, вложенность)] для импорта module"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Импорт {module} завершился ошибкой:\n{result.stderr.strip().splitlines()[-1]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def report(target, top=15, budget_ms=None):
+    """Печатает отчет по цели, возвращает True если старт укладывается в бюджет"""
+    module, default_budget = TARGETS[target]
+    budget_ms = default_budget if budget_ms is None else budget_ms
+    rows = measure_imports(module)
+    # Верхний уровень (вложенность 0) покрывает весь импорт
+    total_ms = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+    lazy = sorted({name.split('.')[0] for name, _, _, _ in rows} & set(LAZY_MODULES))
+
+    ok = total_ms <= budget_ms and not lazy
+    print(f"\n{'✅' if ok else '❌'} {target} (import {module}): {total_ms:.0f} мс, бюджет {budget_ms} мс")
+    print(f"{'модуль':<40} {'сумм. мс':>10} {'собств. мс':>10}")
+    for name, self_us, cumulative, depth in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"{'  ' * min(depth, 4) + name:<40} {cumulative / 1000:>10.1f} {self_us / 1000:>10.1f}")
+    if lazy:
+        print(f"⚠️ Импортированы на старте (должны быть ленивыми): {', '.join(lazy)}")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Время импорта бота и бэктестера')
+    parser.add_argument('targets', nargs='*', help=f"Цели: {', '.join(TARGETS)} (по умолчанию все)")
+    parser.add_argument('--top', type=int, default=15, help='Сколько самых тяжелых модулей показать')
+    parser.add_argument('--budget', type=float, help='Бюджет старта в мс (вместо значения по умолчанию)')
+    args = parser.parse_args()
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"неизвестные цели: {', '.join(sorted(unknown))}")
+    results = []
+    for target in args.targets or TARGETS:
+        try:
+            results.append(report(target, args.top, args.budget))
+        except RuntimeError as e:
+            print(f"\n❌ {target}: {e}")
+            results.append(False)
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,461 @@
+"""
+Потоковые (инкрементальные) индикаторы для RSIStrategyBase
+
+Каждый индикатор хранит скользящие суммы по закрытым свечам:
+- update(...) вызывается один раз при закрытии свечи;
+- provisional(...) возвращает предварительное значение для формирующейся
+  свечи за O(1), не меняя состояния.
+
+Совпадение с функциями из rsi_strategy:
+- WilderRSIStream повторяет порядок операций talib.RSI и совпадает побитово;
+- ATRStream(wilder=True) совпадает с talib.ATR до последнего бита мантиссы
+  (относительная погрешность < 1e-15, сборка TA-Lib округляет сглаживание
+  Уайлдера иначе, чем Python);
+- SMARSIStream, BollingerStream и ATRStream(wilder=False) используют
+  скользящие суммы вместо суммирования numpy по окну. Расхождение — ошибка
+  округления порядка 1e-12 относительной величины (Bollinger по сравнению
+  с TA-Lib — до ~1e-9, т.к. сам TA-Lib накапливает суммы по всей истории).
+Ветки "down == 0" / "недостаточно данных" воспроизводятся точно.
+
+RSITriggers переводит пороги RSI в цены срабатывания на время свечи, чтобы
+тик внутри свечи проверялся двумя сравнениями без расчета RSI.
+"""
+
+import math
+from collections import deque
+
+# Как часто (в закрытых свечах) пересчитывать скользящие суммы заново,
+# чтобы ошибка округления от сложений/вычитаний не накапливалась
+RESYNC_EVERY = 256
+
+# TA_IS_ZERO из TA-Lib
+TALIB_EPSILON = 1e-8
+
+
+class SMARSIStream:
+    """Потоковый аналог compute_rsi_custom (RSI на простом среднем)"""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.count = 0              # закрытых свечей
+        self.last_close = None
+        self._deltas = deque()      # последние period-1 закрытых дельт
+        self._gain_sum = 0.0
+        self._loss_sum = 0.0
+        self._loss_count = 0        # число отрицательных дельт в окне
+        self._since_resync = 0
+
+    def update(self, close):
+        self.update_delta(None if self.last_close is None else close - self.last_close, close)
+
+    def update_delta(self, delta, close):
+        """update с готовой дельтой close - last_close (None для первой свечи)"""
+        if delta is not None and self.period > 1:
+            if len(self._deltas) == self.period - 1:
+                old = self._deltas.popleft()
+                if old > 0:
+                    self._gain_sum -= old
+                elif old < 0:
+                    self._loss_sum += old
+                    self._loss_count -= 1
+            self._deltas.append(delta)
+            if delta > 0:
+                self._gain_sum += delta
+            elif delta < 0:
+                self._loss_sum -= delta
+                self._loss_count += 1
+            self._since_resync += 1
+            if self._since_resync >= RESYNC_EVERY:
+                self._resync()
+        self.last_close = close
+        self.count += 1
+
+    def _resync(self):
+        self._gain_sum = sum(d for d in self._deltas if d > 0)
+        self._loss_sum = -sum(d for d in self._deltas if d < 0)
+        self._since_resync = 0
+
+    def base_sums(self):
+        """Суммы закрытого окна, к которым provisional добавляет текущую дельту
+
+        Возвращает (gain, loss, loss_count).
+        """
+        return self._gain_sum, self._loss_sum, self._loss_count
+
+    def provisional(self, close):
+        """RSI по закрытым свечам + текущей цене формирующейся свечи"""
+        if self.count < self.period:
+            return 50.0
+        return self.provisional_delta(close - self.last_close)
+
+    def provisional_delta(self, delta):
+        """provisional с готовой дельтой текущей цены к last_close"""
+        if self.count < self.period:
+            return 50.0
+        gain_sum = self._gain_sum
+        loss_sum = self._loss_sum
+        loss_count = self._loss_count
+        if delta > 0:
+            gain_sum += delta
+        elif delta < 0:
+            loss_sum -= delta
+            loss_count += 1
+        up = gain_sum / self.period
+        down = loss_sum / self.period
+        rs = up / down if loss_count != 0 else 0
+        return 100. - 100. / (1. + rs)
+
+
+class WilderRSIStream:
+    """Потоковый аналог compute_rsi через TA-Lib (сглаживание Уайлдера)
+
+    Порядок операций повторяет talib.RSI (деление на period выполняется
+    умножением на 1/period), поэтому значения совпадают с talib.RSI(...)[-1]
+    побитово.
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self._inv_period = 1.0 / period
+        self.count = 0
+        self.last_close = None
+        self._gain_acc = 0.0        # накопление для затравки (первые period дельт)
+        self._loss_acc = 0.0
+        self.avg_gain = None        # сглаженные средние после затравки
+        self.avg_loss = None
+
+    def update(self, close):
+        self.update_delta(None if self.last_close is None else close - self.last_close, close)
+
+    def update_delta(self, delta, close):
+        """update с готовой дельтой close - last_close (None для первой свечи)"""
+        if delta is not None:
+            if self.avg_gain is None:
+                if delta < 0:
+                    self._loss_acc -= delta
+                else:
+                    self._gain_acc += delta
+                # count == число дельт после этой свечи
+                if self.count == self.period:
+                    self.avg_gain = self._gain_acc * self._inv_period
+                    self.avg_loss = self._loss_acc * self._inv_period
+            else:
+                self.avg_gain, self.avg_loss = self._smooth(self.avg_gain, self.avg_loss, delta)
+        self.last_close = close
+        self.count += 1
+
+    def _smooth(self, gain, loss, delta):
+        gain *= (self.period - 1)
+        loss *= (self.period - 1)
+        if delta < 0:
+            loss -= delta
+        else:
+            gain += delta
+        return gain * self._inv_period, loss * self._inv_period
+
+    def base_sums(self):
+        """Суммы, к которым provisional добавляет текущую дельту перед умножением на 1/period
+
+        Возвращает (gain, loss, None) — число отрицательных дельт не используется.
+        """
+        if self.avg_gain is None:
+            return self._gain_acc, self._loss_acc, None
+        return self.avg_gain * (self.period - 1), self.avg_loss * (self.period - 1), None
+
+    def provisional(self, close):
+        if self.count < self.period:
+            return 50.0
+        return self.provisional_delta(close - self.last_close)
+
+    def provisional_delta(self, delta):
+        """provisional с готовой дельтой текущей цены к last_close"""
+        if self.count < self.period:
+            return 50.0
+        if self.avg_gain is None:
+            # Текущая дельта — последняя в затравочном окне
+            gain, loss = self._gain_acc, self._loss_acc
+            if delta < 0:
+                loss -= delta
+            else:
+                gain += delta
+            gain *= self._inv_period
+            loss *= self._inv_period
+        else:
+            gain, loss = self._smooth(self.avg_gain, self.avg_loss, delta)
+        total = gain + loss
+        if -TALIB_EPSILON < total < TALIB_EPSILON:
+            return 0.0
+        return 100.0 * (gain / total)
+
+
+# Полуширина зоны вокруг цены срабатывания (относительно |цена| + суммы окна),
+# внутри которой RSITriggers считает RSI точно
+TRIGGER_TOLERANCE = 1e-9
+
+
+def _crossing_price(last_close, gain, loss, ratio):
+    """Цена x, при которой rs(x) = (gain + max(x - last, 0)) / (loss + max(last - x, 0)) = ratio"""
+    if gain < ratio * loss:
+        # rs(last) < ratio: пересечение выше последнего закрытия
+        return last_close + (ratio * loss - gain)
+    return last_close - (gain / ratio - loss)
+
+
+class RSITriggers:
+    """Цены срабатывания порогов RSI для формирующейся свечи
+
+    Внутри свечи меняется только текущая цена, а RSI (SMARSIStream и
+    WilderRSIStream) — неубывающая функция цены: RSI = 100 * rs / (1 + rs),
+    rs = (gain + рост) / (loss + падение) относительно последнего закрытия.
+    Поэтому при открытии свечи пороги rsi_buy/rsi_sell один раз переводятся
+    в цены, и сигнал на тике — это сравнение цены с ними.
+
+    Особенности, которые воспроизводятся точно:
+    - меньше period закрытых свечей: RSI = 50 на любой цене;
+    - SMA без убыточных дельт в окне: при цене >= последнего закрытия
+      RSI = 0 (rs = 0), то есть зона покупки состоит из двух частей;
+    - Уайлдер при почти нулевых суммах (TA_IS_ZERO) и пороги вне (0, 100):
+      RSI считается точно на каждом тике.
+    Цены рядом с точкой срабатывания (TRIGGER_TOLERANCE) тоже проверяются
+    точным provisional, поэтому сигналы совпадают с прямым расчетом RSI.
+    """
+
+    def __init__(self, stream, rsi_buy, rsi_sell):
+        self.stream = stream
+        self.rsi_buy = rsi_buy
+        self.rsi_sell = rsi_sell
+        self.exact = False
+        self.buy_below = -math.inf      # покупка: цена < buy_below
+        self.sell_above = math.inf      # продажа: цена > sell_above
+        self.zero_from = None           # SMA без убытков: RSI = 0 при цене >= zero_from
+        self.tolerance = 0.0
+        if stream.count < stream.period:
+            if 50.0 < rsi_buy:
+                self.buy_below = math.inf
+            if 50.0 > rsi_sell:
+                self.sell_above = -math.inf
+            return
+        if not (0 < rsi_buy < 100 and 0 < rsi_sell < 100):
+            self.exact = True
+            return
+        gain, loss, loss_count = stream.base_sums()
+        last_close = stream.last_close
+        if loss_count is None:
+            # Уайлдер: рядом с нулевой суммой работает ветка TA_IS_ZERO
+            if (gain + loss) * stream._inv_period < 100 * TALIB_EPSILON:
+                self.exact = True
+                return
+        elif loss_count == 0:
+            self.zero_from = last_close
+        elif loss <= 0:
+            self.exact = True
+            return
+        buy_ratio = rsi_buy / (100 - rsi_buy)
+        sell_ratio = rsi_sell / (100 - rsi_sell)
+        self.buy_below = _crossing_price(last_close, gain, loss, buy_ratio)
+        self.sell_above = _crossing_price(last_close, gain, loss, sell_ratio)
+        self.tolerance = TRIGGER_TOLERANCE * (abs(last_close) + gain + loss)
+
+    def signals(self, price):
+        """(RSI < rsi_buy, RSI > rsi_sell) для текущей цены формирующейся свечи"""
+        if (self.exact or abs(price - self.buy_below) <= self.tolerance
+                or abs(price - self.sell_above) <= self.tolerance):
+            rsi = self.stream.provisional(price)
+            return rsi < self.rsi_buy, rsi > self.rsi_sell
+        if self.zero_from is not None and price >= self.zero_from:
+            return True, False
+        return price < self.buy_below, price > self.sell_above
+
+
+class BollingerStream:
+    """Потоковый аналог compute_bollinger_bands (SMA ± num_std * std)
+
+    Суммы считаются относительно опорной цены (anchor), чтобы не терять
+    точность на E[x^2] - E[x]^2 при ценах порядка 1e4-1e5.
+    """
+
+    def __init__(self, period=20, num_std=2):
+        self.period = period
+        self.num_std = num_std
+        self.count = 0
+        self._window = deque()      # последние period-1 закрытых цен
+        self._anchor = None
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._since_resync = 0
+
+    def update(self, close):
+        if self._anchor is None:
+            self._anchor = close
+        if self.period > 1:
+            if len(self._window) == self.period - 1:
+                old = self._window.popleft() - self._anchor
+                self._sum -= old
+                self._sum_sq -= old * old
+            self._window.append(close)
+            shifted = close - self._anchor
+            self._sum += shifted
+            self._sum_sq += shifted * shifted
+            self._since_resync += 1
+            if self._since_resync >= min(self.period, RESYNC_EVERY):
+                self._resync()
+        self.count += 1
+
+    def _resync(self):
+        # Переносим опорную цену к последнему закрытию и пересчитываем суммы
+        self._anchor = self._window[-1]
+        shifted = [c - self._anchor for c in self._window]
+        self._sum = sum(shifted)
+        self._sum_sq = sum(s * s for s in shifted)
+        self._since_resync = 0
+
+    def provisional(self, close):
+        if self.count + 1 < self.period:
+            return None, None, None
+        anchor = self._anchor if self._anchor is not None else close
+        shifted = close - anchor
+        mean = (self._sum + shifted) / self.period
+        variance = (self._sum_sq + shifted * shifted) / self.period - mean * mean
+        std = math.sqrt(variance) if variance > 0 else 0.0
+        ma = anchor + mean
+        return ma, ma + self.num_std * std, ma - self.num_std * std
+
+
+def true_range(high, low, prev_close):
+    """True Range = max(high-low, |high-prev_close|, |low-prev_close|)"""
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class ATRStream:
+    """Потоковый аналог compute_atr
+
+    wilder=True повторяет ветку TA-Lib (включая её особенности: среднее TR
+    при числе свечей < period и 0.0 ровно при period свечах), wilder=False —
+    compute_atr_custom (среднее последних period значений True Range).
+    """
+
+    def __init__(self, period=14, wilder=True):
+        self.period = period
+        self.wilder = wilder
+        self.count = 0
+        self.prev_close = None
+        self.tr_count = 0
+        self._tr_acc = 0.0          # последовательная сумма TR (затравка Уайлдера)
+        self.atr = None             # сглаженный ATR по закрытым свечам
+        self.value = 0.0            # ATR ряда закрытых свечей (compute_atr(candles))
+        self._window = deque()      # последние period-1 закрытых TR (SMA-режим)
+        self._window_sum = 0.0
+        self._since_resync = 0
+
+    def update(self, high, low, close):
+        tr = None if self.prev_close is None else true_range(high, low, self.prev_close)
+        # Значение ATR с учетом закрываемой свечи — элемент ряда ATR по свечам
+        self.update_tr(tr, close, self.provisional_tr(tr))
+
+    def update_tr(self, tr, close, value):
+        """update с готовым True Range (None для первой свечи) и ATR закрываемой свечи"""
+        self.value = value
+        if tr is not None:
+            self.tr_count += 1
+            if self.wilder:
+                if self.atr is None:
+                    self._tr_acc += tr
+                    if self.tr_count == self.period:
+                        self.atr = self._tr_acc / self.period
+                else:
+                    self.atr = self._smooth(self.atr, tr)
+            elif self.period > 1:
+                if len(self._window) == self.period - 1:
+                    self._window_sum -= self._window.popleft()
+                self._window.append(tr)
+                self._window_sum += tr
+                self._since_resync += 1
+                if self._since_resync >= RESYNC_EVERY:
+                    self._window_sum = sum(self._window)
+                    self._since_resync = 0
+        self.prev_close = close
+        self.count += 1
+
+    def _smooth(self, atr, tr):
+        atr *= self.period - 1
+        atr += tr
+        return atr / self.period
+
+    def provisional(self, high, low, close):
+        """ATR по закрытым свечам + формирующейся свече (high, low, close)"""
+        if self.count < 1:
+            return 0.0
+        return self.provisional_tr(true_range(high, low, self.prev_close))
+
+    def provisional_tr(self, tr):
+        """provisional с готовым True Range формирующейся свечи"""
+        candles = self.count + 1
+        if candles < 2:
+            return 0.0
+        if not self.wilder:
+            if self.period <= 1:
+                return tr
+            return (self._window_sum + tr) / (len(self._window) + 1)
+        if candles < self.period:
+            return (self._tr_acc + tr) / (candles - 1)
+        if candles == self.period:
+            return 0.0
+        if self.atr is None:
+            return (self._tr_acc + tr) / self.period
+        return self._smooth(self.atr, tr)
+
+
+class VolatilityRatioStream:
+    """Потоковый аналог compute_volatility_ratio (текущая ATR / средняя ATR)
+
+    Хранит ряд ATR закрытых свечей (последние lookback значений) и скользящую
+    сумму положительных из них, поэтому коэффициент для формирующейся свечи
+    читается за O(1) вместо lookback пересчетов ATR по срезам истории.
+    Совпадение с compute_volatility_ratio — с точностью до округления
+    суммы (~1e-13 относительной величины).
+    """
+
+    def __init__(self, atr_period=14, lookback=50):
+        self.atr_period = atr_period
+        self.lookback = lookback
+        self.count = 0              # закрытых свечей (= длина ряда ATR)
+        self.atr_history = deque()  # (индекс свечи, ATR) в окне lookback
+        self._positive_sum = 0.0
+        self._positive_count = 0
+        self._since_resync = 0
+
+    def update(self, atr):
+        """Добавляет ATR только что закрытой свечи (ATRStream.value)"""
+        index = self.count
+        self.count += 1
+        # Окно compute_volatility_ratio начинается не раньше atr_period + 1
+        if index >= self.atr_period + 1:
+            self.atr_history.append((index, atr))
+            if atr > 0:
+                self._positive_sum += atr
+                self._positive_count += 1
+        # Для следующей формирующейся свечи нужны индексы >= count + 1 - lookback
+        first = self.count + 1 - self.lookback
+        while self.atr_history and self.atr_history[0][0] < first:
+            _, old = self.atr_history.popleft()
+            if old > 0:
+                self._positive_sum -= old
+                self._positive_count -= 1
+        self._since_resync += 1
+        if self._since_resync >= RESYNC_EVERY:
+            self._positive_sum = sum(a for _, a in self.atr_history if a > 0)
+            self._since_resync = 0
+
+    def provisional(self, current_atr):
+        """Коэффициент для формирующейся свечи с ATR = current_atr"""
+        if self.count + 1 < self.lookback:
+            return 1.0
+        total = self._positive_sum
+        count = self._positive_count
+        if current_atr > 0:
+            total += current_atr
+            count += 1
+        if count == 0 or current_atr == 0:
+            return 1.0
+        avg_atr = total / count
+        return current_atr / avg_atr if avg_atr > 0 else 1.0
@@ -0,0 +1,179 @@
+"""
+Кэш тиковых файлов в колоночном бинарном формате с отображением в память
+
+Один раз .csv.gz разбирается (tick_reader) и сохраняется в несжатые .npy
+колонки: timestamp (int64, мс), price и volume (float64). Повторные прогоны
+открывают их через np.load(mmap_mode='r'): ни распаковки, ни разбора, а
+страницы файла общие для всех процессов бэктеста (без копии на процесс).
+
+Кэш лежит в <папка файла>/.tick_cache/<имя файла>/ (или в cache_dir):
+timestamp.npy, price.npy, volume.npy и meta.json. meta.json пишется
+последним и хранит размер и mtime исходника — если они изменились, кэш
+пересобирается.
+"""
+
+import json
+import os
+import uuid
+
+import numpy as np
+
+from tick_reader import DEFAULT_CHUNK_BYTES, TICK_COLUMNS, iter_tick_chunks, read_tick_arrays
+
+CACHE_DIRNAME = '.tick_cache'
+CACHE_VERSION = 1
+COLUMN_DTYPES = {'timestamp': np.int64, 'price': np.float64, 'volume': np.float64}
+
+# Сколько тиков отдавать стратегии за раз из отображенного файла
+DEFAULT_CHUNK_ROWS = 1 << 20
+
+
+def cache_dir_for(filename, cache_dir=None):
+    """Папка кэша для исходного файла"""
+    base = cache_dir or os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIRNAME)
+    return os.path.join(base, os.path.basename(filename))
+
+
+def _source_stamp(filename):
+    stat = os.stat(filename)
+    return {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_cache_valid(filename, cache_dir=None):
+    meta = _read_meta(cache_dir_for(filename, cache_dir))
+    if meta is None:
+        return False
+    stamp = _source_stamp(filename)
+    return all(meta.get(key) == value for key, value in stamp.items())
+
+
+def _temp_path(directory, name):
+    """Уникальное имя временного файла рядом с целевым: параллельные сборки не пишут в один файл"""
+    return os.path.join(directory, f'{name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp')
+
+
+def _remove_quietly(paths):
+    for tmp_path in paths:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def build_cache(filename, cache_dir=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Разбирает исходный файл в колонки кэша, возвращает путь к папке кэша
+
+    Колонки сначала пишутся потоком в сырые файлы (память ограничена
+    блоком разбора), затем оборачиваются в .npy. Все промежуточные файлы
+    уникальны для сборки и подменяют итоговые через os.replace, поэтому
+    несколько процессов (-j, param_sweep) могут собирать один кэш одновременно.
+    """
+    path = cache_dir_for(filename, cache_dir)
+    os.makedirs(path, exist_ok=True)
+    stamp = _source_stamp(filename)
+    meta_path = os.path.join(path, 'meta.json')
+    if os.path.exists(meta_path):
+        try:
+            os.remove(meta_path)    # кэш невалиден, пока не записаны все колонки
+        except FileNotFoundError:
+            pass                    # уже удалил параллельный сборщик
+
+    raw_paths = {column: _temp_path(path, f'{column}.raw') for column in TICK_COLUMNS}
+    tmp_paths = list(raw_paths.values())
+    try:
+        rows = 0
+        raw_files = {column: open(raw_path, 'wb') for column, raw_path in raw_paths.items()}
+        try:
+            for chunk in iter_tick_chunks(filename, chunk_bytes):
+                for column, values in zip(TICK_COLUMNS, chunk):
+                    values.astype(COLUMN_DTYPES[column], copy=False).tofile(raw_files[column])
+                rows += len(chunk[0])
+        finally:
+            for f in raw_files.values():
+                f.close()
+
+        for column, raw_path in raw_paths.items():
+            dtype = COLUMN_DTYPES[column]
+            npy_path = os.path.join(path, f'{column}.npy')
+            tmp_path = _temp_path(path, f'{column}.npy')
+            tmp_paths.append(tmp_path)
+            out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(rows,))
+            if rows:
+                out[:] = np.memmap(raw_path, dtype=dtype, mode='r', shape=(rows,))
+            out.flush()
+            del out
+            os.replace(tmp_path, npy_path)
+
+        tmp_meta = _temp_path(path, 'meta.json')
+        tmp_paths.append(tmp_meta)
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(dict(stamp, rows=rows, source=os.path.abspath(filename)), f)
+        os.replace(tmp_meta, meta_path)
+    finally:
+        _remove_quietly(tmp_paths)   # после os.replace их уже нет
+    return path
+
+
+def _load_columns(path):
+    arrays = []
+    for column in TICK_COLUMNS:
+        column_path = os.path.join(path, f'{column}.npy')
+        try:
+            arrays.append(np.load(column_path, mmap_mode='r'))
+        except ValueError:
+            arrays.append(np.load(column_path))  # пустую колонку не отобразить в память
+    return tuple(arrays)
+
+
+def load_ticks(filename, cache_dir=None, use_cache=True):
+    """(timestamps, prices, volumes) файла — из кэша, отображенного в память
+
+    Кэш создается или пересобирается при первом обращении. Если записать
+    кэш нельзя (например, папка только для чтения), файл просто разбирается.
+    """
+    if not use_cache:
+        return read_tick_arrays(filename)
+    if not is_cache_valid(filename, cache_dir):
+        try:
+            build_cache(filename, cache_dir)
+        except OSError as e:
+            print(f"⚠️ Не удалось записать кэш тиков для {filename}: {e}")
+            return read_tick_arrays(filename)
+    return _load_columns(cache_dir_for(filename, cache_dir))
+
+
+def iter_ticks(filename, cache_dir=None, use_cache=True, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Тики кусками (как tick_reader.iter_tick_chunks), из кэша если он включен"""
+    if not use_cache:
+        yield from iter_tick_chunks(filename)
+        return
+    timestamps, prices, volumes = load_ticks(filename, cache_dir)
+    for start in range(0, len(timestamps), chunk_rows):
+        end = start + chunk_rows
+        yield timestamps[start:end], prices[start:end], volumes[start:end]
+
+
+def iter_ticks_across(filenames, cache_dir=None, use_cache=True, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Несколько файлов одним потоком по времени: (filename, timestamps, prices, volumes)
+
+    Файлы читаются по очереди кусками (в памяти — один кусок). Тики, которые
+    раньше уже отданного (перекрытие соседних файлов), пропускаются —
+    поток остается неубывающим по времени.
+    """
+    last_ts = None
+    for filename in filenames:
+        for timestamps, prices, volumes in iter_ticks(filename, cache_dir, use_cache, chunk_rows):
+            if last_ts is not None and len(timestamps) and timestamps[0] < last_ts:
+                keep = timestamps >= last_ts
+                timestamps, prices, volumes = timestamps[keep], prices[keep], volumes[keep]
+            if len(timestamps):
+                last_ts = timestamps[-1]
+                yield filename, timestamps, prices, volumes
@@ -0,0 +1,102 @@
+"""
+Векторная агрегация тиков в свечи OHLCV
+
+Вместо datetime/timedelta на каждый тик (RSIStrategyBase.on_tick) начало
+свечи считается целочисленно по миллисекундам, а OHLCV — сегментными
+редукциями numpy (reduceat) по границам свечей за один проход.
+
+Семантика совпадает с потиковым путем:
+- начало свечи — как RSIStrategyBase.dt_to_candle_start (минута внутри
+  часа округляется вниз до кратной candle_minutes);
+- новая свеча начинается там, где начало свечи меняется относительно
+  предыдущего тика, поэтому тики должны идти в порядке файла/потока.
+"""
+
+import numpy as np
+
+MINUTE_MS = 60_000
+
+
+def candle_start_ms(timestamps, candle_minutes=5):
+    """Начало свечи (мс) для каждой метки времени — как dt_to_candle_start"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    minutes = timestamps // MINUTE_MS
+    return (minutes - (minutes % 60) % candle_minutes) * MINUTE_MS
+
+
+def _boundaries(starts):
+    """Маска первых элементов каждой свечи"""
+    boundary = np.empty(len(starts), dtype=bool)
+    if len(starts):
+        boundary[0] = True
+        np.not_equal(starts[1:], starts[:-1], out=boundary[1:])
+    return boundary
+
+
+def resample_ohlcv(start_ms, opens, highs, lows, closes, volumes=None, candle_minutes=5):
+    """Свечи меньшего интервала (или тики) -> свечи candle_minutes
+
+    Возвращает dict массивов start_ms/open/high/low/close/volume, а также
+    first — индекс первого входного элемента каждой свечи и candle_ids —
+    номер свечи для каждого входного элемента.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    if volumes is None:
+        volumes = np.zeros(len(closes))
+    starts = candle_start_ms(start_ms, candle_minutes)
+    boundary = _boundaries(starts)
+    first = np.flatnonzero(boundary)
+    if len(first) == 0:
+        empty = np.empty(0)
+        return {'start_ms': np.empty(0, dtype=np.int64), 'open': empty, 'high': empty, 'low': empty,
+                'close': empty, 'volume': empty, 'first': np.empty(0, dtype=np.int64),
+                'candle_ids': np.empty(0, dtype=np.int64)}
+    last = np.append(first[1:], len(closes)) - 1
+    return {
+        'start_ms': starts[first],
+        'open': np.asarray(opens, dtype=np.float64)[first],
+        'high': np.maximum.reduceat(np.asarray(highs, dtype=np.float64), first),
+        'low': np.minimum.reduceat(np.asarray(lows, dtype=np.float64), first),
+        'close': closes[last],
+        'volume': np.add.reduceat(np.asarray(volumes, dtype=np.float64), first),
+        'first': first,
+        'candle_ids': np.cumsum(boundary) - 1,
+    }
+
+
+def resample_ticks(timestamps, prices, volumes=None, candle_minutes=5):
+    """Тики (мс, цена, объем) -> свечи OHLCV за один проход"""
+    prices = np.asarray(prices, dtype=np.float64)
+    return resample_ohlcv(timestamps, prices, prices, prices, prices, volumes, candle_minutes)
+
+
+def check_rollup(timeframes):
+    """Проверяет, что старшие таймфреймы сворачиваются из младшего
+
+    Свечи младшего таймфрейма base не должны пересекать границы старших:
+    base делит 60 (свечи привязаны к часу) и каждый таймфрейм. Возвращает
+    отсортированный список таймфреймов без повторов.
+    """
+    timeframes = sorted(set(int(m) for m in timeframes))
+    if not timeframes or timeframes[0] < 1:
+        raise ValueError(f"Некорректные таймфреймы: {timeframes}")
+    base = timeframes[0]
+    if 60 % base or any(m % base for m in timeframes):
+        raise ValueError(f"Таймфреймы {timeframes} не сворачиваются из {base}m")
+    return timeframes
+
+
+def resample_timeframes(timestamps, prices, volumes=None, timeframes=(1, 5, 15)):
+    """Тики -> свечи нескольких таймфреймов
+
+    Тики агрегируются один раз в младший таймфрейм, старшие сворачиваются из
+    его свечей. Возвращает {таймфрейм: dict как у resample_ohlcv}; у старших
+    таймфреймов first/candle_ids индексируют свечи младшего, а не тики.
+    """
+    timeframes = check_rollup(timeframes)
+    base = resample_ticks(timestamps, prices, volumes, timeframes[0])
+    result = {timeframes[0]: base}
+    for m in timeframes[1:]:
+        result[m] = resample_ohlcv(base['start_ms'], base['open'], base['high'], base['low'],
+                                   base['close'], base['volume'], m)
+    return result
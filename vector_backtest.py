@@ -0,0 +1,369 @@
+"""
+Векторный бэктест: весь файл тиков обрабатывается массивами numpy
+
+Шаги:
+1. тики файла агрегируются в свечи (tick_resampler, та же семантика
+   границ свечей, что в RSIStrategyBase.on_tick);
+2. RSI, Bollinger Bands и ATR считаются целыми рядами за один проход;
+3. входы, выходы и equity выводятся операциями над массивами.
+
+Режимы (mode):
+- 'candle' — решение принимается один раз на закрытии свечи по RSI
+  закрытого ряда, сделка по цене закрытия. Самый быстрый режим, но это
+  другая семантика, чем у живого бота.
+- 'tick' — режим эквивалентности: RSI считается для каждого тика как
+  предварительное значение формирующейся свечи (как в on_tick), сигналы
+  проверяются на каждом тике, сделки — по цене тика. Состояние потоковых
+  индикаторов на открытии каждой свечи берется из тех же классов
+  streaming_indicators, поэтому сигналы, сделки и equity совпадают с
+  run_backtest_on_file побитово.
+
+Нейронный фильтр векторным движком не поддерживается.
+"""
+
+import numpy as np
+
+import rsi_strategy
+from candle_series import ms_to_dt
+from streaming_indicators import SMARSIStream, WilderRSIStream, TALIB_EPSILON
+from tick_resampler import resample_ticks
+from tick_cache import load_ticks
+from candle_cache import load_candles
+from performance_metrics import PerformanceMetrics
+
+# Параметры RSIStrategyBase, которые понимает векторный движок
+DEFAULT_PARAMS = {
+    'rsi_period': 14,
+    'rsi_buy': 30,
+    'rsi_sell': 70,
+    'bb_period': 20,
+    'bb_std': 2,
+    'candle_minutes': 5,
+    'use_custom_rsi': True,
+    'use_dual_rsi': False,
+    'use_neural_filter': False,
+}
+# Параметры стратегии, которые на расчет не влияют
+IGNORED_PARAMS = {'neural_confidence_threshold', 'history_window', 'archive_dir'}
+
+ATR_PERIOD = 14
+VOLATILITY_LOOKBACK = 50
+
+
+def read_ticks(filename, use_cache=True):
+    """Читает .csv.gz с колонками timestamp (мс), price, volume в массивы
+
+    use_cache=True — через колоночный кэш tick_cache (массивы отображены в память).
+    """
+    return load_ticks(filename, use_cache=use_cache)
+
+
+# === ИНДИКАТОРЫ ЦЕЛЫМИ РЯДАМИ ===
+
+def _rsi_stream(params):
+    """Тот же выбор реализации RSI, что и в RSIStrategyBase.__init__"""
+    if params['use_custom_rsi'] or not rsi_strategy.TALIB_AVAILABLE:
+        return SMARSIStream(params['rsi_period'])
+    return WilderRSIStream(params['rsi_period'])
+
+
+def _rsi_states(closes, stream):
+    """Состояние RSI-потока на открытии каждой свечи (один проход по свечам)
+
+    Возвращает массивы (ready, last_close, gain_base, loss_base, loss_count),
+    из которых RSI для любой цены внутри свечи считается векторно.
+    """
+    n = len(closes)
+    ready = np.zeros(n, dtype=bool)
+    last_close = np.zeros(n)
+    gain_base = np.zeros(n)
+    loss_base = np.zeros(n)
+    loss_count = np.zeros(n, dtype=np.int64)
+    for k, close in enumerate(closes.tolist()):
+        if stream.count >= stream.period:
+            ready[k] = True
+            last_close[k] = stream.last_close
+            gain_base[k], loss_base[k], count = stream.base_sums()
+            loss_count[k] = count or 0
+        stream.update(close)
+    return ready, last_close, gain_base, loss_base, loss_count
+
+
+def rsi_at_prices(prices, candle_ids, states, stream):
+    """RSI формирующейся свечи candle_ids[i] при текущей цене prices[i]
+
+    Та же арифметика, что в SMARSIStream/WilderRSIStream.provisional.
+    """
+    ready, last_close, gain_base, loss_base, loss_count = (s[candle_ids] for s in states)
+    delta = prices - last_close
+    period = stream.period
+    if isinstance(stream, WilderRSIStream):
+        gain = (gain_base + np.where(delta >= 0, delta, 0.0)) * stream._inv_period
+        loss = (loss_base - np.where(delta < 0, delta, 0.0)) * stream._inv_period
+        total = gain + loss
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(np.abs(total) < TALIB_EPSILON, 0.0, 100.0 * (gain / total))
+    else:
+        gain = gain_base + np.where(delta > 0, delta, 0.0)
+        loss = loss_base - np.where(delta < 0, delta, 0.0)
+        count = loss_count + (delta < 0)
+        up = gain / period
+        down = loss / period
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = np.where(count != 0, up / down, 0.0)
+        rsi = 100. - 100. / (1. + rs)
+    return np.where(ready, rsi, 50.0)
+
+
+def bollinger_series(closes, period=20, num_std=2):
+    """Bollinger Bands закрытого ряда: (ma, upper, lower), NaN до заполнения окна"""
+    n = len(closes)
+    ma = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    if n >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(closes, period)
+        ma[period - 1:] = windows.mean(axis=1)
+        std[period - 1:] = windows.std(axis=1)
+    return ma, ma + num_std * std, ma - num_std * std
+
+
+def true_range_series(highs, lows, closes):
+    """True Range; для первой свечи 0 (не используется)"""
+    tr = np.zeros(len(closes))
+    if len(closes) > 1:
+        prev_close = closes[:-1]
+        tr[1:] = np.maximum(highs[1:] - lows[1:],
+                            np.maximum(np.abs(highs[1:] - prev_close), np.abs(lows[1:] - prev_close)))
+    return tr
+
+
+def atr_series(highs, lows, closes, period=ATR_PERIOD, wilder=None):
+    """compute_atr(candles[:k+1]) для всех k за один проход"""
+    if wilder is None:
+        wilder = rsi_strategy.TALIB_AVAILABLE
+    n = len(closes)
+    tr = true_range_series(highs, lows, closes)
+    atr = np.zeros(n)
+    if n < 2:
+        return atr
+    counts = np.arange(n)
+    cumulative = np.cumsum(tr)
+    # Среднее всех TR префикса (ветка "мало свечей")
+    atr[1:] = cumulative[1:] / counts[1:]
+    if wilder:
+        atr[period - 1:period] = 0.0
+        if n > period:
+            atr[period:] = rsi_strategy._talib().ATR(highs, lows, closes, timeperiod=period)[period:]
+    elif n > period:
+        atr[period:] = np.lib.stride_tricks.sliding_window_view(tr[1:], period).mean(axis=1)
+    return atr
+
+
+def volatility_ratio_series(atr, atr_period=ATR_PERIOD, lookback=VOLATILITY_LOOKBACK):
+    """compute_volatility_ratio(candles[:k+1]) по готовому ряду ATR"""
+    n = len(atr)
+    ratio = np.ones(n)
+    if n < lookback:
+        return ratio
+    positive = np.where(atr > 0, atr, 0.0)
+    cum_sum = np.concatenate(([0.0], np.cumsum(positive)))
+    cum_count = np.concatenate(([0], np.cumsum(atr > 0)))
+    k = np.arange(lookback - 1, n)
+    first = np.maximum(atr_period + 1, k + 1 - lookback)
+    window_sum = cum_sum[k + 1] - cum_sum[first]
+    window_count = cum_count[k + 1] - cum_count[first]
+    current = atr[k]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg = window_sum / window_count
+        value = np.where((window_count > 0) & (current != 0) & (avg > 0), current / avg, 1.0)
+    ratio[lookback - 1:] = value
+    return ratio
+
+
+# === СИГНАЛЫ И EQUITY ===
+
+def _transition(position, is_buy, is_sell):
+    """Одна проверка сигналов on_tick (без нейронного фильтра)"""
+    if is_buy and position == 0:
+        return 1
+    if is_sell and position == 1:
+        return 0
+    if is_sell and position == 0:
+        return -1
+    if is_buy and position == -1:
+        return 0
+    return position
+
+
+def simulate_positions(is_buy, is_sell):
+    """Индексы смены позиции по массивам сигналов
+
+    Тики без сигнала позицию не меняют, поэтому автомат проходит только по
+    сериям одинаковых сигналов, а внутри серии — до стабилизации позиции
+    (не более двух шагов). Возвращает (индексы, новые позиции).
+    """
+    code = is_buy.astype(np.int8) + 2 * is_sell.astype(np.int8)
+    events = np.flatnonzero(code)
+    if len(events) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)
+    event_codes = code[events]
+    run_starts = np.flatnonzero(np.concatenate(([True], event_codes[1:] != event_codes[:-1])))
+    run_ends = np.append(run_starts[1:], len(events))
+    change_idx, change_pos = [], []
+    position = 0
+    for start, end, c in zip(run_starts.tolist(), run_ends.tolist(), event_codes[run_starts].tolist()):
+        buy, sell = bool(c & 1), bool(c & 2)
+        for e in range(start, end):
+            new_position = _transition(position, buy, sell)
+            if new_position == position:
+                break
+            change_idx.append(events[e])
+            change_pos.append(new_position)
+            position = new_position
+    return np.array(change_idx, dtype=np.int64), np.array(change_pos, dtype=np.int8)
+
+
+def equity_from_positions(prices, change_idx, change_pos, final_price):
+    """Equity после каждой закрытой сделки (как RSIStrategyBase.trades)"""
+    positions = np.concatenate(([0], change_pos))
+    exec_prices = prices[change_idx]
+    # Сделка закрывается на каждой смене, где предыдущая позиция не 0
+    prev = positions[:-1]
+    closing = np.flatnonzero(prev != 0)
+    # Цена открытия закрываемой позиции — цена предыдущей смены
+    entry_prices = exec_prices[closing - 1]
+    exit_prices = exec_prices[closing]
+    sides = prev[closing]
+    if positions[-1] != 0:
+        entry_prices = np.append(entry_prices, exec_prices[-1])
+        exit_prices = np.append(exit_prices, final_price)
+        sides = np.append(sides, positions[-1])
+    pnl = np.where(sides == 1, (exit_prices - entry_prices) / entry_prices,
+                   (entry_prices - exit_prices) / entry_prices)
+    return np.cumprod(1 + pnl)
+
+
+def sharpe_from_trades(trades):
+    """Та же формула, что RSIStrategyBase.sharpe"""
+    return PerformanceMetrics.from_trades(trades).sharpe()
+
+
+def backtest_arrays(timestamps, prices, volumes, strategy_params=None, mode='candle', keep_series=False):
+    """Векторный бэктест по массивам тиков
+
+    Возвращает dict с теми же полями итогов, что run_multiple_backtests
+    собирает из run_backtest_on_file (sharpe, equity, trades_count, ...).
+    """
+    params = _resolve_params(strategy_params)
+    if mode not in ('candle', 'tick'):
+        raise ValueError(f"Неизвестный режим векторного бэктеста: {mode}")
+
+    prices = np.asarray(prices, dtype=np.float64)
+    candles = resample_ticks(timestamps, prices, volumes, params['candle_minutes'])
+    if mode == 'tick':
+        return _backtest(candles, params, prices, candles['candle_ids'], len(prices), keep_series)
+    closes = candles['close']
+    return _backtest(candles, params, closes, np.arange(len(closes)), len(prices), keep_series)
+
+
+def backtest_candles(candles, strategy_params=None, ticks_count=None, keep_series=False):
+    """Векторный бэктест режима 'candle' по готовым свечам (например, из candle_cache)
+
+    candles — dict массивов start_ms/open/high/low/close/volume,
+    свечи должны быть построены с тем же candle_minutes, что в параметрах.
+    """
+    params = _resolve_params(strategy_params)
+    closes = np.asarray(candles['close'], dtype=np.float64)
+    return _backtest(candles, params, closes, np.arange(len(closes)), ticks_count, keep_series)
+
+
+def _resolve_params(strategy_params):
+    params = dict(DEFAULT_PARAMS)
+    for key, value in (strategy_params or {}).items():
+        if key in IGNORED_PARAMS:
+            continue
+        if key not in params:
+            raise ValueError(f"Неизвестный параметр стратегии: {key}")
+        params[key] = value
+    if params['use_neural_filter']:
+        raise ValueError("Векторный бэктест не поддерживает нейронный фильтр")
+    return params
+
+
+def _backtest(candles, params, signal_prices, signal_candles, ticks_count, keep_series):
+    """Сигналы по ценам signal_prices (свеча signal_candles[i]) -> итоги бэктеста"""
+    closes = candles['close']
+    stream = _rsi_stream(params)
+    states = _rsi_states(closes, stream)
+    rsi = rsi_at_prices(signal_prices, signal_candles, states, stream)
+    change_idx, change_pos = simulate_positions(rsi < params['rsi_buy'], rsi > params['rsi_sell'])
+
+    final_price = signal_prices[-1] if len(signal_prices) else 0.0
+    trades = equity_from_positions(signal_prices, change_idx, change_pos, final_price)
+    equity = float(trades[-1]) if len(trades) else 1.0
+    entries = int(np.count_nonzero(change_pos != 0))
+    metrics = PerformanceMetrics.from_trades(trades)
+    result = {
+        'sharpe': metrics.sharpe(),
+        'equity': equity,
+        'trades_count': len(trades),
+        'candles_count': len(closes),
+        'ticks_count': ticks_count,
+        'entry_points': entries,
+        'exit_points': len(change_pos) - entries,
+        'pnl_percent': (equity - 1.0) * 100,
+        'trades': trades,
+        'metrics': metrics.snapshot(),
+    }
+    if keep_series:
+        highs, lows = candles['high'], candles['low']
+        atr = atr_series(highs, lows, closes)
+        ma, upper, lower = bollinger_series(closes, params['bb_period'], params['bb_std'])
+        change_candles = signal_candles[change_idx]
+        result['series'] = {
+            'candles': candles,
+            'rsi': rsi_at_prices(closes, np.arange(len(closes)), states, stream),
+            'bb': (ma, upper, lower),
+            'atr': atr,
+            'volatility_ratio': volatility_ratio_series(atr),
+            'changes': [(ms_to_dt(candles['start_ms'][k]), float(signal_prices[i]), int(p))
+                        for k, i, p in zip(change_candles.tolist(), change_idx.tolist(), change_pos.tolist())],
+        }
+    return result
+
+
+def run_vector_backtest(filename, strategy_params=None, mode='candle', verbose=True, keep_series=False,
+                        use_cache=True):
+    """Векторный аналог run_backtest_on_file (без графиков)
+
+    В режиме 'candle' тики не нужны: свечи берутся из candle_cache
+    (use_cache=True), иначе — из тиков через tick_cache.
+    """
+    if mode == 'candle' and use_cache:
+        candle_minutes = _resolve_params(strategy_params)['candle_minutes']
+        candles = load_candles(filename, candle_minutes)
+        result = backtest_candles(candles, strategy_params, candles['ticks_count'], keep_series)
+    else:
+        timestamps, prices, volumes = read_ticks(filename, use_cache)
+        result = backtest_arrays(timestamps, prices, volumes, strategy_params, mode, keep_series)
+    if verbose:
+        print(f'Файл: {filename} (векторный движок, режим {mode})')
+        print(f"Sharpe: {result['sharpe']:.4f}")
+        print(f"Equity: {result['equity']:.4f}")
+        print(f"Сделок: {result['trades_count']}")
+        print(f"Свечей: {result['candles_count']}")
+        print(f"Тиков: {result['ticks_count']}")
+        print(f"Входов: {result['entry_points']}")
+        print(f"Выходов: {result['exit_points']}")
+        print_metrics(result['metrics'])
+    return result
+
+
+def print_metrics(metrics):
+    """Печать метрик PerformanceMetrics.snapshot()"""
+    profit_factor = metrics['profit_factor']
+    print(f"Sortino: {metrics['sortino']:.4f}")
+    print(f"Макс. просадка: {metrics['max_drawdown'] * 100:.2f}%")
+    print(f"Win rate: {metrics['win_rate'] * 100:.1f}% ({metrics['wins']}/{metrics['trades']})")
+    print(f"Profit factor: {'∞' if profit_factor is None else f'{profit_factor:.2f}'}")
+    print(f"Серии: +{metrics['max_win_streak']} / -{metrics['max_loss_streak']}")
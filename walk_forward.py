@@ -0,0 +1,215 @@
+"""
+Walk-forward оптимизация порогов по дневным тиковым файлам
+
+Дни (файлы по порядку имен) режутся на окна: параметры подбираются по
+train_days дням (перебор сетки param_sweep), проверяются на следующих
+test_days днях, затем окно сдвигается на step дней (по умолчанию test_days).
+
+Итоги считаются по файлам независимо (как в run_multiple_backtests), поэтому
+сетка прогоняется по каждому дню ровно один раз — параллельно по процессам
+(param_sweep.sweep_files, свечи и тики берутся из кэшей). Окна, в том числе
+пересекающиеся обучающие, только сводят готовые итоги своих дней: подбор
+параметров окна и проверка на тестовых днях не пересчитывают ни свечи, ни RSI.
+
+Использование:
+    python walk_forward.py "data/BTCUSDT_2024-*.csv.gz" --train-days 10 --test-days 2 -j 4
+"""
+
+import argparse
+import glob
+import os
+
+from param_sweep import (DEFAULT_GRID, GRID_KEYS, RANK_METRICS, _merge_moments, _number, _params_key, _values,
+                         combine_results, grid_size, normalize_grid, pooled_sharpe, rank_results, sweep_files)
+import config
+
+
+# Меньше двух сделок за обучающие дни — Sharpe окна не из чего считать
+DEFAULT_MIN_TRADES = 2
+
+
+def make_windows(days, train_days, test_days, step=None):
+    """[(обучающие дни, тестовые дни)] — скользящие окна по списку дней"""
+    if train_days < 1 or test_days < 1:
+        raise ValueError("train_days и test_days должны быть >= 1")
+    step = step or test_days
+    windows = []
+    for start in range(0, len(days) - train_days - test_days + 1, step):
+        train = days[start:start + train_days]
+        test = days[start + train_days:start + train_days + test_days]
+        windows.append((train, test))
+    return windows
+
+
+def config_params_key():
+    """Параметры из config в порядке GRID_KEYS — с ними сравниваются подобранные"""
+    params = {
+        'candle_minutes': config.CANDLE_MINUTES,
+        'use_custom_rsi': config.USE_CUSTOM_RSI,
+        'rsi_period': config.RSI_PERIOD,
+        'rsi_buy': config.RSI_BUY_THRESHOLD,
+        'rsi_sell': config.RSI_SELL_THRESHOLD,
+    }
+    return tuple(params[key] for key in GRID_KEYS)
+
+
+def _summary(row):
+    return {key: row[key] for key in ('equity', 'pnl_percent', 'sharpe', 'trades_count', 'win_rate',
+                                      'max_drawdown', 'moments')}
+
+
+def evaluate_windows(by_file, windows, rank_by='sharpe', min_trades=DEFAULT_MIN_TRADES):
+    """Подбор параметров на каждом окне по готовым итогам дней (by_file из sweep_files)
+
+    Параметры окна — лучшая по rank_by комбинация за обучающие дни среди
+    тех, где сделок не меньше min_trades. Для тестовых дней берутся итоги
+    этой же комбинации и, если она есть в сетке, параметров из config.
+    Если min_trades не набрала ни одна комбинация, окно остается без
+    параметров (params и метрики None) и в итоги вне выборки не входит.
+    """
+    baseline_key = config_params_key()
+    results = []
+    for train, test in windows:
+        ranked = rank_results(combine_results(by_file[day] for day in train), rank_by)
+        candidates = [row for row in ranked if row['trades_count'] >= min_trades]
+        test_rows = {_params_key(row): row for row in combine_results(by_file[day] for day in test)}
+        baseline = test_rows.get(baseline_key)
+        window = {
+            'train': list(train),
+            'test': list(test),
+            'params': None,
+            'train_metrics': None,
+            'test_metrics': None,
+            'baseline_test_metrics': _summary(baseline) if baseline else None,
+        }
+        if candidates:
+            best = candidates[0]
+            best_key = _params_key(best)
+            window.update(params=dict(zip(GRID_KEYS, best_key)), train_metrics=_summary(best),
+                          test_metrics=_summary(test_rows[best_key]))
+        else:
+            print(f"⚠️ Окно {_day_name(train[0])}…{_day_name(train[-1])}: нет параметров "
+                  f"с {min_trades}+ сделками — окно пропущено")
+        results.append(window)
+    return results
+
+
+def _out_of_sample(windows, field='test_metrics'):
+    """Сквозные итоги по тестовым участкам окон"""
+    metrics = [window[field] for window in windows if window[field] is not None]
+    if not metrics:
+        return None
+    equity = 1.0
+    moments = (0, 0.0, 0.0)     # Sharpe — по сделкам всех тестовых участков вместе
+    for m in metrics:
+        equity *= m['equity']
+        moments = _merge_moments(moments, m['moments'])
+    trades = sum(m['trades_count'] for m in metrics)
+    wins = sum(m['win_rate'] * m['trades_count'] for m in metrics)
+    return {
+        'windows': len(metrics),
+        'equity': equity,
+        'pnl_percent': (equity - 1.0) * 100,
+        'sharpe': pooled_sharpe(moments),
+        'trades_count': trades,
+        'win_rate': wins / trades if trades else 0.0,
+        'max_drawdown': max(m['max_drawdown'] for m in metrics),
+    }
+
+
+def run_walk_forward(pattern="data/BTCUSDT_2024-07-*.csv.gz", train_days=10, test_days=2, step=None, grid=None,
+                     mode='candle', workers=1, use_cache=True, rank_by='sharpe', min_trades=DEFAULT_MIN_TRADES,
+                     verbose=True):
+    """Walk-forward по файлам pattern -> {'windows': [...], 'out_of_sample': ..., 'baseline': ...}"""
+    if rank_by not in RANK_METRICS:
+        raise ValueError(f"Неизвестная метрика ранжирования: {rank_by} (доступны {list(RANK_METRICS)})")
+    grid = normalize_grid(grid)
+    files = sorted(glob.glob(pattern))
+    windows = make_windows(files, train_days, test_days, step)
+    if not windows:
+        print(f"❌ Нужно хотя бы {train_days + test_days} файлов, найдено {len(files)}")
+        return {'windows': [], 'out_of_sample': None, 'baseline': None}
+    # Нужны только дни, которые попали в окна
+    used = [day for day in files if any(day in train or day in test for train, test in windows)]
+    print(f"🚶 Walk-forward: {len(used)} дней, {len(windows)} окон (обучение {train_days}, тест {test_days}, "
+          f"шаг {step or test_days}), {grid_size(grid)} комбинаций, режим {mode}")
+
+    by_file = sweep_files(used, grid, mode, workers, use_cache)
+    failed = {day for day, results in by_file.items() if isinstance(results, dict)}
+    if failed:
+        days = [day for day in used if day not in failed]
+        windows = make_windows(days, train_days, test_days, step)
+        print(f"⚠️ {len(failed)} файлов с ошибками исключены, осталось {len(windows)} окон")
+
+    results = evaluate_windows(by_file, windows, rank_by, min_trades)
+    report = {
+        'windows': results,
+        'out_of_sample': _out_of_sample(results),
+        'baseline': _out_of_sample(results, 'baseline_test_metrics'),
+    }
+    if verbose:
+        print_walk_forward(report, rank_by)
+    return report
+
+
+def _day_name(filename):
+    return os.path.basename(filename).split('.')[0]
+
+
+def print_walk_forward(report, rank_by='sharpe'):
+    print("=" * 104)
+    print(f"🚶 Окна walk-forward (подбор по {rank_by})")
+    print(f"{'#':>3} {'тест':>24} {'свеча':>5} {'RSI':>6} {'период':>6} {'buy':>5} {'sell':>5} "
+          f"{'train PnL %':>11} {'test PnL %':>10} {'test Sharpe':>11} {'сделок':>7} {'config %':>9}")
+    for i, window in enumerate(report['windows'], 1):
+        params, train, test = window['params'], window['train_metrics'], window['test_metrics']
+        baseline = window['baseline_test_metrics']
+        days = _day_name(window['test'][0])
+        if len(window['test']) > 1:
+            days += f"…{len(window['test'])}д"
+        baseline_text = f"{baseline['pnl_percent']:>+9.2f}" if baseline else f"{'—':>9}"
+        if params is None:
+            print(f"{i:>3} {days:>24} {'нет подходящих параметров':^74} {baseline_text}")
+            continue
+        rsi_type = 'SMA' if params['use_custom_rsi'] else 'Wilder'
+        print(f"{i:>3} {days:>24} {params['candle_minutes']:>4}m {rsi_type:>6} {params['rsi_period']:>6} "
+              f"{params['rsi_buy']:>5} {params['rsi_sell']:>5} {train['pnl_percent']:>+11.2f} "
+              f"{test['pnl_percent']:>+10.2f} {test['sharpe']:>11.4f} {test['trades_count']:>7} {baseline_text}")
+    print("=" * 104)
+    for title, summary in (('Walk-forward (вне выборки)', report['out_of_sample']),
+                           ('Параметры config на тех же днях', report['baseline'])):
+        if summary is None:
+            continue
+        print(f"📊 {title}: PnL {summary['pnl_percent']:+.2f}%, Sharpe {summary['sharpe']:.4f}, "
+              f"сделок {summary['trades_count']}, win rate {summary['win_rate'] * 100:.1f}%, "
+              f"макс. просадка {summary['max_drawdown'] * 100:.2f}%")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Walk-forward оптимизация параметров (векторный движок)')
+    parser.add_argument('pattern', nargs='?', default="data/BTCUSDT_2024-07-*.csv.gz")
+    parser.add_argument('--train-days', type=int, default=10)
+    parser.add_argument('--test-days', type=int, default=2)
+    parser.add_argument('--step', type=int, default=None, help='Сдвиг окна в днях (по умолчанию --test-days)')
+    parser.add_argument('--rsi-period', type=_values, default=DEFAULT_GRID['rsi_period'])
+    parser.add_argument('--rsi-buy', type=lambda t: _values(t, _number), default=DEFAULT_GRID['rsi_buy'])
+    parser.add_argument('--rsi-sell', type=lambda t: _values(t, _number), default=DEFAULT_GRID['rsi_sell'])
+    parser.add_argument('--candle-minutes', type=_values, default=(config.CANDLE_MINUTES,))
+    parser.add_argument('--wilder', action='store_true', help='RSI Уайлдера (TA-Lib) вместо SMA')
+    parser.add_argument('--ticks', action='store_true', help='Потиковые сигналы (как живой бот), медленнее')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='Процессов (0 — по числу ядер)')
+    parser.add_argument('--rank-by', default='sharpe', choices=list(RANK_METRICS))
+    parser.add_argument('--min-trades', type=int, default=DEFAULT_MIN_TRADES,
+                        help='Минимум сделок за обучающее окно')
+    parser.add_argument('--no-cache', action='store_true', help='Без кэшей тиков и свечей')
+    args = parser.parse_args()
+    wf_grid = {
+        'rsi_period': args.rsi_period,
+        'rsi_buy': args.rsi_buy,
+        'rsi_sell': args.rsi_sell,
+        'candle_minutes': args.candle_minutes,
+        'use_custom_rsi': (not args.wilder,),
+    }
+    run_walk_forward(args.pattern, args.train_days, args.test_days, args.step, wf_grid,
+                     'tick' if args.ticks else 'candle', args.workers or os.cpu_count() or 1, not args.no_cache,
+                     args.rank_by, args.min_trades)